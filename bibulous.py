@@ -10,9 +10,23 @@ import sys
 import locale       ## for language internationalization and localization
 import getopt       ## for getting command-line options
 import copy         ## for the "deepcopy" command
+import io           ## for in-memory text streams
+import heapq        ## for selecting the best candidates when suggesting similar keys
+import hashlib      ## for fingerprinting the input files
+import json         ## for reading and writing the fingerprint file
+import stat         ## for recognizing a leftover socket file
+import contextlib   ## for capturing the messages printed while serving a daemon request
+import collections.abc  ## for the "ChainMap" overlays on shared database entries
+import types        ## for the read-only "MappingProxyType" views of shared database entries
+import struct       ## for the layout of a database placed in shared memory
+import bisect       ## for looking up the brace level at a position in a scanned name
+import builtins     ## for the built-in functions allowed in user scripts
 import platform     ## for determining the OS of the system
-import pdb          ## put "pdb.set_trace()" at any place you want to interact with pdb
-#import traceback    ## for getting full traceback info in exceptions
+#import pdb          ## put "pdb.set_trace()" at any place you want to interact with pdb
+import traceback    ## for getting full traceback info in exceptions
+## The modules used only for writing in parallel (multiprocessing), the daemon mode (socketserver), the database
+## registry (threading), the author index (sqlite3), and user-defined variables (ast) are imported where they are used,
+## so that a run that finds its BBL file already up to date doesn't spend most of its time importing them.
 
 '''
 Bibulous is a drop-in replacement for BibTeX, with the primary advantage that the bibliography
@@ -57,13 +71,63 @@ __authors__ = 'Nathan Hagen'
 __license__ = 'MIT/X11 License'
 __contact__ = 'Nathan Hagen <and.the.light.shattered@gmail.com>'
 __version__ = '1.3'
-__all__ = ['sentence_case', 'stringsplit', 'namefield_to_namelist', 'namestr_to_namedict',
+## The most recently used results of scanning auxiliary files on disk, keyed by path, with the size limit of the cache.
+## Each value is a tuple giving the file's (modification time, size) stamp and the scan result, so that unchanged files
+## never need to be re-read.
+auxscan_cache = collections.OrderedDict()
+auxscan_cache_maxsize = 1024
+## The number of warnings issued so far (see "bib_warning()"), so that callers can tell whether a computation warned.
+warning_count = 0
+## The warnings kept back while parsing a database for the registry (see "Bibdata.parse_database()"), or None when
+## warnings are printed as they are issued.
+warning_log = None
+## The most recently used name fields already parsed by "namefield_to_namelist()", keyed by (field, separator), with
+## the size limit of the cache and the number of hits and misses so far (see "namelist_cache_info()").
+namelist_cache = collections.OrderedDict()
+namelist_cache_maxsize = 8192
+namelist_cache_stats = {'hits':0, 'misses':0}
+## The most recently used results of formatting names, from "initialize_name()", "namedict_to_formatted_namestr()",
+## and "format_namelist()", with the size limit of the cache and its hits and misses (see "name_format_cache_info()").
+name_format_cache = collections.OrderedDict()
+name_format_cache_maxsize = 16384
+name_format_cache_stats = {'hits':0, 'misses':0}
+## The options used in formatting names, and their defaults (see "name_format_signature()").
+name_format_defaults = (('use_firstname_initials',True), ('namelist_format','first_name_first'), ('maxauthors',9),
+                        ('minauthors',9), ('maxeditors',5), ('mineditors',5), ('etal_message','\\textit{et al.}'),
+                        ('use_name_ties',False), ('terse_inits',False), ('french_intials',False),
+                        ('period_after_initial',True))
+## The built-in functions, and the functions from this module, that the user scripts in a style template are given. The
+## scripts run in a namespace of their own (see "Bibdata.compile_user_scripts()"), so that they cannot overwrite the
+## module's functions. The variables are given only the entry and the dictionaries named in "Bibdata.format_bibitem()",
+## and not the Bibdata object itself. This is still not a sandbox (a function's "__globals__" leads back to the module),
+## and so the scripts must be trusted code.
+script_builtins = ('abs', 'all', 'any', 'bool', 'chr', 'dict', 'enumerate', 'filter', 'float', 'format', 'int',
+                   'isinstance', 'len', 'list', 'map', 'max', 'min', 'ord', 'print', 'range', 'repr', 'reversed',
+                   'round', 'set', 'sorted', 'str', 'sum', 'tuple', 'zip', 'Exception', 'IndexError', 'KeyError',
+                   'TypeError', 'ValueError')
+script_functions = ('sentence_case', 'stringsplit', 'namefield_to_namelist', 'namestr_to_namedict', 'initialize_name',
+                    'splitat', 'multisplit', 'enwrap_nested_string', 'purify_string', 'latex_to_utf8',
+                    'get_edition_ordinal', 'parse_pagerange', 'parse_nameabbrev', 'str_is_integer', 'bib_warning',
+                    'create_citation_alpha', 'toplevel_split', 'format_namelist', 'namedict_to_formatted_namestr')
+## The long options of the command line (see "main()"), and those of them that the daemon refuses to run (see
+## "DaemonServer.run_request()").
+command_line_options = ['locale=', 'force', 'deps=', 'exit-code-on-change', 'jobs=', 'style=', 'daemon=']
+daemon_refused_options = ('--daemon', '--style')
+
+__all__ = ['sentence_case', 'stringsplit', 'namefield_to_namelist', 'parse_namefield', 'scan_namefield',
+           'namestr_to_namedict',
            'initialize_name', 'get_delim_levels', 'show_levels_debug', 'get_quote_levels', 'splitat', 'multisplit',
            'enwrap_nested_string', 'enwrap_nested_quotes', 'purify_string', 'latex_to_utf8',
            'search_middlename_for_prefixes', 'get_edition_ordinal', 'export_bibfile', 'parse_pagerange',
-           'parse_nameabbrev', 'filter_script', 'str_is_integer', 'bib_warning', 'create_citation_alpha',
-           'toplevel_split', 'get_variable_name_elements', 'format_namelist',
-           'namedict_to_formatted_namestr', 'argsort', 'create_alphanum_citelabels','get_implicit_loop_data']
+           'parse_nameabbrev', 'filter_script', 'get_script_fields', 'str_is_integer', 'bib_warning',
+           'create_citation_alpha', 'toplevel_split', 'replace_template_markers', 'get_variable_name_elements',
+           'format_namelist', 'namedict_to_formatted_namestr', 'argsort', 'create_alphanum_citelabels',
+           'get_implicit_loop_data', 'scan_auxfile', 'get_aux_citations', 'hash_file', 'compute_fingerprint',
+           'fingerprint_is_current', 'style_variant_filename', 'file_stamp', 'NameDict', 'NameList',
+           'namelist_cache_info', 'clear_namelist_cache', 'author_index_filename', 'author_index_abbrevs',
+           'abbrevs_digest', 'author_index_key', 'name_format_signature', 'name_format_cache_info',
+           'clear_name_format_cache', 'batch', 'new_cache', 'prune_cache', 'serve', 'print_usage', 'main',
+           'get_trigrams', 'build_trigram_index', 'edit_distance', 'find_similar_keys']
 
 
 class Bibdata(object):
@@ -114,6 +178,8 @@ class Bibdata(object):
         The regex used to search for a double-quote, i.e. `"`.
     startbrace_pattern : compiled regular expression object
         The regex used to search for a starting curly brace, `{`.
+    cache : dict
+        The parsed style templates and databases shared between jobs (see `batch()`), or None if not sharing.
     culldata : bool
         Whether to cull the database so that only cited entries are parsed. Setting this to False means that the entire \
         BIB file database will be parsed. When True, the BIB file parser will only parse those entries corresponding to \
@@ -125,32 +191,68 @@ class Bibdata(object):
 
     Methods
     -------
+    can_use_cache
+    load_styles
+    load_databases
+    parse_database
+    apply_database
     parse_bibfile
     parse_bibentry
     parse_bibfield
     parse_auxfile
     parse_bstfile
+    from_sources
+    parse_files
     write_bblfile
+    write_style_variants
+    get_style_variant
+    prepare_shared_fields
+    render_bbl
+    write_fingerprint
+    write_depfile
     create_citation_list
+    get_citation_groups
+    get_group_template_key
+    get_group_heading
     format_bibitem
+    templates_use_uniquify
+    can_work_in_parallel
+    map_in_parallel
     insert_crossref_data
+    insert_entry_fields
+    compile_user_scripts
     write_citeextract
     write_authorextract
+    search_database_for_author
+    names_match_author
+    search_author_index
+    parse_indexed_entry
+    update_author_index
     replace_abbrevs_with_full
     get_bibfilenames
     check_citekeys_in_datakeys
+    suggest_citekeys
     add_crossrefs_to_searchkeys
+    build_specials_graph
+    insert_standard_fields
     insert_specials
     validate_templatestr
     fillout_implicit_indices
+    expand_implicit_loop
     template_substitution
     insert_title_into_template
     remove_nested_template_options_brackets
+    interpret_nested_template_options_brackets
+    get_nested_structure
     remove_template_options_brackets
     simplify_template_bracket
     get_variable
+    evaluate_variable
+    forget_variables
     format_operator_arg
     get_indexed_variable
+    compile_indexer
+    format_names
     get_indexed_vars_in_template
 
     Example
@@ -159,10 +261,55 @@ class Bibdata(object):
     bibdata.write_bblfile()
     '''
 
-    def __init__(self, filename, disable=None, culldata=True, uselocale=None, silent=False, debug=False):
+    ## The attributes that hold the result of parsing the style template files.
+    style_attributes = ('bstdict', 'options', 'specials', 'specials_list', 'nested_templates', 'looped_templates',
+                        'implicitly_indexed_vars', 'implicit_loop_pairs', 'namelists', 'user_script', 'user_variables',
+                        'compiled_templates', 'nested_structures', 'group_templates', 'group_names')
+
+    ## The warning messages disabled when no list is given: on default initialization, we don't want to issue any
+    ## warnings about "overwriting" the default options.
+    default_disable = (9,)
+
+    ## The abbreviations defined before any database file is read.
+    default_abbrevs = {'jan':'1', 'feb':'2', 'mar':'3', 'apr':'4', 'may':'5', 'jun':'6',
+                       'jul':'7', 'aug':'8', 'sep':'9', 'oct':'10', 'nov':'11', 'dec':'12'}
+
+    ## The options that change how the database files are parsed.
+    database_options = ('case_sensitive_field_names', 'use_abbrevs', 'undefstr')
+
+    ## The registry of functions that can be applied to a dot-indexed template variable (such as "<title.lower()>"),
+    ## keyed by function name. Each value gives the method implementing the function, the number of arguments it
+    ## takes, and (for functions with arguments) where the arguments begin in the text matched by the given pattern.
+    index_operators = {'initial':('operator_initial', 0, 0, None),
+                       'frenchinitial':('operator_frenchinitial', 0, 0, None),
+                       'compress':('operator_compress', 0, 0, None),
+                       'tie':('operator_tie', 0, 0, None),
+                       'sentence_case':('operator_sentence_case', 0, 0, None),
+                       'ordinal':('operator_ordinal', 0, 0, None),
+                       'monthname':('operator_monthname', 0, 0, None),
+                       'monthabbrev':('operator_monthabbrev', 0, 0, None),
+                       'to_namelist':('operator_to_namelist', 0, 0, None),
+                       'format_authorlist':('operator_format_authorlist', 0, 0, None),
+                       'format_editorlist':('operator_format_editorlist', 0, 0, None),
+                       'lower':('operator_lower', 0, 0, None),
+                       'upper':('operator_upper', 0, 0, None),
+                       'exists':('operator_exists', 0, 0, None),
+                       'null':('operator_null', 0, 0, None),
+                       'purify':('operator_purify', 0, 0, None),
+                       'remove_leading_zeros':('operator_remove_leading_zeros', 0, 0, None),
+                       'len':('operator_len', 0, 0, None),
+                       'zfill':('operator_zfill', 1, 7, r'.zfill\(.*\)'),
+                       'replace':('operator_replace', 2, 9, r'.replace\(.*\)'),
+                       'if_singular':('operator_if_singular', 3, 13, r'.if_singular\(.*\)'),
+                       'if_str_equal':('operator_if_str_equal', 3, 14, r'.if_str_equal(\(.*\)'),
+                       'if_num_equals':('operator_if_num_equals', 4, 18, r'.if_num_equals\(.*\)'),
+                       'if_less_than':('operator_if_less_than', 4, 14, r'.if_less_than\(.*\)'),
+                       'if_greater_than':('operator_if_greater_than', 4, 17, r'.if_greater_than\(.*\)')}
+
+    def __init__(self, filename, disable=None, culldata=True, uselocale=None, silent=False, debug=False, cache=None):
         self.debug = debug
-        self.abbrevs = {'jan':'1', 'feb':'2', 'mar':'3', 'apr':'4', 'may':'5', 'jun':'6',
-                        'jul':'7', 'aug':'8', 'sep':'9', 'oct':'10', 'nov':'11', 'dec':'12'}
+        self.cache = cache          ## parsed style templates and databases shared between jobs (see "batch()")
+        self.abbrevs = dict(self.default_abbrevs)
         self.bibdata = {'preamble':''}
         self.filedict = {}          ## the dictionary containing all of the files associated with the bibliography
         self.citedict = {}          ## the dictionary containing the original data from the AUX file
@@ -171,17 +318,49 @@ class Bibdata(object):
         self.bstdict = {}           ## the dictionary containing all information from template files
         self.user_script = ''       ## any user-written Python scripts go here
         self.user_variables = {}    ## any user-defined variables from the BST files
+        self.script_namespace = None     ## the namespace in which the user scripts run (see "compile_user_scripts()")
+        self.compiled_variables = []     ## the compiled user-defined variables, and the fields each one reads
         self.culldata = culldata    ## whether to cull the database so that only cited entries are parsed
         self.searchkeys = []        ## when culling data, this is the list of keys to limit parsing to
         self.parse_only_entrykeys = False  ## don't parse the data in the database; get only entrykeys
         self.nested_templates = []  ## which templates have nested option blocks
+        self.group_templates = {}   ## the definitions from the GROUP-TEMPLATES section of the BST file(s)
+        self.group_names = []       ## the groups given settings in the GROUP-TEMPLATES section, in order
+        self.citegroups = []        ## the groups of the reference list, with the citation keys of each, in order
         self.looped_templates = {}  ## which templates have implicit loops
         self.implicitly_indexed_vars = ['authorname','editorname'] ## which templates have implicit indexing
         self.implicit_loop_pairs = {}    ## the dictionary pairing name variable with namelist (i.e. "authorname" with "authorlist")
         self.uniquify_vars = {}     ## dict containing all variables calling the "uniquify" operator
+        self.compiled_templates = {}     ## the compiled form of each template string (see "compile_template()")
+        self.nested_structures = {}      ## the options trains of each nested template (see "get_nested_structure()")
+        self.nested_splits = {}     ## the blocks of each options train, for each way of splitting it
+        self.specials_needed = None      ## the fields each entrytype's template needs (see "build_specials_graph()")
+        self.name_format_key = None      ## the frozen name formatting options (see "format_names()")
+        self.sortnum_specials = []  ## the special fields to evaluate again once "sortnum" is known
+        self.use_compiled_templates = True   ## whether to render templates from their compiled form when possible
+        self.template_layouts = {}  ## compiled templates laid out for each choice of options blocks
+        self.expanded_templates = {}     ## implicit-loop templates already expanded (see "fillout_implicit_indices()")
+        self.loop_name_vars = {}    ## the name variable looped over in each implicit-loop template (see "get_names()")
+        self.indexer_pipelines = {}      ## the compiled form of each dot-indexer (see "compile_indexer()")
+        self.variable_cache = {}    ## the results of evaluating dot-indexed variables, for each entry (see
+                                    ## "get_variable()")
+        self.use_variable_cache = True   ## whether to remember the results of evaluating dot-indexed variables
+        self.variable_cache_hits = 0     ## (for debugging) how many variable evaluations the cache saved
+        self.variable_cache_misses = 0   ## (for debugging) how many variable evaluations were needed
         self.keylist = []           ## "keylist" is a temporary holding place for the citations
         self.auxfile_list = []      ## a list of *.aux files, for use when citations are inside nested files
+        self.aux_inputs = {}        ## in-memory contents of any nested *.aux files, keyed by filename
+        self.last_exception = None  ## the exception (if any) that interrupted the last call to render_bbl()
+        self.files_read = []        ## every input file actually read from disk, in the order read
+        self.bbl_hash = None        ## the hash of the last BBL file written with a fingerprint
+        self.entry_sequence = None  ## when parsing a database to share between jobs, the list of entries parsed
+        self.entry_strings = None   ## when indexing a database file, the (entrytype, source text) of each entry
+        self.database_key = None    ## the key of the shared database used (see "DatabaseRegistry")
         self.namelists = []         ## the list of all "namelist" type variables
+        self.datakeys = []          ## every entrykey seen in the database file(s), including culled entries
+        self.citekey_index = None   ## trigram index of the entrykeys, built only when a citation key is missing
+        self.shared_entries = set() ## entries whose standard fields are shared with other styles (see
+                                    ## "prepare_shared_fields()")
 
         if (uselocale == None):
             self.locale = locale.setlocale(locale.LC_ALL,'')    ## set the locale to the user's default
@@ -208,10 +387,9 @@ class Bibdata(object):
         self.filename = ''                      ## the current filename (for error messages)
         self.i = 0                              ## counter for line in file (for error messages)
 
-        ## On default initialization, we don't want to issue any warnings about "overwriting" the default options. So
-        ## if no "default" keyword is given, then turn off warning #9.
+        ## If no "disable" keyword is given, then turn off warning #9 (see "default_disable").
         if (disable == None):
-            self.disable = [9]
+            self.disable = list(self.default_disable)
         else:
             self.disable = disable              ## the list of warning message numbers to disable
 
@@ -289,6 +467,11 @@ class Bibdata(object):
         ## "filename" contains only the AUX file, then we assume that the user wants only to parse that part if the
         ## database corresponding to the citation keys in the AUX file. This default behavior can be overriden (so that
         ## the entire database is parsed) is the optional keyword "cull_database" is set to False.
+        if (filename == None):
+            ## Leave the sources empty, for the caller to fill in (see "from_sources()").
+            self.filedict = {'bib':[], 'bst':[], 'tex':'', 'aux':'', 'bbl':'', 'extract':'', 'fingerprint':''}
+            return
+
         self.get_bibfilenames(filename)
         if not self.filedict:
             return
@@ -303,6 +486,66 @@ class Bibdata(object):
             print('The Bibulous style template file(s): ' + str(self.filedict['bst']))
             print('The output formatted bibliography file: ' + str(self.filedict['bbl']) + '\n')
 
+        self.parse_files()
+        return
+
+    ## =============================
+    @classmethod
+    def from_sources(cls, aux=None, bst=None, bib=None, inputs=None, **kwargs):
+        '''
+        Create a Bibdata object from in-memory sources rather than from files on disk.
+
+        Each source can be a `str` or `bytes` object containing the file contents, or a file-like object to read the
+        contents from. The `bst` and `bib` arguments can also be lists of sources.
+
+        Parameters
+        ----------
+        aux : str, bytes, or file-like object, optional
+            The contents of the auxiliary file, giving the citations.
+        bst : str, bytes, file-like object, or list, optional
+            The contents of the style template file(s).
+        bib : str, bytes, file-like object, or list, optional
+            The contents of the bibliography database file(s).
+        inputs : dict, optional
+            The contents of any `\\@input{}` files named in the auxiliary file, keyed by filename. Any input file not \
+            listed here is read from disk.
+        **kwargs
+            Any keyword arguments to pass on to `Bibdata()` (`disable`, `culldata`, `uselocale`, `silent`, `debug`).
+
+        Returns
+        -------
+        bibobj : Bibdata
+            The object containing the parsed citations, style templates, and database.
+
+        Example
+        -------
+        bibobj = Bibdata.from_sources(aux=auxstr, bst=[bststr], bib=[bibstr])
+        bblstr = bibobj.render_bbl()
+        '''
+
+        bibobj = cls(None, **kwargs)
+        if (aux != None):
+            bibobj.filedict['aux'] = as_text_stream(aux)
+        if (bst != None):
+            if not isinstance(bst, (list, tuple)): bst = [bst]
+            bibobj.filedict['bst'] = [as_text_stream(f) for f in bst]
+        if (bib != None):
+            if not isinstance(bib, (list, tuple)): bib = [bib]
+            bibobj.filedict['bib'] = [as_text_stream(f) for f in bib]
+        if inputs:
+            for key in inputs:
+                bibobj.aux_inputs[key] = as_text_stream(inputs[key])
+
+        bibobj.parse_files()
+        return(bibobj)
+
+    ## =============================
+    def parse_files(self):
+        '''
+        Parse the auxiliary file, the style template files, and the bibliography database files given in `filedict`,
+        in that order.
+        '''
+
         if self.filedict['aux']:
             self.parse_auxfile(self.filedict['aux'])
             if ('*' in self.citedict):
@@ -311,8 +554,11 @@ class Bibdata(object):
         ## Parsing the style file has to go *before* parsing the BIB file, so that any style options that affect the way
         ## the data is parsed can take effect.
         if self.filedict['bst']:
-            for f in self.filedict['bst']:
-                self.parse_bstfile(f)
+            if self.can_use_cache(self.filedict['bst']):
+                self.load_styles(self.filedict['bst'])
+            else:
+                for f in self.filedict['bst']:
+                    self.parse_bstfile(f)
 
         ## Now that we've parsed the BST file, we need to check the list of special templates. For the "authorlist" and
         ## "editorlist", the ordering matters! It may seem that this section is easily replaced with a simple list, but
@@ -330,9 +576,13 @@ class Bibdata(object):
         if ('ed' not in self.specials_list):
             self.specials_list.append('ed')
 
+        ## Work out which special templates each entrytype needs, and warn of any that refer to one another in a cycle.
+        self.build_specials_graph()
+
         ## Next, get the list of entrykeys in the database file(s), and compare them against the list of citation keys.
         if self.filedict['bib']:
-            if self.citedict and self.options['use_citeextract'] and os.path.exists(self.filedict['extract']):
+            if self.citedict and self.options['use_citeextract'] and self.filedict['extract'] and \
+               os.path.exists(self.filedict['extract']):
                 ## Check if the extract file is complete by reading in the database keys and checking against the
                 ## citation list.
                 self.parse_only_entrykeys = True
@@ -356,8 +606,11 @@ class Bibdata(object):
             else:
                 if self.culldata:
                     self.searchkeys = list(self.citedict)
-                for f in self.filedict['bib']:
-                    self.parse_bibfile(f)
+                if self.can_use_cache(self.filedict['bib']) and not self.options['use_citeextract']:
+                    self.load_databases(self.filedict['bib'])
+                else:
+                    for f in self.filedict['bib']:
+                        self.parse_bibfile(f)
                 if self.culldata:
                     self.add_crossrefs_to_searchkeys()
                 if ('*' in self.citedict):
@@ -367,11 +620,207 @@ class Bibdata(object):
                     if ('preamble' in self.citedict): del self.citedict['preamble']
                     if ('*' in self.citedict): del self.citedict['*']
                 ## Write out the extracted database.
-                if self.options['use_citeextract']:
+                if self.options['use_citeextract'] and self.filedict['extract']:
                     self.write_citeextract(self.filedict['extract'])
 
         return
 
+
+    ## =============================
+    def can_use_cache(self, sources):
+        '''
+        Check whether the results of parsing a set of files can be shared with other jobs through `self.cache`. This is
+        possible only if a cache was given and all of the sources are files on disk.
+
+        Parameters
+        ----------
+        sources : list
+            The list of sources (filenames or in-memory streams).
+
+        Returns
+        -------
+        can_use : bool
+            True if the parsed results can be taken from (or stored in) the cache.
+        '''
+
+        if (self.cache == None):
+            return(False)
+        for f in sources:
+            if not isinstance(f, str):
+                return(False)
+        return(True)
+
+    ## =============================
+    def load_styles(self, bstfiles):
+        '''
+        Parse the style template files, or, if another job sharing `self.cache` has already parsed the same (unchanged)
+        files, copy the parsed result from the cache.
+
+        Parameters
+        ----------
+        bstfiles : list of str
+            The filenames of the style template files.
+        '''
+
+        key = tuple([file_stamp(f) for f in bstfiles])
+        styles = self.cache['styles']
+
+        if (key not in styles):
+            for f in bstfiles:
+                self.parse_bstfile(f)
+            styles[key] = copy.deepcopy(dict([(attr, getattr(self, attr)) for attr in self.style_attributes]))
+            return
+
+        style = copy.deepcopy(styles[key])
+        for attr in style:
+            setattr(self, attr, style[attr])
+        self.name_format_key = None
+        self.files_read.extend([os.path.abspath(f) for f in bstfiles])
+
+        ## The compiled user scripts cannot be copied along with the rest of the style, so compile them again.
+        self.compile_user_scripts()
+
+        return
+
+    ## =============================
+    def load_databases(self, bibfiles):
+        '''
+        Get the bibliography database from the registry shared with other jobs (see `DatabaseRegistry`), parsing the
+        files in full if no other job has yet done so, and then build this job's own (culled) view of the database
+        from it. The result is identical to parsing the files directly with `parse_bibfile()`.
+
+        Parameters
+        ----------
+        bibfiles : list of str
+            The filenames of the database files.
+        '''
+
+        ## The options that change how the database is parsed have to be part of the key.
+        options = tuple([self.options[key] for key in self.database_options])
+
+        registry = self.cache['databases']
+        try:
+            key = registry.make_key(bibfiles, options)
+            database = registry.get(key, bibfiles, self.parse_database)
+        except (OSError, UnicodeDecodeError):
+            ## If the full database cannot be read, then fall back to parsing only the part this job needs, so that
+            ## the error is reported just as it would be without the registry.
+            for f in bibfiles:
+                self.parse_bibfile(f)
+            return
+
+        self.database_key = key
+        self.apply_database(database)
+        self.files_read.extend([os.path.abspath(f) for f in bibfiles])
+        return
+
+    ## =============================
+    def parse_database(self, bibfiles):
+        '''
+        Parse the entire contents of the database files, without culling, recording every entry in the order parsed so
+        that any job's culled view can later be built from it (see `apply_database()`). The object's own database is
+        left empty. Rather than being printed, the warnings are kept with the database, each warning about an entry
+        along with the entry's position, so that a job gives only those about the entries it takes.
+
+        Parameters
+        ----------
+        bibfiles : list of str
+            The filenames of the database files.
+
+        Returns
+        -------
+        database : dict
+            A dictionary with keys `abbrevs`, `preamble`, `datakeys`, `sequence`, and `warnings`. The `sequence` is \
+            the list of `(entrykey, entry)` pairs for every database entry parsed, and `warnings` the list of \
+            `(position, message)` pairs for the warnings issued, where the position in `sequence` of the entry a \
+            warning is about is None for the warnings about the files themselves.
+        '''
+
+        global warning_log
+
+        saved = (self.culldata, dict(self.abbrevs), self.searchkeys, self.datakeys, len(self.files_read))
+        self.culldata = False
+        self.searchkeys = []
+        self.datakeys = []
+        self.entry_sequence = []
+        warning_log = []
+
+        try:
+            for f in bibfiles:
+                self.parse_bibfile(f)
+            database = {'abbrevs':self.abbrevs, 'preamble':self.bibdata['preamble'], 'datakeys':self.datakeys,
+                        'sequence':self.entry_sequence, 'warnings':warning_log}
+        finally:
+            warning_log = None
+            (self.culldata, self.abbrevs, self.searchkeys, self.datakeys, nread) = saved
+            del self.files_read[nread:]
+            self.bibdata = {'preamble':''}
+            self.entry_sequence = None
+
+        return(database)
+
+    ## =============================
+    def apply_database(self, database):
+        '''
+        Build this object's database from a fully parsed (and shared) one, giving the same result as if the files had
+        been parsed directly. If culling, only the cited entries, and the entries they cross-reference, are taken.
+        The shared entries are read-only, so each one is wrapped in an overlay (a `ChainMap`) that takes all of the
+        fields this job adds or replaces, without copying the entry. The warnings kept while parsing are given here,
+        leaving out those about entries this job does not take.
+
+        Parameters
+        ----------
+        database : dict
+            The parsed database, as produced by `parse_database()` and frozen by `DatabaseRegistry`.
+        '''
+
+        self.abbrevs = dict(database['abbrevs'])
+        self.bibdata['preamble'] += database['preamble']
+        if not self.datakeys and isinstance(database['datakeys'], SharedSequence):
+            ## The entrykeys of a database in shared memory are read only if they are needed.
+            self.datakeys = database['datakeys']
+        else:
+            self.datakeys.extend(database['datakeys'])
+
+        sequence = database['sequence']
+        warnings = database.get('warnings', ())     ## a database read from shared memory has had its warnings given
+        if not (self.culldata and self.searchkeys):
+            for (entrykey,entry) in sequence:
+                self.bibdata[entrykey] = collections.ChainMap({}, entry)
+                if ('crossref' in entry) and (entry['entrytype'] != 'acronym'):
+                    self.searchkeys.append(entry['crossref'])
+            for (n,msg) in warnings:
+                bib_warning(msg, self.disable)
+            return
+
+        ## When culling, look up the definitions of the cited keys (see `DatabaseRegistry.get()`), and take them, and
+        ## the acronyms, in the order parsed. As in the parser, a cross-referenced entry becomes needed only once an
+        ## entry parsed before it refers to it.
+        positions = set(database['acronyms'])
+        for key in set(self.searchkeys):
+            positions.update(database['find'](key))
+        queued = positions
+        positions = list(positions)
+        heapq.heapify(positions)
+
+        while positions:
+            n = heapq.heappop(positions)
+            (entrykey, entry) = sequence[n]
+            self.bibdata[entrykey] = collections.ChainMap({}, entry)
+            if ('crossref' in entry) and (entry['entrytype'] != 'acronym'):
+                parent = entry['crossref']
+                self.searchkeys.append(parent)
+                for m in database['find'](parent):
+                    if (m > n) and (m not in queued):
+                        queued.add(m)
+                        heapq.heappush(positions, m)
+
+        for (n,msg) in warnings:
+            if (n == None) or (n in queued):
+                bib_warning(msg, self.disable)
+
+        return
+
     ## =============================
     def parse_bibfile(self, filename):
         '''
@@ -379,12 +828,13 @@ class Bibdata(object):
 
         Parameters
         ----------
-        filename : str
-            The filename of the .bib file to parse.
+        filename : str or file-like object
+            The filename of the .bib file to parse, or an open text stream to read it from.
         '''
 
+        (filehandle, filename, is_file) = open_source(filename)
         self.filename = filename
-        filehandle = open(os.path.normpath(self.filename), 'r', encoding='utf8')
+        if is_file: self.files_read.append(os.path.abspath(filename))
 
         ## This next block parses the lines in the file into a dictionary. The tricky part here is that the BibTeX
         ## format allows for multiline entries. So we have to look for places where a line does not end in a comma, and
@@ -476,7 +926,7 @@ class Bibdata(object):
             else:
                 entrystr += line[:endpos] + '\n'
 
-        filehandle.close()
+        if is_file: filehandle.close()
 
         print('Found %i entries and %i abbrevs in %s' % (entry_counter, abbrev_counter, filename))
         #print('    Bibdata now has %i keys' % (len(self.bibdata) - 1))
@@ -500,6 +950,8 @@ class Bibdata(object):
 
         if not entrystr:
             return
+        if (self.entry_strings != None):
+            self.entry_strings.append((entrytype, entrystr))
 
         if (entrytype == 'comment'):
             pass
@@ -527,6 +979,7 @@ class Bibdata(object):
                             ': the acronym "' + entrykey + '" = "' + self.bibdata[entrykey] + '" is being '
                             'overwritten as "' + entrykey + '" = "' + fd[entrykey] + '"', self.disable)
             if fd: self.bibdata[entrykey] = newentry
+            if fd and (self.entry_sequence != None): self.entry_sequence.append((entrykey, newentry))
         else:
             ## First get the entry key. Then send the remainder of the entry string to the parser.
             idx = entrystr.find(',')
@@ -543,11 +996,13 @@ class Bibdata(object):
             ## Get the entry key. If we are culling the database (self.culldata == True) and the entry key is not among
             ## the citation keys, then exit --- we don't need to add this to the database.
             entrykey = entrystr[:idx].strip()
+            self.datakeys.append(entrykey)
 
             ## If the entry is not among the list of keys to parse, then don't bother. Skip to the next entry to save
             ## time.
             if self.culldata and self.searchkeys and (entrykey not in self.searchkeys):
                 return
+            nlogged = 0 if (warning_log == None) else len(warning_log)
 
             entrystr = entrystr[idx+1:]
 
@@ -574,6 +1029,13 @@ class Bibdata(object):
                                 entrykey + '" is being overwritten with a new definition', self.disable)
                 if fd: self.bibdata[entrykey].update(fd)
 
+            if (self.entry_sequence != None):
+                self.entry_sequence.append((entrykey, self.bibdata[entrykey]))
+                ## The warnings about the entry are given only by the jobs that take it (see "apply_database()").
+                if (warning_log != None):
+                    n = len(self.entry_sequence) - 1
+                    warning_log[nlogged:] = [(n,msg) for (p,msg) in warning_log[nlogged:]]
+
         return
 
     ## =============================
@@ -731,41 +1193,36 @@ class Bibdata(object):
 
         Parameters
         ----------
-        filename : str
-            The filename of the `.aux` file to parse.
+        filename : str or file-like object
+            The filename of the `.aux` file to parse, or an open text stream to read it from.
         recursive_call : bool
             Whether this function was called recursively (recursive_call=True), or if it is the top-level call \
             (recursive_call=False). Only in the latter case do we take the keylist and make self.citedict with it.
         '''
 
-        if debug: print('Reading AUX file "' + filename + '" ...')
-
         ## Check if this file has been called before --- don't allow infinite recursion!
         if filename in self.auxfile_list:
             return
-
-        self.filename = filename
-        filehandle = open(os.path.normpath(filename), 'r', encoding='utf8')
         self.auxfile_list.append(filename)
 
-        ## First go through the file and grab the list of citation keys. Once we get them all, then we can go through
-        ## the list and figure out the numbering.
-        for line in filehandle:
-            line = line.strip()
-
-            ## If the line begins with "\@input{" then it says to go into a file and look for citations there.
-            if line.startswith(r'\@input{'):
-                input_filename = line[8:-1].strip()
-                self.parse_auxfile(input_filename, recursive_call=True)
-
-            if not line.startswith(r'\citation{'): continue
+        ## Nested files given as in-memory sources take precedence over files on disk.
+        if isinstance(filename, str) and (filename in self.aux_inputs):
+            filename = self.aux_inputs[filename]
+        if isinstance(filename, str): self.files_read.append(os.path.abspath(filename))
+        auxscan = scan_auxfile(filename)
+        filename = auxscan['name']
+        if debug: print('Reading AUX file "' + filename + '" ...')
+        self.filename = filename
 
-            ## Remove the "\citation{" from the front and the "}" from the back. If multiple citations are given,
-            ## then split them using the comma.
-            items = line[10:-1].split(',')
-            for item in items:
-                self.keylist.append(item)
-        filehandle.close()
+        ## First go through the file's list of citation keys. Once we get them all, then we can go through the list and
+        ## figure out the numbering. Any "\@input{}" files have their citations inserted at the point where they are
+        ## called.
+        n = 0
+        for (idx,input_filename) in auxscan['inputs']:
+            self.keylist.extend(auxscan['citations'][n:idx])
+            n = idx
+            self.parse_auxfile(input_filename, recursive_call=True)
+        self.keylist.extend(auxscan['citations'][n:])
 
         if recursive_call:
             return
@@ -806,12 +1263,13 @@ class Bibdata(object):
 
         Parameters
         ----------
-        filename : str
-            The filename of the Bibulous style template to use.
+        filename : str or file-like object
+            The filename of the Bibulous style template to use, or an open text stream to read it from.
         '''
 
+        (filehandle, filename, is_file) = open_source(filename)
         self.filename = filename
-        filehandle = open(os.path.normpath(filename), 'r', encoding='utf8')
+        if is_file: self.files_read.append(os.path.abspath(filename))
 
         ## For the "definition_pattern", rather than matching the initial string up to the first whitespace character,
         ## we match a whitespace-equals-whitespace
@@ -840,6 +1298,10 @@ class Bibdata(object):
                 section = 'SPECIAL-TEMPLATES'
                 continuation = False
                 continue
+            elif line.strip().startswith('GROUP-TEMPLATES:'):
+                section = 'GROUP-TEMPLATES'
+                continuation = False
+                continue
             elif line.strip().startswith('OPTIONS:'):
                 section = 'OPTIONS'
                 continuation = False
@@ -897,7 +1359,7 @@ class Bibdata(object):
                 self.user_variables[var] = filter_script(value)
                 if self.debug:
                     print('Adding user variable "' + var + '" with value "' + value + '" ...')
-            elif (section in ('TEMPLATES','OPTIONS','SPECIAL-TEMPLATES')):
+            elif (section in ('TEMPLATES','OPTIONS','SPECIAL-TEMPLATES','GROUP-TEMPLATES')):
                 ## Skip empty lines. It is tempting to put this line above here, but resist the temptation -- putting
                 ## it higher above would remove empty lines from the Python scripts in the DEFINITIONS section, which
                 ## would make troubleshooting those more difficult.
@@ -1017,7 +1479,30 @@ class Bibdata(object):
                     if self.debug:
                         print('Setting BST special template "' + var + '" to value "' + value + '"')
 
-        filehandle.close()
+                elif (section == 'GROUP-TEMPLATES'):
+                    ## The line defines how the reference list is divided into groups: "group" is the template giving
+                    ## the group of each entry, "heading" is the text put before each group's list, and a definition
+                    ## such as "books.sortkey" or "books.article" gives a setting or an entrytype template for the
+                    ## group "books" alone.
+                    if (var in self.group_templates) and (self.group_templates[var] != value):
+                        bib_warning('Warning 009d: overwriting the existing group template "' + var + \
+                             '" from [' + self.group_templates[var] + '] to [' + value + '] ...', self.disable)
+                    self.group_templates[var] = value
+                    if ('.' in var) and (var.rsplit('.',1)[0] not in self.group_names):
+                        self.group_names.append(var.rsplit('.',1)[0])
+
+                    ## As for the entrytype templates, keep track of nested option blocks and implicit loops.
+                    levels = get_delim_levels(value, ('[',']'))
+                    if (2 in levels) and (var not in self.nested_templates):
+                        self.nested_templates.append(var)
+                    if ('...' in value.strip()[:-3]) and (var not in self.looped_templates):
+                        loop_data = get_implicit_loop_data(value)
+                        self.looped_templates[var] = loop_data
+
+                    if self.debug:
+                        print('Setting BST group template "' + var + '" to value "' + value + '"')
+
+        if is_file: filehandle.close()
 
         if abort_script:
             self.user_script = ''
@@ -1037,11 +1522,9 @@ class Bibdata(object):
                 self.bstdict[key] = self.bstdict[self.bstdict[key]]
 
         ## If the user defined any functions, then we want to evaluate them in a way such that they are available in
-        ## other functions.
-        if self.user_script and self.options['allow_scripts']:
-            if self.debug:
-                print('Evaluating the user script:\n' + 'v'*50 + '\n' + self.user_script + '^'*50 + '\n')
-            exec(self.user_script, globals())
+        ## other functions. The user-defined variables are compiled here too, so that they need not be parsed again
+        ## for each entry.
+        self.compile_user_scripts()
 
         ## Next validate all of the template strings to check for formatting errors.
         bad_templates = []
@@ -1060,6 +1543,27 @@ class Bibdata(object):
             okay = self.validate_templatestr(self.specials[key], key)
             if not okay:
                 self.specials[key] = self.options['undefstr']
+        for key in self.group_templates:
+            if (key == 'heading') or key.endswith('.heading'):
+                continue
+            okay = self.validate_templatestr(self.group_templates[key], key)
+            if not okay:
+                self.group_templates[key] = self.options['undefstr']
+
+        ## Compile the templates now, so that formatting each entry does not have to interpret the template text again.
+        for templatestr in list(self.bstdict.values()) + list(self.specials.values()):
+            if (templatestr not in self.compiled_templates):
+                self.compiled_templates[templatestr] = self.compile_template(templatestr)
+
+        for key in self.nested_templates:
+            templatestr = self.bstdict[key] if (key in self.bstdict) else self.specials.get(key)
+            if (templatestr != None) and (templatestr not in self.nested_structures):
+                self.nested_structures[templatestr] = self.get_nested_structure(templatestr)
+
+        ## The templates have changed, so the dependencies between them need to be worked out again. Likewise the
+        ## options may have changed.
+        self.specials_needed = None
+        self.name_format_key = None
 
         if self.debug:
             ## When displaying the BST dictionary, show it in sorted form.
@@ -1073,7 +1577,8 @@ class Bibdata(object):
         return
 
     ## =============================
-    def write_bblfile(self, filename=None, write_preamble=True, write_postamble=True, bibsize=None, debug=False):
+    def write_bblfile(self, filename=None, write_preamble=True, write_postamble=True, bibsize=None, debug=False,
+                      fingerprint=False, jobs=1):
         '''
         Given a bibliography database `bibdata`, a dictionary containing the citations called out `citedict`, and a
         bibliography style template `bstdict` write the LaTeX-format file for the formatted bibliography.
@@ -1094,6 +1599,11 @@ class Bibdata(object):
             separate steps, as in the testing suite.)
         bibsize : str, optional
             A string the length of which is used to determine the label margin for the bibliography.
+        fingerprint : bool, optional
+            Whether to record a fingerprint of the inputs once the file is successfully written, so that the next run \
+            can skip all work if nothing has changed (see `fingerprint_is_current()`).
+        jobs : int, optional
+            The number of worker processes to prepare and format the entries with (see `map_in_parallel()`).
         '''
 
         if (filename == None):
@@ -1109,24 +1619,321 @@ class Bibdata(object):
         else:
             filehandle = open(filename, 'w', encoding='utf8')
 
+        try:
+            self.render_bbl(filehandle, write_preamble=write_preamble, write_postamble=write_postamble,
+                            bibsize=bibsize, debug=debug, jobs=jobs)
+        finally:
+            filehandle.close()
+
+        ## Only a complete and successfully written BBL file can be fingerprinted.
+        if fingerprint and write_preamble and write_postamble and (self.last_exception == None) and \
+           self.filedict['fingerprint']:
+            self.write_fingerprint(filename)
+
+        return
+
+    ## =============================
+    def write_style_variants(self, styles, filenames=None, bibsize=None, debug=False, jobs=1):
+        '''
+        Write a BBL file in each of several styles, all formatting this object's citations from its database. The
+        database is parsed only once and shared by all of the styles, as are the fields that do not depend on the
+        style (see `prepare_shared_fields()`), so that only the special templates and the entry templates of each style
+        are evaluated separately. Each BBL file is the same as the one written using that style alone.
+
+        Parameters
+        ----------
+        styles : list
+            The style template files of each style: either a filename, or a list of filenames.
+        filenames : list of str, optional
+            The filenames of the BBL files to write. (Default is to add the name of each style's (first) template file \
+            to the name of the BBL file, as in "paper-aps.bbl" for the style "aps.bst"; see `style_variant_filename()`.)
+        bibsize : str, optional
+            A string the length of which is used to determine the label margin for the bibliography.
+        jobs : int, optional
+            The number of worker processes to prepare and format the entries of each style with.
+
+        Returns
+        -------
+        variants : list of Bibdata
+            The object used to write each of the BBL files, in order.
+
+        Example
+        -------
+        bibdata = Bibdata('jobname.aux')
+        bibdata.write_style_variants(['journal.bst', 'arxiv.bst'])
+        '''
+
+        if not self.citedict:
+            print('Warning 034: No citations were found.')
+            return([])
+
+        ## Each style sees the database through overlays on one shared layer, which takes the fields common to all of
+        ## them. This object's own entries are left untouched.
+        database = {}
+        for (entrykey,entry) in self.bibdata.items():
+            if (entrykey == 'preamble'):
+                database[entrykey] = entry
+            else:
+                database[entrykey] = collections.ChainMap({}, entry)
+
+        variants = []
+        for (i,bstfiles) in enumerate(styles):
+            if isinstance(bstfiles, str):
+                bstfiles = [bstfiles]
+            if (filenames != None):
+                bblfile = filenames[i]
+            else:
+                bblfile = style_variant_filename(self.filedict['bbl'], bstfiles[0])
+            variants.append(self.get_style_variant(bstfiles, bblfile, database))
+
+        shared = [v for v in variants if (v.database_key == 'shared')]
+        if shared:
+            shared[0].prepare_shared_fields(database, shared)
+
+        for v in variants:
+            v.write_bblfile(bibsize=bibsize, debug=debug, jobs=jobs)
+
+        return(variants)
+
+    ## =============================
+    def get_style_variant(self, bstfiles, bblfile, database=None):
+        '''
+        Make a Bibdata object for formatting this object's citations in another style. If the new style parses the
+        database with the same options as this one, then the new object takes each entry of `database` in an overlay (a
+        `ChainMap`) that holds all of the fields it adds or replaces. Otherwise it parses the database files again
+        for itself.
+
+        Parameters
+        ----------
+        bstfiles : list of str
+            The filenames of the style template files.
+        bblfile : str
+            The filename of the BBL file to write.
+        database : dict, optional
+            The database entries to share, as a copy of `bibdata`. (Default is to parse the database files again.)
+
+        Returns
+        -------
+        variant : Bibdata
+            The object holding the citations, the new style, and the database. If it shares `database`, then its \
+            `database_key` is "shared".
+        '''
+
+        variant = Bibdata(None, disable=self.disable, culldata=self.culldata, uselocale=self.locale, silent=True,
+                          debug=self.debug, cache=self.cache)
+        variant.citedict = dict(self.citedict)
+        variant.keylist = list(self.keylist)
+        variant.auxfile_list = list(self.auxfile_list)
+
+        variant.filedict['bst'] = list(bstfiles)
+        variant.parse_files()
+
+        same_options = all([(variant.options[key] == self.options[key]) for key in self.database_options])
+        if (database != None) and same_options:
+            variant.bibdata = {}
+            for (entrykey,entry) in database.items():
+                if (entrykey == 'preamble'):
+                    variant.bibdata[entrykey] = entry
+                else:
+                    variant.bibdata[entrykey] = collections.ChainMap({}, entry)
+            variant.abbrevs = self.abbrevs
+            variant.datakeys = self.datakeys
+            variant.searchkeys = list(self.searchkeys)
+            variant.database_key = 'shared'
+        elif self.filedict['bib']:
+            variant.filedict['bst'] = []
+            variant.filedict['bib'] = list(self.filedict['bib'])
+            variant.parse_files()
+
+        bstpaths = [os.path.abspath(f) for f in self.filedict['bst'] if isinstance(f, str)]
+        variant.files_read = [f for f in self.files_read if (f not in bstpaths)] + variant.files_read
+        variant.filedict = dict(self.filedict)
+        variant.filedict['bst'] = list(bstfiles)
+        variant.filedict['bbl'] = bblfile
+        variant.filedict['fingerprint'] = ''
+
+        return(variant)
+
+    ## =============================
+    def prepare_shared_fields(self, database, variants):
+        '''
+        Insert into the shared `database` the fields of each cited entry that are the same in every one of the
+        `variants` (the Bibdata objects sharing it, of which this object is one): the data taken from a
+        cross-referenced entry, the standard fields (if the styles agree on the options they use; see
+        `insert_standard_fields()`), and the name lists, for those special templates that simply convert an entry field
+        to a name list and are defined in the same way by every style. The entries are taken in the same order, and
+        the fields inserted in the same way, as each style on its own would do, so that the results are the same. The
+        entries whose standard fields were inserted are noted in the `shared_entries` of each variant.
+
+        Parameters
+        ----------
+        database : dict
+            The database shared by the variants.
+        variants : list of Bibdata
+            The Bibdata objects sharing the database.
+        '''
+
+        ## An entry takes from the one it cross-references all of the fields inserted there so far. Where a
+        ## cross-referenced entry refers on to yet another, the fields that each entry takes depend on the order in
+        ## which each style inserts them, and so every entry connected to such a chain is left for each style to
+        ## prepare on its own.
+        links = {}
+        chained = []
+        for (entrykey,entry) in database.items():
+            if (entrykey == 'preamble') or ('crossref' not in entry) or (entry['crossref'] not in database):
+                continue
+            parent = entry['crossref']
+            links.setdefault(entrykey, set()).add(parent)
+            links.setdefault(parent, set()).add(entrykey)
+            if ('crossref' in database[parent]):
+                chained.append(entrykey)
+
+        excluded = set()
+        while chained:
+            entrykey = chained.pop()
+            if (entrykey not in excluded):
+                excluded.add(entrykey)
+                chained.extend(links[entrykey])
+
+        share_standard = all([(v.options[k] == self.options[k]) for v in variants
+                              for k in ('autocomplete_doi', 'autocomplete_url')])
+
+        ## A name list special can be shared if it reads only an ordinary entry field, and if no special template
+        ## evaluated before it (in any of the styles) could see whether it is there yet.
+        namelist_keys = []
+        if all([(v.options['name_separator'] == self.options['name_separator']) for v in variants]):
+            for key in self.specials_list:
+                match = re.match(r'^<(\w+)\.to_namelist\(\)>$', self.specials.get(key, ''))
+                if not match:
+                    continue
+                shared = True
+                for v in variants:
+                    if (v.specials.get(key) != self.specials[key]) or (key not in v.specials_list):
+                        shared = False
+                    elif (match.group(1) in [k.split('.')[0] for k in v.specials]):
+                        shared = False
+                    else:
+                        for k in v.specials_list[:v.specials_list.index(key)]:
+                            templatestr = v.specials.get(k, '')
+                            if re.search(r'\b' + re.escape(key) + r'\b', templatestr) or ('citealpha' in templatestr):
+                                shared = False
+                if shared:
+                    namelist_keys.append(key)
+
+        overlays = self.bibdata
+        self.bibdata = database
+        try:
+            for c in self.citedict:
+                if (c not in database) or (c in excluded):
+                    continue
+
+                ## The cross-reference data is inserted before anything else, just as in "render_bbl()". The warning
+                ## for a missing cross-referenced entry is left to each style.
+                entry = database[c]
+                if ('crossref' in entry) and (entry['crossref'] in database):
+                    self.insert_crossref_data(c)
+
+                if share_standard:
+                    self.insert_standard_fields(c)
+                    for v in variants:
+                        v.shared_entries.add(c)
+
+                ## A special field is inserted only if every style needs it for this entry (see "insert_specials()").
+                keys = []
+                for key in namelist_keys:
+                    for v in variants:
+                        if v.user_variables and v.options['allow_scripts']:
+                            continue
+                        if (key not in v.specials_needed.get(entry['entrytype'], v.specials_needed[None])):
+                            break
+                    else:
+                        keys.append(key)
+                if keys:
+                    self.insert_specials(c, keys)
+        finally:
+            self.bibdata = overlays
+
+        return
+
+    ## =============================
+    def render_bbl(self, stream=None, write_preamble=True, write_postamble=True, bibsize=None, debug=False, jobs=1):
+        '''
+        Format the bibliography and write it to a text stream, or return it as a string. This does the work of
+        `write_bblfile()`, but without touching the filesystem.
+
+        Parameters
+        ----------
+        stream : file-like object, optional
+            The text stream to write the formatted bibliography to. If not given, the result is returned as a string.
+        write_preamble : bool, optional
+            Whether to write the preamble.
+        write_postamble : bool, optional
+            Whether to write the postamble.
+        bibsize : str, optional
+            A string the length of which is used to determine the label margin for the bibliography.
+        jobs : int, optional
+            The number of worker processes to prepare and format the entries with (see `map_in_parallel()`).
+
+        Returns
+        -------
+        bblstr : str
+            The formatted bibliography, if no `stream` was given. Otherwise None.
+        '''
+
+        if not self.citedict:
+            print('Warning 034: No citations were found.')
+            return
+        if not self.bstdict:
+            raise ImportError('No template file was found. Aborting writing the BBL file ...')
+
+        if (stream == None):
+            filehandle = io.StringIO()
+        else:
+            filehandle = stream
+        filename = str(getattr(filehandle, 'name', '<stream>'))
+        self.last_exception = None
+        self.variable_cache = {}
+        self.variable_cache_hits = 0
+        self.variable_cache_misses = 0
+        self.expanded_templates = {}
+        self.template_layouts = {}
+
+        ## When the reference list is divided into groups, the first group's heading has to come before the preamble,
+        ## but the groups are not known until the entries are sorted. So hold on to the preamble until then.
+        grouped = ('group' in self.group_templates)
+        if grouped:
+            preamble = io.StringIO()
+        else:
+            preamble = filehandle
+
+        if not bibsize: bibsize = repr(len(self.citedict))
         if write_preamble:
-            if not bibsize: bibsize = repr(len(self.citedict))
-            filehandle.write('\\begin{thebibliography}{' + bibsize + '}\n')
-            filehandle.write("\\providecommand{\\enquote}[1]{``#1''}\n")
-            filehandle.write('\\providecommand{\\url}[1]{{\\tt #1}}\n')
-            filehandle.write('\\providecommand{\\href}[2]{#2}\n')
+            preamble.write('\\begin{thebibliography}{' + bibsize + '}\n')
+            preamble.write("\\providecommand{\\enquote}[1]{``#1''}\n")
+            preamble.write('\\providecommand{\\url}[1]{{\\tt #1}}\n')
+            preamble.write('\\providecommand{\\href}[2]{#2}\n')
             if (self.options['bibitemsep'] != None):
                 s = '\\setlength{\\itemsep}{' + self.options['bibitemsep'] + '}\n'
-                filehandle.write(s)
+                preamble.write(s)
 
             if ('preamble' in self.bibdata):
-                filehandle.write(self.bibdata['preamble'])
+                preamble.write(self.bibdata['preamble'])
 
-            filehandle.write('\n\n')
+            preamble.write('\n\n')
 
         ## Use a try-except block here, so that if any exception is raised then we can make sure to produce a valid
         ## BBL file.
         try:
+            ## Decide whether the entries can be prepared and formatted by worker processes. An entry that takes data
+            ## from a cross-referenced one also takes any special fields already inserted there, so the fields of both
+            ## depend on the order of the entries and have to be inserted serially.
+            parallel = self.can_work_in_parallel(jobs)
+            linked = set()
+            if parallel:
+                for c in self.citedict:
+                    if ('crossref' in self.bibdata.get(c, {})):
+                        linked.update([c, self.bibdata[c]['crossref']])
+
             ## First insert special variables, so that the citation sorter and everything else can use them. Also
             ## insert cross-reference data. Doing these here means that we don't have to add lots of extra checks
             ## later.
@@ -1136,12 +1943,28 @@ class Bibdata(object):
                 ## list to warn the user.
                 if c not in self.bibdata:
                     msg = 'citation key ``' + c + '\'\' is not in the bibliography database'
-                    bib_warning('Warning 010a: ' + msg, self.disable)
+                    suggestions = self.suggest_citekeys(c)
+                    if suggestions:
+                        hint = '. Did you mean ' + ', '.join(['"' + k + '"' for k in suggestions]) + '?'
+                    else:
+                        hint = ''
+                    bib_warning('Warning 010a: ' + msg + hint, self.disable)
                     errormsg = r'\textit{Warning: ' + msg + '}.'
                     self.bibdata[c] = {'errormsg':errormsg, 'entrytype':'errormsg', 'entrykey':c}
+                    self.forget_variables(c)
+
+                if not parallel or (c in linked):
+                    self.insert_crossref_data(c)
+                    self.insert_specials(c)
 
-                self.insert_crossref_data(c)
-                self.insert_specials(c)
+            if parallel:
+                citekeys = [c for c in self.citedict if (c not in linked)]
+                (changes, exception) = self.map_in_parallel('insert_entry_fields', citekeys, jobs, debug=debug)
+                for (c, fields) in zip(citekeys, changes):
+                    self.bibdata[c].update(fields)
+                    self.forget_variables(c)
+                if (exception != None):
+                    raise exception
 
             ## Define a list which contains the citation keys, sorted in the order in which we need for writing into
             ## the BBL file.
@@ -1152,75 +1975,223 @@ class Bibdata(object):
                 for c in self.citelist:
                     res = self.specials['citelabel'].replace('<citealnum>',alphanums[c])
                     self.bibdata[c]['citelabel'] = res
+                    self.forget_variables(c, 'citelabel')
+
+            ## Each group after the first ends the previous group's "thebibliography" environment and begins its own.
+            group_starts = {}
+            if grouped:
+                if write_preamble and self.citegroups:
+                    filehandle.write(self.get_group_heading(self.citegroups[0][0]))
+                filehandle.write(preamble.getvalue())
+                preamble = None
+
+                n = 0
+                for (groupname, citekeys) in self.citegroups:
+                    if (n > 0):
+                        s = '\n\\end{thebibliography}\n\n' + self.get_group_heading(groupname)
+                        s += '\\begin{thebibliography}{' + bibsize + '}\n'
+                        if (self.options['bibitemsep'] != None):
+                            s += '\\setlength{\\itemsep}{' + self.options['bibitemsep'] + '}\n'
+                        group_starts[n] = s + '\n'
+                    n += len(citekeys)
+
+            ## The sorting and the citation labels depend on the order of the entries, and so are done serially above.
+            ## Formatting the entries does not, and can be shared out to worker processes. The results are written in
+            ## order, up to the first entry that raised an exception, which is then raised here, just as when
+            ## formatting serially.
+            if parallel:
+                (itemstrs, exception) = self.map_in_parallel('format_bibitem', self.citelist, jobs, debug=debug)
+            else:
+                (itemstrs, exception) = (self.citelist, None)
 
             ## Write out each individual bibliography entry. Some formatting options will actually cause the entry to
             ## be deleted, so we need the check below to see if the return string is empty before writing it to the
             ## file.
-            for c in self.citelist:
-                ## Verbose output is for debugging.
-                if debug: print('Writing entry "' + c + '" to "' + filename + '" ...')
+            for (i,item) in enumerate(itemstrs):
+                if (i in group_starts):
+                    filehandle.write(group_starts[i])
+                if parallel:
+                    s = item
+                else:
+                    c = item
+                    ## Verbose output is for debugging.
+                    if debug: print('Writing entry "' + c + '" to "' + filename + '" ...')
 
-                ## Now that we have generated all of the "special" fields, we can call the bibitem formatter to
-                ## generate the output for this entry.
-                s = self.format_bibitem(c)
+                    ## Now that we have generated all of the "special" fields, we can call the bibitem formatter to
+                    ## generate the output for this entry.
+                    s = self.format_bibitem(c)
                 if (s != ''):
                     ## Need two line EOL's here and not one so that backrefs can work properly.
                     filehandle.write(s + '\n\n')
+
+            if (exception != None):
+                raise exception
         except Exception as this_exception:
+            self.last_exception = this_exception
             if debug:
                 raise Exception(this_exception)
             ## Swallow the exception
             print('Exception encountered: ' + repr(this_exception))
         finally:
+            ## If an exception came before the preamble could be written, then it still has to be written.
+            if grouped and (preamble != None):
+                filehandle.write(preamble.getvalue())
             if write_postamble:
                 filehandle.write('\n\\end{thebibliography}\n')
-            filehandle.close()
 
+            if self.debug:
+                nevals = self.variable_cache_hits + self.variable_cache_misses
+                print('Variable cache: %i hits, %i misses (%.1f%% hit rate)' % (self.variable_cache_hits,
+                      self.variable_cache_misses, (100.0 * self.variable_cache_hits / nevals) if nevals else 0.0))
+                info = namelist_cache_info()
+                nevals = info['hits'] + info['misses']
+                print('Name list cache: %i hits, %i misses (%.1f%% hit rate)' % (info['hits'], info['misses'],
+                      (100.0 * info['hits'] / nevals) if nevals else 0.0))
+                info = name_format_cache_info()
+                nevals = info['hits'] + info['misses']
+                print('Name format cache: %i hits, %i misses (%.1f%% hit rate)' % (info['hits'], info['misses'],
+                      (100.0 * info['hits'] / nevals) if nevals else 0.0))
+
+        if (stream == None):
+            return(filehandle.getvalue())
         return
 
-    ## ===================================
-    def create_citation_list(self):
+    ## =============================
+    def write_fingerprint(self, bblfile=None):
         '''
-        Create the list of citation keys, sorted into the proper order.
+        Write the fingerprint file, recording the state of the inputs and of the BBL file just written. On the next run,
+        `fingerprint_is_current()` compares against this record to decide whether any work is needed.
+
+        Parameters
+        ----------
+        bblfile : str, optional
+            The filename of the BBL file that was written. (Default is `filedict['bbl']`.)
         '''
 
-        self.citelist = []
-        self.sortlist = []
+        if (bblfile == None):
+            bblfile = self.filedict['bbl']
 
-        ## Generate a sortkey for each citation. If the sortkeys all begin with numbers, then sort numerically
-        ## (i.e. -100 before -99, 99 before 100, etc).
-        for c in self.citedict:
-            #s = self.bibdata[c]['sortkey']
-            s = natural_keys(self.bibdata[c]['sortkey'])
-            self.sortlist.append(s)
-            self.citelist.append(c)
+        inputfiles = self.filedict['bst'] + self.filedict['bib']
+        fp = compute_fingerprint(self.filedict['aux'], self.locale, inputfiles, self.keylist, self.disable)
+        self.bbl_hash = hash_file(bblfile)
+        fp['bbl'] = [os.path.abspath(bblfile), self.bbl_hash]
 
-        idx = argsort(self.sortlist)
-        self.sortlist = [self.sortlist[x] for x in idx]
-        self.citelist = [self.citelist[x] for x in idx]
+        filehandle = open(self.filedict['fingerprint'], 'w', encoding='utf8')
+        json.dump(fp, filehandle, indent=1)
+        filehandle.close()
 
-        ## If using a citation order which is descending rather than ascending, then reverse the list.
-        if (self.options['sort_order'].lower() == 'reverse'):
-            self.sortlist = self.sortlist[::-1]
-            self.citelist = self.citelist[::-1]
+        return
 
-        ## Finally, generate the "sortnum" for the reference --- the order in which it will appear in the reference
-        ## list. This is different from "citenum", which is the order of citation in the text. For example, if
-        ## the reference list is sorted alphabetically, but you want the list enumerated, then you need "sortnum"
-        ## to get the enumerated value for each reference.
-        for i,c in enumerate(self.citelist):
-            self.bibdata[c]['sortnum'] = i+1
+    ## =============================
+    def write_depfile(self, depfile, bblfile=None, append=False):
+        '''
+        Write a Makefile-style dependency list, giving the BBL file as the target and every auxiliary, style template,
+        and database file that was actually read as its prerequisites. Each prerequisite also gets an empty rule of its
+        own, so that `make` does not fail if one of them is later deleted. The cite-extract file is written by Bibulous
+        itself from the database files, and so is listed as those database files.
 
-            ## If "sortnum" appears somewhere inside the special template definitions, where it is not yet defined,
-            ## then we need to go back and redo the specials.
-            foundit = False
-            for key in list(self.specials):
-                if ('sortnum' in self.specials[key]):
-                    foundit = True
-                    break
+        Parameters
+        ----------
+        depfile : str
+            The filename of the dependency file to write.
+        bblfile : str, optional
+            The filename of the BBL file. (Default is `filedict['bbl']`.)
+        append : bool, optional
+            Whether to add to the end of an existing dependency file (as when writing the rules for several jobs).
+        '''
 
-            if foundit:
-                self.insert_specials(c)
+        if (bblfile == None):
+            bblfile = self.filedict['bbl']
+
+        extract = self.filedict.get('extract')
+        extract = os.path.abspath(extract) if extract else None
+
+        deps = []
+        for f in self.files_read:
+            if (f == extract):
+                sources = [os.path.abspath(b) for b in self.filedict['bib'] if isinstance(b, str)]
+            else:
+                sources = [f]
+            for source in sources:
+                if (source not in deps):
+                    deps.append(source)
+
+        def escape(f):
+            return(f.replace('$', '$$').replace(' ', '\\ ').replace('#', '\\#'))
+
+        filehandle = open(depfile, 'a' if append else 'w', encoding='utf8')
+        if append: filehandle.write('\n')
+        filehandle.write(escape(os.path.abspath(bblfile)) + ':')
+        for f in deps:
+            filehandle.write(' \\\n ' + escape(f))
+        filehandle.write('\n')
+        for f in deps:
+            filehandle.write('\n' + escape(f) + ':\n')
+        filehandle.close()
+
+        return
+
+    ## ===================================
+    def create_citation_list(self):
+        '''
+        Create the list of citation keys, sorted into the proper order.
+        '''
+
+        self.citelist = []
+        self.sortlist = []
+        self.citegroups = []
+
+        ## If the style divides the reference list into groups (see "get_citation_groups()"), then each group is sorted
+        ## separately, and the groups follow one another.
+        if ('group' in self.group_templates):
+            groups = self.get_citation_groups()
+        else:
+            groups = [(None, list(self.citedict))]
+
+        for (groupname, citekeys) in groups:
+            sortkey_template = self.group_templates.get(str(groupname) + '.sortkey')
+
+            ## Generate a sortkey for each citation. If the sortkeys all begin with numbers, then sort numerically
+            ## (i.e. -100 before -99, 99 before 100, etc).
+            sortlist = []
+            for c in citekeys:
+                #s = self.bibdata[c]['sortkey']
+                if (groupname != None) and (sortkey_template != None):
+                    res = self.template_substitution(sortkey_template, c, templatekey=groupname + '.sortkey')
+                    s = natural_keys('' if (res == None) else str(res))
+                else:
+                    s = natural_keys(self.bibdata[c]['sortkey'])
+                sortlist.append(s)
+
+            idx = argsort(sortlist)
+            sortlist = [sortlist[x] for x in idx]
+            citekeys = [citekeys[x] for x in idx]
+
+            ## If using a citation order which is descending rather than ascending, then reverse the list.
+            if (self.options['sort_order'].lower() == 'reverse'):
+                sortlist = sortlist[::-1]
+                citekeys = citekeys[::-1]
+
+            self.sortlist.extend(sortlist)
+            self.citelist.extend(citekeys)
+            if (groupname != None):
+                self.citegroups.append((groupname, citekeys))
+
+        ## Finally, generate the "sortnum" for the reference --- the order in which it will appear in the reference
+        ## list. This is different from "citenum", which is the order of citation in the text. For example, if
+        ## the reference list is sorted alphabetically, but you want the list enumerated, then you need "sortnum"
+        ## to get the enumerated value for each reference.
+        for i,c in enumerate(self.citelist):
+            self.bibdata[c]['sortnum'] = i+1
+            self.forget_variables(c, 'sortnum')
+
+        ## If "sortnum" appears somewhere inside the special template definitions, where it was not yet defined, then
+        ## we need to go back and redo the specials that depend on it (see "build_specials_graph()").
+        if (self.specials_needed == None):
+            self.build_specials_graph()
+        if self.sortnum_specials:
+            for c in self.citelist:
+                self.insert_specials(c, self.sortnum_specials)
 
         if self.debug:
             for i in range(len(self.citelist)):
@@ -1228,6 +2199,80 @@ class Bibdata(object):
 
         return
 
+    ## =============================
+    def get_citation_groups(self):
+        '''
+        Divide the citations into the groups defined in the GROUP-TEMPLATES section of the style template file. The
+        "group" template gives the name of each entry's group, which is placed in the entry's "groupname" field. An
+        entry for which the template is undefined goes into the group named "". The groups given settings of their own
+        in the GROUP-TEMPLATES section come first, in the order given there, followed by any other groups in sorted
+        order, and finally the group "".
+
+        Returns
+        -------
+        groups : list of tuple
+            The name of each group, and the list of citation keys in it (in order of citation).
+        '''
+
+        members = {}
+        for c in self.citedict:
+            res = self.template_substitution(self.group_templates['group'], c, templatekey='group')
+            if (res == None) or (res == self.options['undefstr']):
+                groupname = ''
+            else:
+                groupname = str(res)
+            self.bibdata[c]['groupname'] = groupname
+            self.forget_variables(c, 'groupname')
+            members.setdefault(groupname, []).append(c)
+
+        names = [name for name in self.group_names if (name in members)]
+        others = [name for name in members if (name not in names) and (name != '')]
+        idx = argsort([natural_keys(name) for name in others])
+        names.extend([others[x] for x in idx])
+        if ('' in members) and ('' not in names):
+            names.append('')
+
+        return([(name, members[name]) for name in names])
+
+    ## =============================
+    def get_group_template_key(self, entrykey):
+        '''
+        Find the key of the template given in the GROUP-TEMPLATES section for an entry's group and entrytype (such as
+        "books.article"), if there is one, or else return None.
+        '''
+
+        entry = self.bibdata[entrykey]
+        if not self.group_templates or ('groupname' not in entry):
+            return(None)
+        key = str(entry['groupname']) + '.' + entry['entrytype']
+        if (key in self.group_templates):
+            return(key)
+        return(None)
+
+    ## =============================
+    def get_group_heading(self, groupname):
+        '''
+        Create the heading put before a group's reference list (from the "heading" definitions in the GROUP-TEMPLATES
+        section), in which "<groupname>" is replaced with the name of the group.
+
+        Parameters
+        ----------
+        groupname : str
+            The name of the group.
+
+        Returns
+        -------
+        heading : str
+            The heading, ending with a newline (or an empty string, if there is no heading).
+        '''
+
+        heading = self.group_templates.get(groupname + '.heading', self.group_templates.get('heading', ''))
+        heading = heading.replace('<groupname>', groupname)
+        if heading:
+            heading += '\n'
+
+        return(heading)
+
     ## =============================
     def format_bibitem(self, citekey, debug=False):
         '''
@@ -1264,8 +2309,14 @@ class Bibdata(object):
             entrytype = 'article'
             entry['entrytype'] = 'article'
             entry['journal'] = 'Proc.\\ SPIE'
+            self.forget_variables(c)
+
+        ## An entry's group can have a template of its own for the entrytype.
+        group_template_key = self.get_group_template_key(c)
 
-        if (entrytype in self.bstdict):
+        if (group_template_key != None):
+            templatestr = self.group_templates[group_template_key]
+        elif (entrytype in self.bstdict):
             templatestr = self.bstdict[entrytype]
         elif (entrytype == 'errormsg'):
             if (str(self.bibdata[c]['citelabel']) == 'None'):
@@ -1280,16 +2331,19 @@ class Bibdata(object):
 
         ## Before checking which variables are defined and which not, we first need to evaluate the user-defined
         ## variables or else they will always be "undefined". To make this work, we also need to provide the user
-        ## shortcut names:
+        ## shortcut names. The Bibdata object itself is not among them, so that which fields a variable reads can be
+        ## worked out from its names alone (see "get_script_fields()").
         if self.user_variables and self.options['allow_scripts']:
-            options = self.options      # pyflakes:ignore
-            assert options
-            citedict = self.citedict    # pyflakes:ignore
-            bstdict = self.bstdict      # pyflakes:ignore
-            bibdata = self.bibdata      # pyflakes:ignore
-            for user_var_name in self.user_variables:
-                user_var_value = eval(self.user_variables[user_var_name])
-                entry[user_var_name] = user_var_value
+            scope = {'entry':entry, 'options':self.options, 'citedict':self.citedict, 'bstdict':self.bstdict,
+                     'bibdata':self.bibdata, 'c':c}
+            for (user_var_name, code, fields) in self.compiled_variables:
+                ## A variable which reads only fields that the entry lacks is left undefined, without evaluating it.
+                if fields and not any((f in entry) for f in fields):
+                    if (user_var_name in entry):
+                        entry[user_var_name] = None
+                    continue
+                entry[user_var_name] = eval(code, self.script_namespace, scope)
+            self.forget_variables(c)
 
         bibitem_label = self.bibdata[c]['citelabel']
 
@@ -1300,12 +2354,12 @@ class Bibdata(object):
 
         if debug:
             print('Formatting entry "' + citekey + '"')
-            print('Template: "' + self.bstdict[entrytype] + '"')
+            print('Template: "' + templatestr + '"')
             print('Field data: ' + repr(entry))
 
         try:
             ## Substitute the template variables with fields from the bibliography entry.
-            templatestr = self.template_substitution(templatestr, citekey)
+            templatestr = self.template_substitution(templatestr, c, group_template_key)
             ## Add the filled-in template string onto the "\bibitem{...}\n" line in front of it.
             itemstr = itemstr + templatestr
         except SyntaxError as err:
@@ -1329,6 +2383,139 @@ class Bibdata(object):
 
         return(itemstr)
 
+    ## =============================
+    def templates_use_uniquify(self):
+        '''
+        Check whether any of the templates uses the "uniquify" operator, whose result depends on the entries formatted
+        before.
+        '''
+
+        templates = list(self.bstdict.values()) + list(self.specials.values())
+        return(any([('.uniquify(' in t) for t in templates]))
+
+    ## =============================
+    def can_work_in_parallel(self, jobs):
+        '''
+        Check whether the entries can be prepared and formatted by a pool of worker processes (see `map_in_parallel()`)
+        with the same result as doing it serially. This is only possible when working on one entry cannot affect
+        another: that is, when no template uses the "uniquify" operator (whose result depends on the entries seen
+        before), and there are no user-defined variables (whose scripts may keep state between entries). It also
+        needs processes that can be forked (which rules out Windows). When more than one job is asked for but the work
+        cannot be shared out, Warning 041 gives the reason, and the entries are worked on serially.
+
+        Parameters
+        ----------
+        jobs : int
+            The number of worker processes requested.
+
+        Returns
+        -------
+        okay : bool
+            Whether the work can be shared out.
+        '''
+
+        if (jobs < 2) or (len(self.citedict) < 2):
+            return(False)
+        import multiprocessing
+        ## A worker process of "batch()" is not allowed to start processes of its own.
+        if multiprocessing.current_process().daemon:
+            return(False)
+
+        if ('fork' not in multiprocessing.get_all_start_methods()):
+            reason = 'worker processes cannot be forked on this platform'
+        elif self.user_variables and self.options['allow_scripts']:
+            reason = 'the style defines user variables, whose scripts may depend on the entries formatted before'
+        elif self.templates_use_uniquify():
+            reason = 'the templates use the "uniquify" operator, whose result depends on the entries formatted before'
+        else:
+            return(True)
+
+        bib_warning('Warning 041: the entries cannot be formatted by ' + str(jobs) + ' jobs in parallel, since ' + \
+                    reason + '. Formatting them serially ...', self.disable)
+        return(False)
+
+    ## =============================
+    def map_in_parallel(self, methodname, citekeys, jobs, debug=False):
+        '''
+        Call one of the methods taking a citation key (such as `format_bibitem()`) for each of a list of keys, across a
+        pool of forked worker processes, each taking runs of consecutive keys. The workers inherit everything computed
+        so far, so the results are the same as calling the method for each key in turn, provided that
+        `can_work_in_parallel()` allows it. Anything the method changes within the worker processes is lost, except
+        for what it returns.
+
+        Parameters
+        ----------
+        methodname : str
+            The name of the method to call.
+        citekeys : list of str
+            The citation keys to call it for.
+        jobs : int
+            The number of worker processes to use.
+        debug : bool, optional
+            Whether to print each citation key as it is worked on.
+
+        Returns
+        -------
+        results : list
+            The result for each citation key, in order, up to the first one that raised an exception.
+        exception : Exception
+            The exception raised, or None.
+        '''
+
+        global render_bibobj
+
+        ## Use a few runs of keys per worker, so that a run of slow entries does not hold up the rest.
+        nworkers = min(jobs, len(citekeys))
+        runsize = max(1, -(-len(citekeys) // (4 * nworkers)))
+        runs = [citekeys[i:i+runsize] for i in range(0, len(citekeys), runsize)]
+
+        import multiprocessing
+        render_bibobj = self
+        try:
+            pool = multiprocessing.get_context('fork').Pool(nworkers)
+            runresults = pool.map(render_worker, [(methodname, run, debug) for run in runs])
+            pool.close()
+            pool.join()
+        finally:
+            render_bibobj = None
+
+        results = []
+        for (res, exception) in runresults:
+            results.extend(res)
+            if (exception != None):
+                return(results, exception)
+
+        return(results, None)
+
+    ## =============================
+    def insert_entry_fields(self, entrykey):
+        '''
+        Insert the cross-reference data and the special fields into a database entry (as `insert_crossref_data()` and
+        `insert_specials()` do), and return the fields that were added or changed. This lets a worker process of
+        `map_in_parallel()` pass its results back.
+
+        Parameters
+        ----------
+        entrykey : str
+            The key of the entry to which we want to add fields.
+
+        Returns
+        -------
+        fields : dict
+            The fields added to the entry, or changed in it, with their new values.
+        '''
+
+        before = dict(self.bibdata[entrykey])
+        self.insert_crossref_data(entrykey)
+        self.insert_specials(entrykey)
+
+        fields = {}
+        for (k,v) in self.bibdata[entrykey].items():
+            if (k not in before) or (before[k] is not v):
+                fields[k] = v
+
+        return(fields)
+
     ## =============================
     def insert_crossref_data(self, entrykey, fieldname=None):
         '''
@@ -1384,6 +2571,52 @@ class Bibdata(object):
         if ('title' in crossref_keys) and ('booktitle' not in self.bibdata[entrykey]):
             self.bibdata[entrykey]['booktitle'] = self.bibdata[self.bibdata[entrykey]['crossref']]['title']
 
+        self.forget_variables(entrykey)
+        return
+
+    ## =============================
+    def compile_user_scripts(self):
+        '''
+        Evaluate the user-defined functions (from the DEFINITIONS section of the style template file) and compile the
+        user-defined variables (from the VARIABLES section), if the "allow_scripts" option is set. The scripts run in a
+        namespace of their own, holding the functions named in `script_builtins` and `script_functions`, rather than in
+        the module's globals. (This does not make untrusted scripts safe.)
+        For each variable, also work out which entry fields it reads (see `get_script_fields()`), so that the entries
+        lacking all of them need not evaluate it.
+        '''
+
+        self.script_namespace = None
+        self.compiled_variables = []
+        if not self.options['allow_scripts']:
+            return
+        if not self.user_script and not self.user_variables:
+            return
+
+        import ast
+        namespace = {'__name__':'bibulous_script'}
+        namespace['__builtins__'] = dict([(name, getattr(builtins, name)) for name in script_builtins])
+        for name in script_functions:
+            namespace[name] = globals()[name]
+        namespace['re'] = re
+
+        functions = {}
+        if self.user_script:
+            if self.debug:
+                print('Evaluating the user script:\n' + 'v'*50 + '\n' + self.user_script + '^'*50 + '\n')
+            exec(compile(self.user_script, '<DEFINITIONS>', 'exec'), namespace)
+            for node in ast.parse(self.user_script).body:
+                if isinstance(node, ast.FunctionDef):
+                    functions[node.name] = node
+
+        for var in self.user_variables:
+            code = compile(self.user_variables[var], '<VARIABLES: ' + var + '>', 'eval')
+            tree = ast.parse(self.user_variables[var], mode='eval')
+            fields = get_script_fields(tree, functions)
+            self.compiled_variables.append((var, code, fields))
+            if self.debug:
+                print('Compiled user variable "' + var + '", which reads the fields ' + repr(fields))
+
+        self.script_namespace = namespace
         return
 
     ## =============================
@@ -1429,6 +2662,10 @@ class Bibdata(object):
         Extract a sub-database from a large bibliography database, with the former containing only those entries citing
         the given author/editor.
 
+        Where the database files are given by filename, the entries are looked up in the author index kept next to
+        each file (see `update_author_index()`), so that only the entries naming someone with the same last name need
+        to be looked at, and the database does not need to have been parsed beforehand.
+
         Parameters
         ----------
         searchname : str or dict
@@ -1448,19 +2685,51 @@ class Bibdata(object):
             outputfile = self.filedict['aux'][:-4] + '_authorextract.bib'
 
         searchname = namestr_to_namedict(searchname, self.disable)
-        nkeys = len(searchname)
-        sep = self.options['name_separator']
 
-        ## Find out if any of the tokens in the search name are initials. If so, then we need to perform the search
-        ## over initialized names and not full names. Save the set of booleans (one for each name part) in a dictionary
-        ## to use in the search loop below.
-        name_is_initialized = {}
-        for key in searchname:
-            name_is_initialized[key] = searchname[key].endswith('.')
+        import sqlite3
+        try:
+            (bibextract, abbrevs) = self.search_author_index(searchname)
+        except sqlite3.Error as err:
+            bib_warning('Warning 040: the author index cannot be used (' + str(err) + '). Searching the whole '
+                        'database instead ...', self.disable)
+            bibextract = None
+
+        if (bibextract == None):
+            bibextract = self.search_database_for_author(searchname)
+            abbrevs = self.abbrevs
+
+        if not write_abbrevs: abbrevs = None
+        export_bibfile(bibextract, outputfile, abbrevs)
+
+        return
+
+    ## =============================
+    def search_database_for_author(self, searchname):
+        '''
+        Go through every entry in the database, looking for those naming the given author/editor. If no database has
+        been parsed yet, then parse the whole of the database files first.
+
+        Parameters
+        ----------
+        searchname : dict
+            The name dictionary of the author/editor to look for.
+
+        Returns
+        -------
+        bibextract : dict
+            The database entries naming the author/editor, in the order found in the database.
+        '''
+
+        if not self.datakeys and self.filedict['bib']:
+            self.culldata = False
+            self.searchkeys = []
+            for f in self.filedict['bib']:
+                self.parse_bibfile(f)
+
+        sep = self.options['name_separator']
 
         ## This is the dictionary we will stuff extracted entries into.
         bibextract = {}
-        nentries = 0        ## count the number of entries found
 
         for k in self.bibdata:
             ## Get the list of name dictionaries from the entry.
@@ -1473,40 +2742,313 @@ class Bibdata(object):
                     name_list_of_dicts = namelist
                 else:
                     ## If the entry has both authors and editors, then just merge the two name lists.
-                    name_list_of_dicts += namelist
+                    name_list_of_dicts = name_list_of_dicts + namelist
 
-            if not name_list_of_dicts:
-                continue
+            if name_list_of_dicts and self.names_match_author(searchname, name_list_of_dicts, k):
+                bibextract[k] = dict(self.bibdata[k])
+                del bibextract[k]['entrykey']
 
-            ## Compare each name dictionary in the entry with the input author's name dict. All of an author's name
-            ## keys must equal an entry's name key to produce a match.
-            for name in name_list_of_dicts:
-                if (searchname['last'] not in name['last']): continue
+        return(bibextract)
 
-                key_matches = 0
-                for namekey in searchname:
-                    if (namekey in name):
-                        if name_is_initialized[namekey]:
-                            thisname = initialize_name(name[namekey], options={'period_after_initial':True}) + '.'
-                        else:
-                            thisname = name[namekey]
+    ## =============================
+    def names_match_author(self, searchname, namelist, entrykey=''):
+        '''
+        Find out whether any of the names in a list matches the given author/editor. All of the author's name keys
+        must equal a name's keys to produce a match. Where the author's name uses initials, the name is compared with
+        its initialized form.
 
-                        if (thisname == searchname[namekey]):
-                            key_matches += 1
-                            if self.debug:
-                                print('Found match in entry "%s": name[%s] = %s from "%s"' % \
-                                      (k, namekey, name[namekey], repr(name)))
+        Parameters
+        ----------
+        searchname : dict
+            The name dictionary of the author/editor to look for.
+        namelist : list of dict
+            The name dictionaries to compare against.
+        entrykey : str, optional
+            The key of the entry the names come from (for debugging messages only).
 
-                if (key_matches == nkeys):
-                    bibextract[k] = self.bibdata[k]
-                    del bibextract[k]['entrykey']
-                    nentries += 1
-                    if self.debug: print('Match FULL NAME in entry "' + k + '": ' + repr(name))
+        Returns
+        -------
+        found : bool
+            Whether any of the names matches.
+        '''
 
-        abbrevs = self.abbrevs if write_abbrevs else None
-        export_bibfile(bibextract, outputfile, abbrevs)
+        ## Find out if any of the tokens in the search name are initials. If so, then we need to perform the search
+        ## over initialized names and not full names.
+        name_is_initialized = {}
+        for key in searchname:
+            name_is_initialized[key] = searchname[key].endswith('.')
 
-        return
+        found = False
+        for name in namelist:
+            if (searchname['last'] not in name['last']): continue
+
+            key_matches = 0
+            for namekey in searchname:
+                if (namekey in name):
+                    if name_is_initialized[namekey]:
+                        thisname = initialize_name(name[namekey], options={'period_after_initial':True}) + '.'
+                    else:
+                        thisname = name[namekey]
+
+                    if (thisname == searchname[namekey]):
+                        key_matches += 1
+                        if self.debug:
+                            print('Found match in entry "%s": name[%s] = %s from "%s"' % \
+                                  (entrykey, namekey, name[namekey], repr(name)))
+
+            if (key_matches == len(searchname)):
+                found = True
+                if self.debug: print('Match FULL NAME in entry "' + entrykey + '": ' + repr(name))
+
+        return(found)
+
+    ## =============================
+    def search_author_index(self, searchname):
+        '''
+        Look up the entries naming the given author/editor in the author indexes of the database files (see
+        `update_author_index()`), parsing only the entries that match. Where an entry key is defined more than once,
+        the last definition is the one used, as when parsing the database files.
+
+        Parameters
+        ----------
+        searchname : dict
+            The name dictionary of the author/editor to look for.
+
+        Returns
+        -------
+        bibextract : dict
+            The database entries naming the author/editor, in the order found in the database, or None if the \
+            database files are not all given by filename.
+        abbrevs : dict
+            The abbreviations defined in the database files.
+        '''
+
+        bibfiles = self.filedict['bib']
+        if not all([isinstance(f, str) for f in bibfiles]):
+            return(None, None)
+
+        indexes = []
+        try:
+            for f in bibfiles:
+                indexes.append(self.update_author_index(f, indexes[-1] if indexes else None))
+
+            ## Get the names of the candidate entries: those naming someone with the same last name. An initialized
+            ## last name can only be compared with the full names, so then every name is a candidate.
+            candidates = {}
+            lastname = author_index_key(searchname['last'])
+            for (i,index) in enumerate(indexes):
+                if searchname['last'].endswith('.'):
+                    rows = index.execute('SELECT entries.ordinal, entries.entrykey, names.name FROM names JOIN entries '
+                                         'ON entries.digest = names.digest ORDER BY entries.ordinal, names.rowid')
+                else:
+                    rows = index.execute('SELECT entries.ordinal, entries.entrykey, names.name FROM names JOIN entries '
+                                         'ON entries.digest = names.digest WHERE names.lastname = ? '
+                                         'ORDER BY entries.ordinal, names.rowid', (lastname,))
+                for (ordinal, entrykey, name) in rows:
+                    candidates.setdefault(entrykey, {}).setdefault((i,ordinal), []).append(json.loads(name))
+
+            ## For each candidate, find where its entry key first appears (which gives its place in the output) and
+            ## where it is last defined (which gives its contents).
+            keys = list(candidates)
+            (first, last) = ({}, {})
+            for (i,index) in enumerate(indexes):
+                for n in range(0, len(keys), 500):
+                    chunk = keys[n:n+500]
+                    rows = index.execute('SELECT entrykey, MIN(ordinal), MAX(ordinal) FROM entries WHERE entrykey '
+                                         'IN (' + ','.join(['?'] * len(chunk)) + ') GROUP BY entrykey', chunk)
+                    for (entrykey, lo, hi) in rows:
+                        first.setdefault(entrykey, (i,lo))
+                        last[entrykey] = (i,hi)
+
+            found = []
+            for entrykey in keys:
+                namelist = candidates[entrykey].get(last[entrykey], [])
+                if namelist and self.names_match_author(searchname, namelist, entrykey):
+                    found.append((first[entrykey], last[entrykey], entrykey))
+
+            ## Parse the matching entries from their source text, unless the database has already been parsed.
+            bibextract = {}
+            file_abbrevs = {}
+            for (_, (i,ordinal), entrykey) in sorted(found):
+                if (entrykey in self.bibdata):
+                    entry = dict(self.bibdata[entrykey])
+                else:
+                    if (i not in file_abbrevs): file_abbrevs[i] = author_index_abbrevs(indexes[i])
+                    row = indexes[i].execute('SELECT sources.entrytype, sources.entrystr FROM entries JOIN sources '
+                                             'ON sources.digest = entries.digest WHERE entries.ordinal = ?', (ordinal,))
+                    (entrytype, entrystr) = row.fetchone()
+                    entry = self.parse_indexed_entry(entrytype, entrystr, file_abbrevs[i])
+                entry.pop('entrykey', None)
+                bibextract[entrykey] = entry
+
+            abbrevs = author_index_abbrevs(indexes[-1]) if indexes else dict(self.default_abbrevs)
+        finally:
+            for index in indexes:
+                index.close()
+
+        return(bibextract, abbrevs)
+
+    ## =============================
+    def parse_indexed_entry(self, entrytype, entrystr, abbrevs):
+        '''
+        Parse the source text of a single database entry, leaving the object's own database untouched.
+
+        Parameters
+        ----------
+        entrytype : str
+            The type of entry (`article`, `book`, etc.).
+        entrystr : str
+            The source text of the entry, as read from the database file.
+        abbrevs : dict
+            The abbreviations in effect for the entry.
+
+        Returns
+        -------
+        entry : dict
+            The parsed entry.
+        '''
+
+        saved = (self.culldata, self.abbrevs, self.bibdata, self.datakeys, self.entry_sequence)
+        self.culldata = False
+        self.abbrevs = dict(abbrevs)
+        self.bibdata = {'preamble':''}
+        self.datakeys = []
+        self.entry_sequence = None
+
+        try:
+            self.parse_bibentry(entrystr, entrytype)
+            entry = self.bibdata.get(entrystr[:entrystr.find(',')].strip(), {})
+        finally:
+            (self.culldata, self.abbrevs, self.bibdata, self.datakeys, self.entry_sequence) = saved
+
+        return(entry)
+
+    ## =============================
+    def update_author_index(self, bibfile, previous=None):
+        '''
+        Bring the author index of a database file up to date, and open it. The index is an SQLite database kept next to
+        the database file (see `author_index_filename()`), holding the source text of each entry, the parsed author and
+        editor names of each entry, and a table looking up those names by last name (see `author_index_key()`). When the
+        database file changes, only the entries whose source text has changed are parsed again.
+
+        Parameters
+        ----------
+        bibfile : str
+            The filename of the database file.
+        previous : sqlite3.Connection, optional
+            The author index of the database file read before this one, whose abbreviations carry over to this one. \
+            (Default is to start from `Bibdata.default_abbrevs`.)
+
+        Returns
+        -------
+        index : sqlite3.Connection
+            The open author index.
+        '''
+
+        ## An index depends on the abbreviations carried over from the files before it only through their digest, so
+        ## that checking whether it is current does not need them.
+        if (previous == None):
+            inherited = abbrevs_digest(self.default_abbrevs)
+        else:
+            inherited = previous.execute("SELECT value FROM meta WHERE name = 'abbrevs_digest'").fetchone()[0]
+        stamp = json.dumps(list(file_stamp(bibfile)))
+        settings = json.dumps([__version__, self.options['name_separator'], inherited] + \
+                              [self.options[key] for key in self.database_options])
+
+        import sqlite3
+        index = sqlite3.connect(author_index_filename(bibfile))
+        try:
+            try:
+                meta = dict(index.execute('SELECT name, value FROM meta'))
+            except sqlite3.OperationalError:
+                meta = {}
+            if (meta.get('settings') == settings) and (meta.get('stamp') == stamp):
+                return(index)
+
+            index.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+            index.execute('CREATE TABLE IF NOT EXISTS entries (ordinal INTEGER PRIMARY KEY, entrykey TEXT, '
+                          'digest TEXT)')
+            index.execute('CREATE TABLE IF NOT EXISTS sources (digest TEXT PRIMARY KEY, entrytype TEXT, entrystr TEXT)')
+            index.execute('CREATE TABLE IF NOT EXISTS names (digest TEXT, lastname TEXT, name TEXT)')
+            index.execute('CREATE INDEX IF NOT EXISTS entries_by_key ON entries (entrykey)')
+            index.execute('CREATE INDEX IF NOT EXISTS entries_by_digest ON entries (digest)')
+            index.execute('CREATE INDEX IF NOT EXISTS names_by_lastname ON names (lastname)')
+            index.execute('CREATE INDEX IF NOT EXISTS names_by_digest ON names (digest)')
+            if (meta.get('settings') != settings):
+                for table in ('meta', 'entries', 'sources', 'names'):
+                    index.execute('DELETE FROM ' + table)
+
+            ## Read through the database file without parsing the entries' fields, collecting the source text of each
+            ## entry, and the abbreviations.
+            saved = (self.culldata, self.abbrevs, self.searchkeys, self.datakeys, self.bibdata, self.entry_sequence,
+                     len(self.files_read))
+            self.culldata = False
+            self.searchkeys = []
+            self.datakeys = []
+            self.abbrevs = dict(self.default_abbrevs if (previous == None) else author_index_abbrevs(previous))
+            self.bibdata = {'preamble':''}
+            self.entry_sequence = None
+            self.entry_strings = []
+
+            try:
+                self.parse_only_entrykeys = True
+                self.parse_bibfile(bibfile)
+                self.parse_only_entrykeys = False
+                abbrevs = self.abbrevs
+
+                ## An entry's names depend on its source text and on the abbreviations, so changing an abbreviation
+                ## means parsing all of the file's entries again.
+                abbrevs_key = abbrevs_digest(abbrevs)
+                known = set([row[0] for row in index.execute('SELECT digest FROM sources')])
+                sep = self.options['name_separator']
+                (entries, sources, names) = ([], [], [])
+
+                for (entrytype, entrystr) in self.entry_strings:
+                    if (entrytype in ('comment','preamble','string','acronym')) or (',' not in entrystr):
+                        continue
+                    entrykey = entrystr[:entrystr.find(',')].strip()
+                    if not entrykey:
+                        continue
+                    source = abbrevs_key + '\n' + entrytype + '\n' + entrystr
+                    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+                    entries.append((len(entries), entrykey, digest))
+                    if (digest in known):
+                        continue
+                    known.add(digest)
+
+                    ## A new or changed entry: parse it, and index its names.
+                    self.bibdata = {'preamble':''}
+                    self.parse_bibentry(entrystr, entrytype)
+                    entry = self.bibdata.get(entrykey, {})
+                    namelist = []
+                    for field in ('author','editor'):
+                        if (field in entry):
+                            namelist += namefield_to_namelist(entry[field], key=entrykey, sep=sep, disable=self.disable)
+                    sources.append((digest, entrytype, entrystr))
+                    names += [(digest, author_index_key(name['last']), json.dumps(dict(name))) for name in namelist
+                              if ('last' in name)]
+            finally:
+                (self.culldata, self.abbrevs, self.searchkeys, self.datakeys, self.bibdata, self.entry_sequence,
+                 nread) = saved
+                del self.files_read[nread:]
+                self.entry_strings = None
+                self.parse_only_entrykeys = False
+
+            index.execute('DELETE FROM entries')
+            index.executemany('INSERT INTO entries VALUES (?,?,?)', entries)
+            index.executemany('INSERT INTO sources VALUES (?,?,?)', sources)
+            index.executemany('INSERT INTO names VALUES (?,?,?)', names)
+            index.execute('DELETE FROM sources WHERE digest NOT IN (SELECT digest FROM entries)')
+            index.execute('DELETE FROM names WHERE digest NOT IN (SELECT digest FROM entries)')
+            index.executemany('INSERT OR REPLACE INTO meta VALUES (?,?)',
+                              [('settings',settings), ('stamp',stamp), ('abbrevs',json.dumps(abbrevs)),
+                               ('abbrevs_digest',abbrevs_key)])
+            index.commit()
+        except Exception:
+            index.close()
+            raise
+
+        return(index)
 
     ## =============================
     def replace_abbrevs_with_full(self, fieldstr, resultstr):
@@ -1631,8 +3173,8 @@ class Bibdata(object):
         Returns
         -------
         filedict : dict
-            A dictionary with keys `aux`, `bbl`, `bib`, `bst`, `extract`, and `tex`, each entry of which contains a \
-            list of filenames.
+            A dictionary with keys `aux`, `bbl`, `bib`, `bst`, `extract`, `fingerprint`, and `tex`, each entry of \
+            which contains a list of filenames.
         '''
 
         bibfiles = []
@@ -1649,18 +3191,9 @@ class Bibdata(object):
             auxfile = os.path.normpath(os.path.abspath(filename))
             path = os.path.normpath(os.path.dirname(auxfile))
 
-            s = open(filename, 'r', encoding='utf8')
-            for line in s.readlines():
-                line = line.strip()
-                if line.startswith('%'): continue
-                if line.startswith('\\bibdata{'):
-                    line = line[9:]
-                    indx = line.index('}')
-                    bibres = line[:indx]
-                if line.startswith('\\bibstyle{'):
-                    line = line[10:]
-                    indx = line.index('}')
-                    bstres = line[:indx]
+            auxscan = scan_auxfile(filename)
+            bibres = auxscan['bibdata']
+            bstres = auxscan['bibstyle']
 
             if (bibres == None):
                 print('Bibulous cannot find a bibliography database specified in "' + filename + '". '
@@ -1743,6 +3276,10 @@ class Bibdata(object):
             texfile = auxfile[:-4] + '.tex'
         if not extractfile:
             extractfile = auxfile[:-4] + '-extract.bib'
+        if auxfile:
+            fingerprintfile = auxfile[:-4] + '-fingerprint.json'
+        else:
+            fingerprintfile = ''
 
         ## Now that we have the filenames, build the dictionary of BibTeX-related files.
         self.filedict['bib'] = bibfiles
@@ -1751,6 +3288,7 @@ class Bibdata(object):
         self.filedict['aux'] = auxfile
         self.filedict['bbl'] = bblfile
         self.filedict['extract'] = extractfile
+        self.filedict['fingerprint'] = fingerprintfile
 
         if self.debug:
             print('bib files: ' + repr(bibfiles))
@@ -1788,13 +3326,47 @@ class Bibdata(object):
             return(True)
 
     ## =============================
-    def add_crossrefs_to_searchkeys(self):
+    def suggest_citekeys(self, citekey, maxsuggestions=3):
         '''
-        Add any cross-referenced entrykeys into the `searchkeys`, the list which is used to cull the database so that
-        only necessary entries are parsed.
+        Find the database entrykeys that most closely resemble a citation key that is missing from the database.
+
+        The trigram index of the entrykeys is built on the first call only, so that runs without any missing citation
+        keys pay nothing for it.
+
+        Parameters
+        ----------
+        citekey : str
+            The citation key that could not be found in the database.
+        maxsuggestions : int, optional
+            The maximum number of entrykeys to return.
+
+        Returns
+        -------
+        suggestions : list of str
+            The closest entrykeys, best match first. The list is empty if nothing is close enough to be useful.
         '''
 
-        ## When self.culldata==True, the problem is that if a crossref refers to an entry that was not among the
+        if (self.citekey_index == None):
+            ## Collect the keys from the entire database, not only the (possibly culled) set that was parsed.
+            keys = set(self.datakeys)
+            for key in self.bibdata:
+                if (key == 'preamble') or (self.bibdata[key].get('entrytype') == 'errormsg'): continue
+                keys.add(key)
+            keys = sorted(keys)
+            self.citekey_index = (keys, build_trigram_index(keys))
+
+        (keys, index) = self.citekey_index
+        suggestions = find_similar_keys(citekey, keys, index, maxsuggestions=maxsuggestions)
+        return(suggestions)
+
+    ## =============================
+    def add_crossrefs_to_searchkeys(self):
+        '''
+        Add any cross-referenced entrykeys into the `searchkeys`, the list which is used to cull the database so that
+        only necessary entries are parsed.
+        '''
+
+        ## When self.culldata==True, the problem is that if a crossref refers to an entry that was not among the
         ## citation keys, then the database parser will not know to place that entry into the bibdata dictionary. Thus,
         ## if we happen to run across an entry with missing data, and it has a crossref that is not in the database,
         ## then we have to go back and parse the database a second time, this time adding the crossreferenced items.
@@ -1809,14 +3381,110 @@ class Bibdata(object):
         return
 
     ## =============================
-    def insert_specials(self, entrykey):
+    def build_specials_graph(self):
+        '''
+        Build the graph of which fields each special template refers to, and from it find the special fields that
+        each entrytype's template can reach, directly or through other special templates. The "sortkey", "citelabel",
+        "authorlist" and "editorlist" fields are always needed, since they are used outside of the templates, as is
+        any special template using the "uniquify" operator, since it has to see every entry, and any field that the
+        group templates refer to. Any special templates that refer to one another in a cycle are reported.
+
+        The graph decides only which of the special fields are evaluated, and not the order in which they are: this is
+        deliberately left as the order of the style file (see `insert_specials()`). A special template referring to a
+        special field defined after it therefore sees that field as undefined, as it always has, and sorting the
+        special templates topologically would change the result of existing style files.
+
+        The result is placed in `specials_needed`, giving for each entrytype the set of field names that its template
+        needs (with the set under the key None for entrytypes without a template), and in `sortnum_specials`, the list
+        of special fields that `create_citation_list()` has to evaluate again once the "sortnum" field is known.
+        '''
+
+        def references(templatestr):
+            names = set()
+            for var in re.findall(r'<(.*?)>', templatestr):
+                names.update(re.split(r'[.,()\s]+', var))
+            return(names)
+
+        ## Each special template may stand for a field with an index (such as "authorname.n"), so the graph is keyed
+        ## by the field name alone.
+        graph = {}
+        for key in self.specials:
+            graph.setdefault(key.split('.')[0], set()).update(references(self.specials[key]))
+        for (varname, listname) in self.implicit_loop_pairs.items():
+            graph.setdefault(varname, set()).update(re.split(r'[.,()\s\[<]+', listname))
+
+        def reachable(names):
+            found = set()
+            stack = list(names)
+            while stack:
+                name = stack.pop()
+                if (name not in found):
+                    found.add(name)
+                    stack.extend(graph.get(name, ()))
+            return(found)
+
+        roots = set(['sortkey', 'citelabel', 'authorlist', 'editorlist'])
+        roots.update([key.split('.')[0] for key in self.specials if ('.uniquify(' in self.specials[key])])
+        for key in self.group_templates:
+            roots.update(references(self.group_templates[key]))
+
+        specials_needed = {None:reachable(roots)}
+        for entrytype in self.bstdict:
+            specials_needed[entrytype] = reachable(roots | references(self.bstdict[entrytype]))
+        if self.options['procspie_as_journal'] and ('article' in self.bstdict):
+            specials_needed['inproceedings'] = specials_needed.get('inproceedings', set()) | specials_needed['article']
+
+        ## Look for cycles among the special templates (a template referring to its own field simply sees it undefined,
+        ## and is not counted). Each special is evaluated in the order given in the style file, so the first one in a
+        ## cycle sees the others as undefined.
+        specials = set([key.split('.')[0] for key in self.specials])
+        reported = set()
+        for name in sorted(specials):
+            for other in sorted(graph[name] & specials):
+                if (other == name) or (other in reported) or (name in reported):
+                    continue
+                if (name in reachable([other])):
+                    cycle = sorted([n for n in specials if (n in reachable([other])) and (name in reachable([n]))])
+                    reported.update(cycle)
+                    bib_warning('Warning 039: the special templates "' + '", "'.join(cycle) + '" refer to one ' + \
+                                'another in a cycle. The first of them in the style file sees the others as undefined.',
+                                self.disable)
+
+        ## Once the entries are sorted, any special that refers to "sortnum" can give a new result. So can any that
+        ## refers to a special later in the list (which it first saw as undefined), or to one of these.
+        sortnum_specials = set()
+        if any([('sortnum' in self.specials[key]) for key in self.specials]):
+            keys = [key for key in self.specials_list if (key in self.specials)]
+            order = dict([(key,i) for (i,key) in enumerate(keys)])
+            reach = dict([(key, reachable(references(self.specials[key]))) for key in keys])
+            changed = True
+            while changed:
+                changed = False
+                for key in keys:
+                    if (key in sortnum_specials):
+                        continue
+                    for other in ['sortnum'] + keys:
+                        if (other.split('.')[0] not in reach[key]):
+                            continue
+                        if (other == 'sortnum') or (other in sortnum_specials) or (order[other] > order[key]):
+                            sortnum_specials.add(key)
+                            changed = True
+                            break
+
+        self.specials_needed = specials_needed
+        self.sortnum_specials = [key for key in self.specials_list if (key in sortnum_specials)]
+        return
+
+    ## =============================
+    def insert_standard_fields(self, entrykey):
         '''
-        Insert "special" fields into a database entry.
+        Insert the fields that every entry gets before its special fields: the start and end pages of the page range,
+        the completed DOI and URL, and the "citekey" and "citenum".
 
         Parameters
         ----------
         entrykey : str
-            The key of the entry to which we want to add special fields.
+            The key of the entry to which we want to add the fields.
         '''
 
         entry = self.bibdata[entrykey]
@@ -1844,11 +3512,46 @@ class Bibdata(object):
             citenum = '1'
 
         self.bibdata[entrykey]['citenum'] = citenum
+        self.forget_variables(entrykey)
+        return
+
+    ## =============================
+    def insert_specials(self, entrykey, keys=None):
+        '''
+        Insert "special" fields into a database entry. Only the fields that the entry's template can reach are inserted
+        (see `build_specials_graph()`), and they are inserted in the order of the style file, and not in the order of
+        their dependencies, so that a special template sees any special field defined after it as undefined.
+
+        Parameters
+        ----------
+        entrykey : str
+            The key of the entry to which we want to add special fields.
+        keys : list of str, optional
+            The special fields to insert, if they are missing. (Default is all of them, after first inserting the \
+            fields given by `insert_standard_fields()`.)
+        '''
+
+        entry = self.bibdata[entrykey]
+        if (keys == None):
+            keys = self.specials_list
+            if (entrykey not in self.shared_entries):
+                self.insert_standard_fields(entrykey)
+
+        ## Only the special fields that the entry's template can reach are needed. User-defined variables can look at
+        ## any field, so when there are any, every special field is inserted.
+        if (self.specials_needed == None):
+            self.build_specials_graph()
+        if self.user_variables and self.options['allow_scripts']:
+            needed = None
+        elif (entry['entrytype'] in self.specials_needed):
+            needed = self.specials_needed[entry['entrytype']]
+        else:
+            needed = self.specials_needed[None]
 
         ## Next loop through the "special" variables. These are variable definitions from the SPECIAL-
         ## TEMPLATES section of the style file. Note that rather than looping through
         ## self.specials' keys, we loop through "self.specials_list" because we want it to be ordered.
-        for key in self.specials_list:
+        for key in keys:
             ## Only insert the user-defined special field if the field is missing.
             if (key in entry):
                 continue
@@ -1859,6 +3562,10 @@ class Bibdata(object):
             if ('<citealpha.' in templatestr) or ('<citealpha>' in templatestr):
                 citealpha = create_citation_alpha(entry, self.options)
                 self.bibdata[entrykey]['citealpha'] = citealpha
+                self.forget_variables(entrykey, 'citealpha')
+
+            if (needed != None) and (key.split('.')[0] not in needed):
+                continue
 
             ## If this special template is an implicitly indexed one, then it can only be used after explicit index
             ## replacement (such as within an implicit loop) and not by itself, so we have to skip it here. We
@@ -1880,8 +3587,10 @@ class Bibdata(object):
             ## (low prob. that a user will need to use the "undefstr" in a template).
             if template_has_implicit_index and (self.options['undefstr'] not in res):
                 self.bibdata[entrykey][key] = res
+                self.forget_variables(entrykey, key)
             elif (res not in (None, '', self.options['undefstr'])):
                 self.bibdata[entrykey][key] = res
+                self.forget_variables(entrykey, key)
 
         return
 
@@ -1990,13 +3699,48 @@ class Bibdata(object):
         names = self.get_names(self.bibdata[entrykey], templatestr)
         if not names:
             return(templatestr)
-        num_names = len(names)
 
         ## Get the key for the template to look up in the looped template data dictionary (generated when the BST
         ## file is parsed).
         if (templatekey is None):
             templatekey = self.bibdata[entrykey]['entrytype']
 
+        ## The expanded template depends only on the number of names and on whether the list ends with "others", so
+        ## entries of the same shape can share it. An expansion that issued a warning is not kept, so that the warning
+        ## is issued again for the next entry.
+        last_is_others = isinstance(names[-1], dict) and (names[-1].get('last', '').lower() == 'others')
+        shape = (templatestr, templatekey, len(names), last_is_others)
+        if (shape in self.expanded_templates):
+            return(self.expanded_templates[shape])
+
+        nwarnings = warning_count
+        new_templatestr = self.expand_implicit_loop(templatestr, templatekey, names)
+        if (warning_count == nwarnings):
+            self.expanded_templates[shape] = new_templatestr
+
+        return(new_templatestr)
+
+    ## =============================
+    def expand_implicit_loop(self, templatestr, templatekey, names):
+        '''
+        Build the full-size template for an implicit loop over a list of names (see `fillout_implicit_indices()`).
+
+        Parameters
+        ----------
+        templatestr : str
+            The input template string (containing the implicit loop ellipsis notation).
+        templatekey : str
+            The entrytype, or the special variable, that the template is for.
+        names : list of dicts
+            The list of names to loop over.
+
+        Returns
+        -------
+        new_templatestr : str
+            The new template with the ellipsis replaced with the loop-generated template variables and "glue".
+        '''
+
+        num_names = len(names)
         loop_data = self.looped_templates[templatekey]
         loop_varname = loop_data['varname']
         loop_start_index = loop_data['start_index']
@@ -2108,6 +3852,14 @@ class Bibdata(object):
             The template string with all variables replaced.
         '''
 
+        ## If the template has a compiled form, then rendering that gives the same result with much less work.
+        if self.use_compiled_templates and ('<' not in self.options['undefstr']):
+            if (templatestr not in self.compiled_templates):
+                self.compiled_templates[templatestr] = self.compile_template(templatestr)
+            compiled = self.compiled_templates[templatestr]
+            if (compiled != None):
+                return(self.render_compiled_template(compiled, entrykey, templatestr))
+
         bibentry = self.bibdata[entrykey]
 
         ## Fill out the template if there is an implicit loop structure.
@@ -2136,7 +3888,49 @@ class Bibdata(object):
 
         var_options = {}
 
-        ## Go ahead and replace all of the template variables with the corresponding fields.
+        ## Go ahead and replace all of the template variables with the corresponding fields. If the result is a list
+        ## or dict rather than a string, then we need to return it immediately, since the steps below assume a string.
+        templatestr = self.substitute_variables(templatestr, variables, bibentry, var_options,
+                                                template_has_implicit_index)
+        if isinstance(templatestr, (list,dict)):
+            return(templatestr)
+
+        ## If the template uses an implicit loop, check if all variables were undefined. If none are defined, then the
+        ## whole template should be returned as undefined.
+        if template_has_implicit_loop:
+            if (templatestr == templatestr_all_undef):
+                return(None)
+
+        templatestr = replace_template_markers(templatestr)
+
+        return(templatestr)
+
+    ## =============================
+    def substitute_variables(self, templatestr, variables, bibentry, var_options, template_has_implicit_index=False):
+        '''
+        Replace the template variables in a template string (whose options trains have already been resolved) with
+        the corresponding fields of a database entry.
+
+        Parameters
+        ----------
+        templatestr : str
+            The template string.
+        variables : list of str
+            The template variables to replace, in order.
+        bibentry : dict
+            The bibliography entry to get the fields from.
+        var_options : dict
+            The options to pass on to `get_variable()`, updated for each variable in turn.
+        template_has_implicit_index : bool, optional
+            Whether the template contains an implicit index.
+
+        Returns
+        -------
+        templatestr : str, list, or dict
+            The template string with the variables replaced, or the value of the first variable (if any) whose value \
+            is a list or dict rather than a string.
+        '''
+
         for var in variables:
             if (var not in templatestr): continue
 
@@ -2182,30 +3976,297 @@ class Bibdata(object):
             else:
                 templatestr = templatestr.replace(var, res)
 
-        ## If the template uses an implicit loop, check if all variables were undefined. If none are defined, then the
-        ## whole template should be returned as undefined.
-        if template_has_implicit_loop:
-            if (templatestr == templatestr_all_undef):
+        return(templatestr)
+
+    ## =============================
+    def compile_template(self, templatestr):
+        '''
+        Parse a template string into a tree of literal, variable, and options-train nodes, so that it can be rendered
+        for each entry with a single walk of the tree (see `render_compiled_template()`) rather than by interpreting
+        the template text again.
+
+        Templates with implicit loops, indexed variables, or nested options trains, and any template that is not well
+        formed, are not compiled, but are left for `template_substitution()` to interpret.
+
+        Parameters
+        ----------
+        templatestr : str
+            The template string to compile.
+
+        Returns
+        -------
+        compiled : tuple
+            The list of template variables (in order of appearance, as `template_substitution()` processes them), and \
+            the list of nodes. Each node is a tuple `('literal', text)`, `('variable', text)`, or `('train', blocks)`, \
+            where each of the blocks is a tuple of the block's text, the block's variables (in the order that \
+            `simplify_template_bracket()` checks them), and the block's nodes. If the template cannot be compiled, \
+            the result is None.
+        '''
+
+        if ('...' in templatestr) or re.search(self.index_pattern, templatestr) or \
+           re.search(self.implicit_index_pattern, templatestr):
+            return(None)
+
+        ## Only templates whose options trains are all balanced and at the top level can be compiled.
+        levels = get_delim_levels(templatestr, ('[',']'))
+        if (len(levels) != len(templatestr)) or (levels and ((max(levels) > 1) or (levels[-1] != 0))):
+            return(None)
+
+        ## Every "<" must begin a variable, and every variable must lie inside a single block of text.
+        variables = re.findall(r'<.*?>', templatestr)
+        for var in variables:
+            if ('<' in var[1:]) or ('[' in var) or (']' in var) or ('|' in var):
                 return(None)
 
-        ## Now that we've replaced template variables, go ahead and replace the special commands. We need to replace
-        ## the hash symbol too because that indicates a comment when placed inside a template string.
-        if (r'{\makeopenbracket}' in templatestr):
-            templatestr = templatestr.replace(r'{\makeopenbracket}', '[')
-        if (r'{\makeclosebracket}' in templatestr):
-            templatestr = templatestr.replace(r'{\makeclosebracket}', ']')
-        if (r'{\makeverticalbar}' in templatestr):
-            templatestr = templatestr.replace(r'{\makeverticalbar}', '|')
-        if (r'{\makegreaterthan}' in templatestr):
-            templatestr = templatestr.replace(r'{\makegreaterthan}', '>')
-        if (r'{\makelessthan}' in templatestr):
-            templatestr = templatestr.replace(r'{\makelessthan}', '<')
-        if (r'{\makehashsign}' in templatestr):
-            templatestr = templatestr.replace(r'{\makehashsign}', '\\#')
-        if (r'{\makeellipsis}' in templatestr):
-            templatestr = templatestr.replace(r'{\makeellipsis}', '...')
+        def compile_text(text):
+            nodes = []
+            for (i,piece) in enumerate(re.split(r'(<.*?>)', text)):
+                if (i % 2 == 1):
+                    nodes.append(('variable', piece))
+                elif ('<' in piece):
+                    raise ValueError(piece)
+                elif piece:
+                    nodes.append(('literal', piece))
+            return(nodes)
+
+        nodes = []
+        idx = 0
+        try:
+            while ('[' in templatestr[idx:]):
+                start_idx = templatestr.index('[', idx)
+                end_idx = templatestr.index(']', start_idx)
+                nodes.extend(compile_text(templatestr[idx:start_idx]))
+
+                ## The variables of each block are put into the same order as in "simplify_template_bracket()", so
+                ## that they are checked in the same order.
+                blocks = []
+                for block in templatestr[start_idx+1:end_idx].split('|'):
+                    block_variables = list(set([v for v in variables if v in block]))
+                    blocks.append((block, block_variables, compile_text(block)))
+                nodes.append(('train', blocks))
+                idx = end_idx + 1
+
+            nodes.extend(compile_text(templatestr[idx:]))
+        except ValueError:
+            return(None)
 
-        return(templatestr)
+        return((variables, nodes))
+
+    ## =============================
+    def render_compiled_template(self, compiled, entrykey, templatestr=None):
+        '''
+        Render a compiled template (see `compile_template()`) for a database entry. The result is exactly what
+        `template_substitution()` gives from the template string.
+
+        Parameters
+        ----------
+        compiled : tuple
+            The compiled template.
+        entrykey : str
+            The key of the database entry from which to get fields to substitute into the template.
+        templatestr : str, optional
+            The template string that was compiled, under which to remember the template's layout for each choice of \
+            options blocks (see `lay_out_compiled_template()`).
+
+        Returns
+        -------
+        templatestr : str, list, or dict
+            The template with all variables replaced (or the value of the first variable, if that is a list or dict).
+        '''
+
+        bibentry = self.bibdata[entrykey]
+        choices = tuple([self.choose_compiled_block(node[1], bibentry) for node in compiled[1] if (node[0] == 'train')])
+        layout = self.lay_out_compiled_template(compiled, choices, templatestr)
+        return(self.fill_compiled_template(compiled, layout, entrykey))
+
+    ## =============================
+    def lay_out_compiled_template(self, compiled, choices, templatestr=None):
+        '''
+        Replace each options train of a compiled template with the block chosen from it, giving a flat list of pieces
+        of text, and keep track of which pieces are variables still waiting to be substituted. Every entry making the
+        same choices shares the same layout.
+
+        Parameters
+        ----------
+        compiled : tuple
+            The compiled template.
+        choices : tuple
+            For each options train in turn, the index of the block chosen (see `choose_compiled_block()`).
+        templatestr : str, optional
+            The template string that was compiled. If given, the layout is remembered in `template_layouts`.
+
+        Returns
+        -------
+        layout : tuple
+            The list of pieces of text, the list giving the variable (or None) held by each piece, and a dictionary \
+            giving the pieces at which each variable appears.
+        '''
+
+        if (templatestr != None) and ((templatestr, choices) in self.template_layouts):
+            return(self.template_layouts[(templatestr, choices)])
+
+        texts = []
+        open_vars = []
+        trains = iter(choices)
+        for node in compiled[1]:
+            if (node[0] == 'train'):
+                i = next(trains)
+                if (i == None):
+                    chosen = []
+                elif (node[1][i][0] == ''):
+                    chosen = [('literal', self.options['undefstr'])]
+                else:
+                    chosen = node[1][i][2]
+            else:
+                chosen = (node,)
+            for (kind,text) in chosen:
+                texts.append(text)
+                open_vars.append(text if (kind == 'variable') else None)
+
+        positions = {}
+        for (i,var) in enumerate(open_vars):
+            if (var != None):
+                positions.setdefault(var, []).append(i)
+
+        layout = (texts, open_vars, positions)
+        if (templatestr != None):
+            self.template_layouts[(templatestr, choices)] = layout
+
+        return(layout)
+
+    ## =============================
+    def fill_compiled_template(self, compiled, layout, entrykey):
+        '''
+        Substitute the fields of a database entry into the layout of a compiled template (see
+        `lay_out_compiled_template()`). The layout itself is left unchanged, so that other entries can share it.
+
+        Parameters
+        ----------
+        compiled : tuple
+            The compiled template.
+        layout : tuple
+            The layout of the compiled template, for the options blocks that the entry chose.
+        entrykey : str
+            The key of the database entry from which to get fields to substitute into the template.
+
+        Returns
+        -------
+        templatestr : str, list, or dict
+            The template with all variables replaced (or the value of the first variable, if that is a list or dict).
+        '''
+
+        bibentry = self.bibdata[entrykey]
+        undefstr = self.options['undefstr']
+        variables = compiled[0]
+        texts = list(layout[0])
+        open_vars = list(layout[1])
+        positions = dict(layout[2])
+
+        ## Find the first character following a piece, as the text-based substitution would see it.
+        def next_piece(i):
+            for j in range(i+1, len(texts)):
+                if texts[j]:
+                    return(j)
+            return(None)
+
+        ## Now substitute the variables in the same order as "substitute_variables()" does. Each variable's value is
+        ## inserted at every place the variable appears.
+        var_options = {}
+        for (k,var) in enumerate(variables):
+            if (var not in positions): continue
+            varname = var[1:-1]
+            first = positions[var][0]
+
+            if varname.startswith('title') and ('title' in bibentry):
+                ## As in "insert_title_into_template()", a "?" or "!" ending the title replaces any punctuation that
+                ## the template puts after it.
+                value = self.get_variable(bibentry, varname)
+                if (value == None): continue
+                if value.endswith(('?','!')) and not self.pieces_end_with_title(texts, open_vars):
+                    j = next_piece(first)
+                    if (j == None):
+                        raise IndexError('string index out of range')
+                    if (texts[j][0] in (',','.','!','?',';',':')):
+                        texts[j] = texts[j][1:]
+            elif varname.startswith('citealpha'):
+                value = create_citation_alpha(bibentry, self.options)
+            elif varname.startswith('citealnum'):
+                continue
+            else:
+                j = next_piece(first)
+                period_after_initial = (j != None) and (texts[j][0] == '.') and \
+                                       var.endswith(('initial()>', 'initial().tie()>'))
+                var_options.update({'period_after_initial':period_after_initial})
+
+                res = self.get_variable(bibentry, varname, options=var_options)
+                if (res == None):
+                    value = undefstr
+                elif isinstance(res, (list,dict)):
+                    return(res)
+                else:
+                    value = res
+
+            for i in positions.pop(var):
+                texts[i] = value
+                open_vars[i] = None
+
+            ## A value that itself looks like it holds template variables could be altered by the substitutions still
+            ## to come, so continue from here on with the text-based substitution.
+            if ('<' in value):
+                templatestr = self.substitute_variables(''.join(texts), variables[k+1:], bibentry, var_options)
+                if isinstance(templatestr, (list,dict)):
+                    return(templatestr)
+                return(replace_template_markers(templatestr))
+
+        return(replace_template_markers(''.join(texts)))
+
+    ## =============================
+    def pieces_end_with_title(self, texts, open_vars):
+        '''
+        Check whether the template text, as pieced together in `render_compiled_template()`, ends with the variable
+        "<title>".
+        '''
+
+        for j in range(len(texts)-1, -1, -1):
+            if texts[j]:
+                return(open_vars[j] == '<title>')
+        return(False)
+
+    ## =============================
+    def choose_compiled_block(self, blocks, bibentry):
+        '''
+        From the blocks of a compiled options train, choose the first fully defined block, just as
+        `simplify_template_bracket()` does.
+
+        Parameters
+        ----------
+        blocks : list of tuple
+            The compiled blocks of the options train.
+        bibentry : dict
+            An entry from the bibliography database.
+
+        Returns
+        -------
+        choice : int
+            The index of the block chosen to replace the options train, or None if no block is chosen (so that the \
+            train is simply removed). An empty block stands for the "undefstr".
+        '''
+
+        for (i,(block, block_variables, block_nodes)) in enumerate(blocks):
+            if (block == '') or ('<' not in block):
+                return(i)
+
+            foundit = False
+            for var in block_variables:
+                res = self.get_variable(bibentry, var[1:-1])
+                foundit = ((res != None) and (res != self.options['undefstr']))
+                if not foundit:
+                    break
+
+            if foundit:
+                return(i)
+
+        return(None)
 
     ## ===================================
     def insert_title_into_template(self, title_var, templatestr, bibentry):
@@ -2266,6 +4327,57 @@ class Bibdata(object):
             The variables to look for.
         '''
 
+        ## Nested templates are parsed into their options trains once (see "get_nested_structure()"), so that each entry
+        ## needs only a single walk through the trains. Anything that the structure does not cover is interpreted from
+        ## the template text.
+        if (templatestr not in self.nested_structures):
+            self.nested_structures[templatestr] = self.get_nested_structure(templatestr)
+        structure = self.nested_structures[templatestr]
+        if (structure == None):
+            return(self.interpret_nested_template_options_brackets(templatestr, entry, variables))
+
+        (trains, trailing_text, levels) = structure
+        newstr = ''
+        for (n, (text_before, substr, start_idx, end_idx, bar_positions, is_nested)) in enumerate(trains):
+            newstr += text_before
+
+            ## If there is no nesting left then go ahead and parse the remaining string.
+            if not is_nested:
+                return(self.remove_template_options_brackets(newstr + templatestr[start_idx:], entry, variables))
+
+            ## Split the train into blocks just as "toplevel_split()" does, using the levels of the text as it stands
+            ## (i.e. with the trains before this one already replaced), which depend on how long that text is.
+            offset = len(newstr)
+            pos = tuple([i for i in bar_positions if (i < offset) or (levels[start_idx+i-offset] < 2)])
+            key = (templatestr, n, pos)
+            if (key not in self.nested_splits):
+                blocks = toplevel_split(substr, '|', [0 if (i in pos) else 2 for i in range(len(substr))])
+                self.nested_splits[key] = [(block, re.findall(r'<.*?>', block)) for block in blocks]
+
+            newblocks = []
+            for (block, block_variables) in self.nested_splits[key]:
+                newblock = self.remove_nested_template_options_brackets(block, entry, block_variables)
+                if (newblock not in ('',None)):
+                    newblocks.append(newblock)
+
+            new_substr = '|'.join(newblocks)
+            res = self.simplify_template_bracket(new_substr, entry, variables)
+
+            ## Brackets left in the result would change the levels of everything after them.
+            if ('[' in res) or (']' in res):
+                remainder = newstr + res + templatestr[end_idx+1:]
+                return(self.interpret_nested_template_options_brackets(remainder, entry, variables))
+            newstr += res
+
+        return(newstr + trailing_text)
+
+    ## =============================
+    def interpret_nested_template_options_brackets(self, templatestr, entry, variables):
+        '''
+        Remove the nested options trains from a template by interpreting the template text, for templates that
+        `get_nested_structure()` does not cover. The parameters are as for `remove_nested_template_options_brackets()`.
+        '''
+
         while ('[' in templatestr):
             levels = get_delim_levels(templatestr, ('[',']'))
 
@@ -2302,6 +4414,45 @@ class Bibdata(object):
 
         return(templatestr)
 
+    ## =============================
+    def get_nested_structure(self, templatestr):
+        '''
+        Parse the top-level options trains of a template with nested options trains, for use by
+        `remove_nested_template_options_brackets()`.
+
+        Parameters
+        ----------
+        templatestr : str
+            The template string to analyze.
+
+        Returns
+        -------
+        structure : tuple
+            The list of trains, the text after the last train, and the bracket levels of the template. Each train is \
+            a tuple of the text before it, its contents, the indices of its brackets, the positions of the "|" \
+            characters in its contents, and whether it or any later train is nested. (The blocks that a train splits \
+            into depend on the entry, and are kept in `self.nested_splits` as entries need them.) If the brackets of \
+            the template are not balanced, the result is None.
+        '''
+
+        levels = get_delim_levels(templatestr, ('[',']'))
+        if (len(levels) != len(templatestr)) or (levels and (levels[-1] != 0)):
+            return(None)
+
+        trains = []
+        idx = 0
+        for i in range(len(levels)):
+            if (levels[i] == 1) and ((i == 0) or (levels[i-1] == 0)):
+                start_idx = i
+            elif (levels[i] == 0) and (i > 0) and (levels[i-1] == 1):
+                substr = templatestr[start_idx+1:i]
+                bar_positions = tuple([j for (j,c) in enumerate(substr) if (c == '|')])
+                is_nested = (2 in levels[start_idx:])
+                trains.append((templatestr[idx:start_idx], substr, start_idx, i, bar_positions, is_nested))
+                idx = i + 1
+
+        return((tuple(trains), templatestr[idx:], tuple(levels)))
+
     ## =============================
     def remove_template_options_brackets(self, templatestr, entry, variables):
         '''
@@ -2435,6 +4586,40 @@ class Bibdata(object):
             The field value (if it exists). If no corresponding field is found, return `None`.
         '''
 
+        ## The results for dot-indexed variables are kept for each entry, filed under the field being indexed, until
+        ## that field changes (see "forget_variables()"). The "if_" operators can also look at other fields, so their
+        ## results are filed under None, and are dropped whenever any field changes. The "uniquify" operator gives a new
+        ## result on each call, a warning has to be issued each time the variable is evaluated, and the caller may alter
+        ## a list or dict, so those results are not kept.
+        if ('.' not in variable) or ('uniquify(' in variable) or not self.use_variable_cache:
+            return(self.evaluate_variable(bibentry, variable, options=options))
+
+        entrykey = bibentry.get('entrykey')
+        if (entrykey not in self.bibdata) or (self.bibdata[entrykey] is not bibentry):
+            return(self.evaluate_variable(bibentry, variable, options=options))
+
+        cachekey = (variable, options.get('period_after_initial', False))
+        fieldname = None if ('.if_' in variable) else variable.split('.')[0]
+        entry_cache = self.variable_cache.setdefault(entrykey, {}).setdefault(fieldname, {})
+        if (cachekey in entry_cache):
+            self.variable_cache_hits += 1
+            return(entry_cache[cachekey])
+
+        self.variable_cache_misses += 1
+        nwarnings = warning_count
+        result = self.evaluate_variable(bibentry, variable, options=options)
+        if (warning_count == nwarnings) and ((result == None) or isinstance(result, str)):
+            entry_cache[cachekey] = result
+
+        return(result)
+
+    ## =============================
+    def evaluate_variable(self, bibentry, variable, options={}):
+        '''
+        Evaluate a template variable within a bibliography entry, without using the cache of earlier results. The
+        parameters and result are as for `get_variable()`.
+        '''
+
         ## If there is no dot-indexer in the variable name, then return the entry field corresponding to the variable,
         ## if it exists in the entry.
         if ('.' not in variable):
@@ -2465,6 +4650,27 @@ class Bibdata(object):
 
         return(result)
 
+    ## =============================
+    def forget_variables(self, entrykey, fieldname=None):
+        '''
+        Drop the remembered results of evaluating variables for an entry (see `get_variable()`). This has to be called
+        whenever the entry's fields change.
+
+        Parameters
+        ----------
+        entrykey : str
+            The key of the entry whose fields changed.
+        fieldname : str, optional
+            The field that changed. (Default is to drop the results for all of the entry's fields.)
+        '''
+
+        if (fieldname == None):
+            self.variable_cache.pop(entrykey, None)
+        elif (entrykey in self.variable_cache):
+            self.variable_cache[entrykey].pop(fieldname, None)
+            self.variable_cache[entrykey].pop(None, None)
+        return
+
     ## =============================
     def format_operator_arg(self, varname):
         '''
@@ -2515,377 +4721,414 @@ class Bibdata(object):
         >>> Ramsey
         '''
 
-        ## We need to split the string by the "dot" character, but **not** when the dot lies between a pair of parentheses ---
-        ## that means that it's part of an operator argument!
-        index_elements = indexer.split('.')
-        index_elements = [i for i in index_elements if i]
-        nelements = len(index_elements)
-
-        ## If the indexing element is an integer, then we assume that it wants a list or tuple. If it finds one, then get the indexed item.
-        if index_elements[0].isdigit():
-            if not isinstance(field, (tuple, list)):
-                fieldname = '' if not isinstance(field, str) else '"' + field + '" '
-                indexname = index_elements[0]
-                msg = 'Warning 029a: the ' + fieldname + 'field of entry ' + entrykey + ' is not a list and thus is ' + \
-                      'not indexable by "' + indexname + '". Aborting template substitution'
-                bib_warning(msg, disable=self.disable)
-                return(None)
+        if (indexer not in self.indexer_pipelines):
+            self.indexer_pipelines[indexer] = self.compile_indexer(indexer)
+
+        for (function, args, last, lookup) in self.indexer_pipelines[indexer]:
+            if lookup:
+                (field, stop) = function(field, entrykey, *args)
+                if stop:
+                    return(field)
             else:
-                newfield = field[int(index_elements[0])]
-                if (nelements == 1):
-                    return(newfield)
-                else:
-                    newindexer = '.' + '.'.join(index_elements[1:])
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-
-        ## If the thing to the right of the dot-indexer is a *function*, then map the field to the function.
-        if ('(' in index_elements[0]):
-            if indexer.startswith('.initial()'):
-                options['french_initials'] = False
-                newfield = initialize_name(field, options=options)
-                newindexer = indexer[10:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.frenchinitial()'):
-                options['french_initials'] = True
-                newfield = initialize_name(field, options=options)
-                newindexer = indexer[16:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.compress()'):
-                newfield = field.replace(' ','')
-                newindexer = indexer[11:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.tie()'):
-                newfield = field.replace(' ','~')
-                newindexer = indexer[6:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.sentence_case()'):
-                newfield = sentence_case(field)
-                newindexer = indexer[16:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.ordinal()'):
-                newfield = get_edition_ordinal(field, disable=None)
-                newindexer = indexer[10:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.monthname()'):
-                if field in self.monthnames:
-                    newfield = self.monthnames[field]
-                else:
-                    newfield = field
-                newindexer = indexer[12:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.monthabbrev()'):
-                if field in self.monthabbrevs:
-                    newfield = self.monthabbrevs[field]
-                else:
-                    newfield = field
-                newindexer = indexer[14:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.to_namelist()'):
-                sep = self.options['name_separator']
-                newfield = namefield_to_namelist(field, key=entrykey, sep=sep, disable=self.disable)
-                newindexer = indexer[14:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.format_authorlist()'):
-                newfield = format_namelist(field, nametype='author', options=self.options)
-                newindexer = indexer[20:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.format_editorlist()'):
-                newfield = format_namelist(field, nametype='editor', options=self.options)
-                newindexer = indexer[20:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.lower()'):
-                newfield = purify_string(field).lower()
-                newindexer = indexer[8:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.upper()'):
-                newfield = purify_string(field).upper()
-                newindexer = indexer[8:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.exists()'):
-                newfield = '{}'
-                newindexer = indexer[9:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.null()'):
-                return(None)
-            elif indexer.startswith('.zfill('):
-                match = re.search(r'.zfill\(.*\)', indexer)
-                end_idx = match.end(0)
-                result = match.group(0)[7:-1]
-                if result:
-                    nzeros = int(result)
-                else:
-                    nzeros = 0
-                if str_is_integer(field) and (int(field) < 0):
-                    newfield = '-' + str(field[1:]).zfill(nzeros)
-                else:
-                    newfield = str(field).zfill(nzeros)
-                newindexer = indexer[end_idx:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.replace('):
-                match = re.search(r'.replace\(.*\)', indexer)
-                end_idx = match.end(0)
-                result = match.group(0)[9:-1]
-                (old, new) = result.split(',')
-                if (old in field):
-                    newfield = field.replace(old, new)
-                else:
-                    newfield = field
+                field = function(field, entrykey, options, *args)
+            if last:
+                return(field)
 
-                newindexer = indexer[end_idx:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.purify()'):
-                newfield = purify_string(field)
-                newindexer = indexer[9:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif (index_elements[0] == 'uniquify(1)'):
-                if (options['varname'] not in self.uniquify_vars):
-                    self.uniquify_vars[options['varname']] = []
-                newfield = generate_unique_name(field, self.uniquify_vars[options['varname']], extension_type='1')
-                self.uniquify_vars[options['varname']].append(newfield)
-                #print('varname=%s, field=%s, newfield=%s' % (options['varname'], field, newfield))
-                if (nelements == 1):
-                    return(newfield)
-                else:
-                    newindexer = '.'.join(index_elements[1:])
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif (index_elements[0] == 'uniquify(a)'):
-                if (options['varname'] not in self.uniquify_vars):
-                    self.uniquify_vars[options['varname']] = []
-                newfield = generate_unique_name(field, self.uniquify_vars[options['varname']], extension_type='a')
-                self.uniquify_vars[options['varname']].append(newfield)
-                #print('varname=%s, field=%s, newfield=%s' % (options['varname'], field, newfield))
-                if (nelements == 1):
-                    return(newfield)
-                else:
-                    newindexer = '.'.join(index_elements[1:])
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif (index_elements[0] == 'uniquify(A)'):
-                if (options['varname'] not in self.uniquify_vars):
-                    self.uniquify_vars[options['varname']] = []
-                newfield = generate_unique_name(field, self.uniquify_vars[options['varname']], extension_type='A')
-                self.uniquify_vars[options['varname']].append(newfield)
-                #print('varname=%s, field=%s, newfield=%s' % (options['varname'], field, newfield))
-                if (nelements == 1):
-                    return(newfield)
-                else:
-                    newindexer = '.'.join(index_elements[1:])
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.if_singular('):
-                match = re.search(r'.if_singular\(.*\)', indexer)
-                end_idx = match.end(0)
-                result = match.group(0)[13:-1]      ## remove function name and parentheses
-                (variable_to_eval, res1, res2) = result.split(',')
-
-                if (variable_to_eval not in self.bibdata[entrykey]):
-                    newfield = ''
-                elif (len(self.bibdata[entrykey][variable_to_eval]) == 1):
-                    newfield = field + self.format_operator_arg(res1)
-                else:
-                    newfield = field + self.format_operator_arg(res2)
+    ## =============================
+    def compile_indexer(self, indexer):
+        '''
+        Compile a dot-indexer (such as ".0.first.initial().tie()") into a pipeline of steps, each a bound method with
+        its arguments already parsed, so that evaluating the indexer for each entry needs no more string parsing. The
+        functions are looked up in the `index_operators` registry.
 
-                newindexer = indexer[end_idx:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.if_str_equal('):
-                match = re.search(r'.if_str_equal(\(.*\)', indexer)
-                end_idx = match.end(0)
-                result = match.group(0)[14:-1]      ## remove function name and parentheses
-                (test_str, then_form, else_form) = result.split(',')
-
-                if (field == test_str):
-                    newfield = then_form
-                else:
-                    newfield = else_form
+        Parameters
+        ----------
+        indexer : str
+            The dot-delimited indexing operator.
 
-                newindexer = indexer[end_idx:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.remove_leading_zeros()'):
-                newfield = field.lstrip('0')
-                newindexer = indexer[23:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.len()'):
-                newfield = str(len(field))
-                newindexer = indexer[6:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.if_num_equals('):
-                match = re.search(r'.if_num_equals\(.*\)', indexer)
-                end_idx = match.end(0)
-                result = match.group(0)[18:-1]                  ## remove function name and parentheses
-                (variable_to_eval, test_length, return_if_equal, return_if_unequal) = result.split(',')
-
-                if (variable_to_eval not in self.bibdata[entrykey]):
-                    newfield = ''
-                elif (int(self.bibdata[entrykey][variable_to_eval]) == int(test_length)):
-                    newfield = field + self.format_operator_arg(return_if_equal)
-                else:
-                    newfield = field + self.format_operator_arg(return_if_unequal)
+        Returns
+        -------
+        pipeline : list of tuples
+            Each step is a tuple of the function, its arguments, whether it is the last step, and whether it is a \
+            lookup (an item of a list or dict, which can end the evaluation early). If a step cannot be parsed \
+            (such as a function given the wrong number of arguments), then it is compiled into a step raising the \
+            error, so that the error is raised only for entries whose evaluation reaches that step.
+        '''
 
-                newindexer = indexer[end_idx:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.if_less_than('):
-                match = re.search(r'.if_less_than\(.*\)', indexer)
-                end_idx = match.end(0)
-                result = match.group(0)[14:-1]      ## remove function name and parentheses
-                (variable_to_eval, test_length, res1, res2) = result.split(',')
-
-                if (variable_to_eval not in self.bibdata[entrykey]):
-                    newfield = ''
-                elif (int(self.bibdata[entrykey][variable_to_eval]) < int(test_length)):
-                    newfield = field + self.format_operator_arg(res1)
-                else:
-                    newfield = field + self.format_operator_arg(res2)
+        pipeline = []
+        try:
+            while True:
+                index_elements = indexer.split('.')
+                index_elements = [i for i in index_elements if i]
+                nelements = len(index_elements)
+                element = index_elements[0]
+
+                if element.isdigit():
+                    pipeline.append((self.lookup_list_item, (int(element), element), (nelements == 1), True))
+                    if (nelements == 1):
+                        return(pipeline)
+                    indexer = '.' + '.'.join(index_elements[1:])
+                    continue
 
-                newindexer = indexer[end_idx:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            elif indexer.startswith('.if_greater_than('):
-                #print('>>>')
-                match = re.search(r'.if_greater_than\(.*\)', indexer)
-                end_idx = match.end(0)
-                result = match.group(0)[17:-1]      ## remove function name and parentheses
-                (variable_to_eval, test_length, res1, res2) = result.split(',')
-
-                if (variable_to_eval not in self.bibdata[entrykey]):
-                    newfield = ''
-                elif (int(self.bibdata[entrykey][variable_to_eval]) > int(test_length)):
-                    newfield = field + self.format_operator_arg(res1)
-                else:
-                    newfield = field + self.format_operator_arg(res2)
-
-                #print('>>>')
-                #print(self.bibdata[entrykey])
-                #print(variable_to_eval)
-                #print(int(self.bibdata[entrykey][variable_to_eval]))
-                #print(int(test_length))
-                #print(newfield)
-                #print('>>>')
-
-                newindexer = indexer[end_idx:]
-                if (nelements == 1) or (newindexer == ''):
-                    return(newfield)
-                else:
-                    return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
-            else:
-                msg = 'Warning 029c: the template for entry ' + entrykey + ' has an unknown function ' + \
-                      '"' + index_elements[0] + '". Aborting template substitution'
-                bib_warning(msg, disable=self.disable)
-                return(None)
+                if ('(' in element):
+                    if element in ('uniquify(1)', 'uniquify(a)', 'uniquify(A)'):
+                        pipeline.append((self.operator_uniquify, (element[-2],), (nelements == 1), False))
+                        if (nelements == 1):
+                            return(pipeline)
+                        indexer = '.'.join(index_elements[1:])
+                        continue
 
-        ## If the indexer is a numerical range...
-        if re.search(r'^.-?\d*:-?\d*', indexer):
-            indexer = indexer[1:]   ## remove the leading period
-            match = re.search(r'^.-?\d*:-?\d*', indexer)
-            (start_idx,end_idx) = match.group(0).split(':')
-            start_idx = int(start_idx)
-            end_idx = int(end_idx)
-            if (start_idx < 0):
-                start_idx -= 1
-
-            if (end_idx == -1):
-                newfield = field[start_idx:end_idx] + field[end_idx]
-            else:
-                newfield = field[start_idx:end_idx+1]
-            newindexer = indexer[int(match.end(0))+1:]
+                    name = indexer[1:indexer.index('(')] if indexer.startswith('.') else None
+                    (methodname, nargs, offset, pattern) = self.index_operators.get(name, (None, 0, 0, None))
+                    if (methodname != None) and (nargs == 0) and indexer.startswith('.' + name + '()'):
+                        args = ()
+                        newindexer = indexer[len(name)+3:]
+                    elif (methodname != None) and (nargs > 0):
+                        match = re.search(pattern, indexer)
+                        result = match.group(0)[offset:-1]
+                        newindexer = indexer[match.end(0):]
+                        if (name == 'zfill'):
+                            args = ((int(result) if result else 0),)
+                        else:
+                            args = tuple(result.split(','))
+                            if (len(args) != nargs):
+                                raise ValueError('the "' + name + '" function takes ' + str(nargs) + ' arguments but '
+                                                 'was given ' + str(len(args)))
+                    else:
+                        pipeline.append((self.operator_unknown, (element,), True, False))
+                        return(pipeline)
+
+                    last = (nelements == 1) or (newindexer == '') or (name == 'null')
+                    pipeline.append((getattr(self, methodname), args, last, False))
+                    if last:
+                        return(pipeline)
+                    indexer = newindexer
+                    continue
 
-            if (nelements == 1) or (newindexer == ''):
-                return(newfield)
-            else:
-                return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
+                ## A numerical range of characters (or of list items).
+                if re.search(r'^.-?\d*:-?\d*', indexer):
+                    indexer = indexer[1:]
+                    match = re.search(r'^.-?\d*:-?\d*', indexer)
+                    (start_idx,end_idx) = match.group(0).split(':')
+                    newindexer = indexer[int(match.end(0))+1:]
+                    last = (nelements == 1) or (newindexer == '')
+                    pipeline.append((self.operator_range, (int(start_idx), int(end_idx)), last, False))
+                    if last:
+                        return(pipeline)
+                    indexer = newindexer
+                    continue
 
-        if isinstance(field, str):
-            return(field)
+                pipeline.append((self.lookup_dict_item, (element,), (nelements == 1), True))
+                if (nelements == 1):
+                    return(pipeline)
+                indexer = '.' + '.'.join(index_elements[1:])
+        except Exception as error:
+            pipeline.append((self.operator_invalid, (error,), True, False))
+            return(pipeline)
+
+    ## =============================
+    def lookup_list_item(self, field, entrykey, index, indexname):
+        '''
+        Get an item of a list (an indexer step such as ".0"), returning the item and whether indexing must stop here.
+        '''
 
-        ## If the thing to the right of the dot-indexer is a string, then we have to assume that it is an index into a
-        ## dictionary. Check if the field is a dict type.
-        if not isinstance(field, dict):
+        if not isinstance(field, (tuple, list)):
             fieldname = '' if not isinstance(field, str) else '"' + field + '" '
-            indexname = index_elements[0]
-            msg = 'Warning 029d: the ' + fieldname + 'field of entry ' + entrykey + ' is not a dictionary and thus is ' + \
+            msg = 'Warning 029a: the ' + fieldname + 'field of entry ' + entrykey + ' is not a list and thus is ' + \
                   'not indexable by "' + indexname + '". Aborting template substitution'
             bib_warning(msg, disable=self.disable)
-            return(None)
-        elif (index_elements[0] not in field):
-            return(None)
-        else:
-            newfield = field[index_elements[0]]
-            if (nelements == 1):
-                return(newfield)
-            else:
-                newindexer = '.' + '.'.join(index_elements[1:])
-                return(self.get_indexed_variable(newfield, newindexer, entrykey, options=options))
+            return(None, True)
+        return(field[index], False)
+
+    ## =============================
+    def lookup_dict_item(self, field, entrykey, key):
+        '''
+        Get an item of a dictionary (an indexer step such as ".first"), returning the item and whether indexing must
+        stop here. Indexing into a string gives the string itself.
+        '''
+
+        if isinstance(field, str):
+            return(field, True)
+        elif not isinstance(field, dict):
+            msg = 'Warning 029d: the field of entry ' + entrykey + ' is not a dictionary and thus is ' + \
+                  'not indexable by "' + key + '". Aborting template substitution'
+            bib_warning(msg, disable=self.disable)
+            return(None, True)
+        elif (key not in field):
+            return(None, True)
+        return(field[key], False)
+
+    ## =============================
+    def operator_unknown(self, field, entrykey, options, name):
+        '''
+        Warn about an indexer function that is not in the `index_operators` registry.
+        '''
 
-        ## The code should never reach here!
-        msg = 'Warning 029e: Invalid field type error. Aborting template substitution'
+        msg = 'Warning 029c: the template for entry ' + entrykey + ' has an unknown function ' + \
+              '"' + name + '". Aborting template substitution'
         bib_warning(msg, disable=self.disable)
         return(None)
 
+    ## =============================
+    def operator_invalid(self, field, entrykey, options, error):
+        '''
+        Raise the error found when compiling an indexer step (see `compile_indexer()`).
+        '''
+
+        raise type(error)(*error.args)
+
+    ## =============================
+    def operator_range(self, field, entrykey, options, start_idx, end_idx):
+        '''
+        Get a range of characters (or list items) from the field. Both ends of the range are inclusive.
+        '''
+
+        if (start_idx < 0):
+            start_idx -= 1
+        if (end_idx == -1):
+            return(field[start_idx:end_idx] + field[end_idx])
+        return(field[start_idx:end_idx+1])
+
+    ## =============================
+    def operator_initial(self, field, entrykey, options):
+        '''
+        The ".initial()" operator: abbreviate a name to its initials.
+        '''
+        options['french_initials'] = False
+        return(initialize_name(field, options=options))
+
+    ## =============================
+    def operator_frenchinitial(self, field, entrykey, options):
+        '''
+        The ".frenchinitial()" operator: abbreviate a name to its initials, keeping digraphs such as "Ch".
+        '''
+        options['french_initials'] = True
+        return(initialize_name(field, options=options))
+
+    ## =============================
+    def operator_compress(self, field, entrykey, options):
+        '''
+        The ".compress()" operator: remove the spaces from a string.
+        '''
+        return(field.replace(' ',''))
+
+    ## =============================
+    def operator_tie(self, field, entrykey, options):
+        '''
+        The ".tie()" operator: replace the spaces in a string with ties.
+        '''
+        return(field.replace(' ','~'))
+
+    ## =============================
+    def operator_sentence_case(self, field, entrykey, options):
+        '''
+        The ".sentence_case()" operator.
+        '''
+        return(sentence_case(field))
+
+    ## =============================
+    def operator_ordinal(self, field, entrykey, options):
+        '''
+        The ".ordinal()" operator: give the ordinal form of an edition number.
+        '''
+        return(get_edition_ordinal(field, disable=None))
+
+    ## =============================
+    def operator_monthname(self, field, entrykey, options):
+        '''
+        The ".monthname()" operator: give the name of a month number.
+        '''
+        if field in self.monthnames:
+            return(self.monthnames[field])
+        return(field)
+
+    ## =============================
+    def operator_monthabbrev(self, field, entrykey, options):
+        '''
+        The ".monthabbrev()" operator: give the abbreviated name of a month number.
+        '''
+        if field in self.monthabbrevs:
+            return(self.monthabbrevs[field])
+        return(field)
+
+    ## =============================
+    def operator_to_namelist(self, field, entrykey, options):
+        '''
+        The ".to_namelist()" operator: split a name field into a list of name dictionaries.
+        '''
+        sep = self.options['name_separator']
+        return(namefield_to_namelist(field, key=entrykey, sep=sep, disable=self.disable))
+
+    ## =============================
+    def operator_format_authorlist(self, field, entrykey, options):
+        '''
+        The ".format_authorlist()" operator.
+        '''
+        return(self.format_names(field, 'author'))
+
+    ## =============================
+    def operator_format_editorlist(self, field, entrykey, options):
+        '''
+        The ".format_editorlist()" operator.
+        '''
+        return(self.format_names(field, 'editor'))
+
+    ## =============================
+    def format_names(self, namelist, nametype):
+        '''
+        Format a list of names with `format_namelist()`, using the options of the style. The name formatting options
+        are frozen only once per style, for the keys of the name formatting cache.
+
+        Parameters
+        ----------
+        namelist : list of dict
+            The list of name dictionaries to format.
+        nametype : str, {'author', 'editor'}
+            Whether the names are for authors or editors.
+
+        Returns
+        -------
+        namestr : str
+            The formatted list of names.
+        '''
+
+        if (self.name_format_key == None):
+            self.name_format_key = name_format_signature(self.options)
+
+        return(format_namelist(namelist, nametype=nametype, options=self.options, signature=self.name_format_key))
+
+    ## =============================
+    def operator_lower(self, field, entrykey, options):
+        '''
+        The ".lower()" operator: purify a string and convert it to lowercase.
+        '''
+        return(purify_string(field).lower())
+
+    ## =============================
+    def operator_upper(self, field, entrykey, options):
+        '''
+        The ".upper()" operator: purify a string and convert it to uppercase.
+        '''
+        return(purify_string(field).upper())
+
+    ## =============================
+    def operator_exists(self, field, entrykey, options):
+        '''
+        The ".exists()" operator: give an empty group, so that a field can be tested for without printing it.
+        '''
+        return('{}')
+
+    ## =============================
+    def operator_null(self, field, entrykey, options):
+        '''
+        The ".null()" operator: treat the variable as undefined.
+        '''
+        return(None)
+
+    ## =============================
+    def operator_purify(self, field, entrykey, options):
+        '''
+        The ".purify()" operator.
+        '''
+        return(purify_string(field))
+
+    ## =============================
+    def operator_remove_leading_zeros(self, field, entrykey, options):
+        '''
+        The ".remove_leading_zeros()" operator.
+        '''
+        return(field.lstrip('0'))
+
+    ## =============================
+    def operator_len(self, field, entrykey, options):
+        '''
+        The ".len()" operator: give the length of a string or list.
+        '''
+        return(str(len(field)))
+
+    ## =============================
+    def operator_zfill(self, field, entrykey, options, nzeros):
+        '''
+        The ".zfill(n)" operator: pad a number with leading zeros.
+        '''
+        if str_is_integer(field) and (int(field) < 0):
+            return('-' + str(field[1:]).zfill(nzeros))
+        return(str(field).zfill(nzeros))
+
+    ## =============================
+    def operator_replace(self, field, entrykey, options, old, new):
+        '''
+        The ".replace(old,new)" operator.
+        '''
+        if (old in field):
+            return(field.replace(old, new))
+        return(field)
+
+    ## =============================
+    def operator_uniquify(self, field, entrykey, options, extension_type):
+        '''
+        The ".uniquify(1)", ".uniquify(a)" and ".uniquify(A)" operators: add a suffix so that the value differs from
+        every earlier value of the same variable.
+        '''
+        if (options['varname'] not in self.uniquify_vars):
+            self.uniquify_vars[options['varname']] = []
+        newfield = generate_unique_name(field, self.uniquify_vars[options['varname']], extension_type=extension_type)
+        self.uniquify_vars[options['varname']].append(newfield)
+        return(newfield)
+
+    ## =============================
+    def operator_if_singular(self, field, entrykey, options, variable_to_eval, res1, res2):
+        '''
+        The ".if_singular(variable,res1,res2)" operator.
+        '''
+        if (variable_to_eval not in self.bibdata[entrykey]):
+            return('')
+        elif (len(self.bibdata[entrykey][variable_to_eval]) == 1):
+            return(field + self.format_operator_arg(res1))
+        return(field + self.format_operator_arg(res2))
+
+    ## =============================
+    def operator_if_str_equal(self, field, entrykey, options, test_str, then_form, else_form):
+        '''
+        The ".if_str_equal(test,then,else)" operator.
+        '''
+        if (field == test_str):
+            return(then_form)
+        return(else_form)
+
+    ## =============================
+    def operator_if_num_equals(self, field, entrykey, options, variable_to_eval, test_length, res1, res2):
+        '''
+        The ".if_num_equals(variable,n,res1,res2)" operator.
+        '''
+        if (variable_to_eval not in self.bibdata[entrykey]):
+            return('')
+        elif (int(self.bibdata[entrykey][variable_to_eval]) == int(test_length)):
+            return(field + self.format_operator_arg(res1))
+        return(field + self.format_operator_arg(res2))
+
+    ## =============================
+    def operator_if_less_than(self, field, entrykey, options, variable_to_eval, test_length, res1, res2):
+        '''
+        The ".if_less_than(variable,n,res1,res2)" operator.
+        '''
+        if (variable_to_eval not in self.bibdata[entrykey]):
+            return('')
+        elif (int(self.bibdata[entrykey][variable_to_eval]) < int(test_length)):
+            return(field + self.format_operator_arg(res1))
+        return(field + self.format_operator_arg(res2))
+
+    ## =============================
+    def operator_if_greater_than(self, field, entrykey, options, variable_to_eval, test_length, res1, res2):
+        '''
+        The ".if_greater_than(variable,n,res1,res2)" operator.
+        '''
+        if (variable_to_eval not in self.bibdata[entrykey]):
+            return('')
+        elif (int(self.bibdata[entrykey][variable_to_eval]) > int(test_length)):
+            return(field + self.format_operator_arg(res1))
+        return(field + self.format_operator_arg(res2))
+
     ## =============================
     def get_indexed_vars_in_template(self, templatestr):
         '''
@@ -2935,8 +5178,11 @@ class Bibdata(object):
         ## Make a list of the variables in the templatestr so we can do string compares. To do this, we get the
         ## list of indexed variables, select only the first one (they should all be the same), and then strip off
         ## the index from the end of the variable.
-        template_indexed_vars = self.get_indexed_vars_in_template(templatestr)
-        indexed_var = get_variable_name_elements(template_indexed_vars[0])['name']
+        ## The result depends only on the template, so it is kept for the next entry.
+        if (templatestr not in self.loop_name_vars):
+            template_indexed_vars = self.get_indexed_vars_in_template(templatestr)
+            self.loop_name_vars[templatestr] = get_variable_name_elements(template_indexed_vars[0])['name']
+        indexed_var = self.loop_name_vars[templatestr]
 
         if (self.implicit_loop_pairs[indexed_var] in entry):
             listname = self.implicit_loop_pairs[indexed_var]
@@ -3038,11 +5284,73 @@ def stringsplit(s, sep=r' |(?<!\\)~'):
 
     return(tokens)
 
+## =============================
+class NameDict(dict):
+    '''
+    A read-only dictionary of the parts of one person's name, as found in the lists returned by
+    `namefield_to_namelist()`. Since these lists are cached and shared, they cannot be changed in place. To modify a
+    name, make a copy of it first with `dict(namedict)`.
+    '''
+
+    def readonly(self, *args, **kwargs):
+        raise TypeError('A parsed name cannot be changed in place. Make a copy of it with "dict()" first.')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = readonly
+
+    def __reduce__(self):
+        return(NameDict, (dict(self),))
+
+## =============================
+class NameList(list):
+    '''
+    A read-only list of the `NameDict` names parsed from a name field by `namefield_to_namelist()`. To modify the list,
+    make a copy of it first with `list(namelist)`.
+    '''
+
+    def readonly(self, *args, **kwargs):
+        raise TypeError('A parsed name list cannot be changed in place. Make a copy of it with "list()" first.')
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = readonly
+    append = extend = insert = pop = remove = reverse = sort = clear = readonly
+
+    def __reduce__(self):
+        return(NameList, (list(self),))
+
+## =============================
+def namelist_cache_info():
+    '''
+    Get the statistics of the cache of parsed name fields used by `namefield_to_namelist()`.
+
+    Returns
+    -------
+    info : dict
+        A dictionary with keys `hits` and `misses` (the number of name fields found in the cache, and not found, so \
+        far), `size` (the number of name fields now in the cache), and `maxsize` (the limit on its size).
+    '''
+
+    return({'hits':namelist_cache_stats['hits'], 'misses':namelist_cache_stats['misses'], 'size':len(namelist_cache),
+            'maxsize':namelist_cache_maxsize})
+
+## =============================
+def clear_namelist_cache():
+    '''
+    Empty the cache of parsed name fields used by `namefield_to_namelist()`, and reset its statistics.
+    '''
+
+    namelist_cache.clear()
+    namelist_cache_stats['hits'] = 0
+    namelist_cache_stats['misses'] = 0
+    return
+
 ## =============================
 def namefield_to_namelist(namefield, key=None, sep='and', disable=None):
     '''
     Parse a name field ("author" or "editor") of a BibTeX entry into a list of dicts, one for each person.
 
+    The same name fields turn up again and again, so the most recently parsed ones are kept in a cache (of up to
+    `namelist_cache_maxsize` fields; see `namelist_cache_info()`), and the cached result is shared by every caller. A
+    field whose parsing issues a warning is not kept, so that the warning is issued again for the next entry with it.
+
     Parameters
     ----------
     namefield : str
@@ -3056,80 +5364,171 @@ def namefield_to_namelist(namefield, key=None, sep='and', disable=None):
 
     Returns
     -------
-    namelist : list
-        A list of dictionaries, with one dictionary for each name. Each dict has keys "first", "middle", "prefix", \
-        "last", and "suffix". The "last" key is the only one that is required.
+    namelist : NameList
+        A (read-only) list of dictionaries, with one dictionary for each name. Each dict has keys "first", "middle", \
+        "prefix", "last", and "suffix". The "last" key is the only one that is required.
     '''
 
-    namefield = namefield.strip()
-    namelist = []
-    sep_pattern = re.compile(r'\s'+sep+'\s')
+    cachekey = (namefield, sep)
+    if (cachekey in namelist_cache):
+        namelist_cache_stats['hits'] += 1
+        namelist_cache.move_to_end(cachekey)
+        return(namelist_cache[cachekey])
 
-    ## Look for common typos.
-    if re.search(r'\s'+sep+',\s', namefield):
-        bib_warning('Warning 017a: The name string in entry "' + key + '" has " '+sep+', ", which is likely a'
-             ' typo. Continuing on anyway ...', disable)
-    if re.search(r', '+sep, namefield):
-        bib_warning('Warning 017b: The name string in entry "' + key + '" has ", '+sep+'", which is likely a'
-             ' typo. Continuing on anyway ...', disable)
-    if re.search(r'\s'+sep+'\s+'+sep+'\s', namefield):
-        bib_warning('Warning 017c: The name string in entry "' + key + '" has two "'+sep+'"s separated by spaces, '
+    namelist_cache_stats['misses'] += 1
+    nwarnings = warning_count
+    namelist = NameList([NameDict(namedict) for namedict in parse_namefield(namefield, key, sep, disable)])
+    if (warning_count == nwarnings):
+        namelist_cache[cachekey] = namelist
+        if (len(namelist_cache) > namelist_cache_maxsize):
+            namelist_cache.popitem(last=False)
+
+    return(namelist)
+
+## =============================
+def parse_namefield(namefield, key=None, sep='and', disable=None):
+    '''
+    Parse a name field into a list of name dictionaries, without using the cache of `namefield_to_namelist()`. The
+    parameters are as for `namefield_to_namelist()`.
+
+    Returns
+    -------
+    namelist : list of dict
+        The (modifiable) list of name dictionaries.
+    '''
+
+    namefield = namefield.strip()
+    namelist = []
+
+    ## Scan the string of names once, splitting it into individual strings, one for each complete name, and each name
+    ## into its tokens, while looking for common typos. The names are split only where the word "and" is surrounded by
+    ## whitespace at brace level zero, so that "{and}" and "word~and~word" will not allow the split.
+    (names, typos) = scan_namefield(namefield, sep)
+    if ('017a' in typos):
+        bib_warning('Warning 017a: The name string in entry "' + key + '" has " '+sep+', ", which is likely a'
+             ' typo. Continuing on anyway ...', disable)
+    if ('017b' in typos):
+        bib_warning('Warning 017b: The name string in entry "' + key + '" has ", '+sep+'", which is likely a'
+             ' typo. Continuing on anyway ...', disable)
+    if ('017c' in typos):
+        bib_warning('Warning 017c: The name string in entry "' + key + '" has two "'+sep+'"s separated by spaces, '
              'which is likely a typo. Continuing on anyway ...', disable)
         ## Replace the two "and"s with just one "and".
-        namefield = re.sub(r'(?<=\s)'+sep+'\s+'+sep+'(?=\s)', namefield, sep)
-
-    ## Split the string of names into individual strings, one for each complete name. Here we can split on whitespace
-    ## surround the word "and" so that "{and}" and "word~and~word" will not allow the split. Need to treat the case of a
-    ## single author separate from that of multiple authors in order to return a single-element *list* rather than a
-    ## scalar.
-    if not re.search(sep_pattern, namefield):
-        namedict = namestr_to_namedict(namefield, disable)
+        namefield = re.sub(r'(?<=\s)'+sep+r'\s+'+sep+r'(?=\s)', sep, namefield)
+        (names, typos) = scan_namefield(namefield, sep)
+
+    for name in names:
+        namedict = namestr_to_namedict(name['namestr'], disable, name)
         if namedict:
             namelist.append(namedict)
-    else:
-        if '{' not in namefield:
-            names = re.split(sep_pattern, namefield.strip())
-        else:
-            ## If there are braces in the string, then we need to be careful to only allow splitting of the names when
-            ## ' and ' is at brace level 0. This requires replacing re.split() with a bunch of low-level code.
-            z = get_delim_levels(namefield, ('{','}'))
-            separators = []
-
-            for match in re.finditer(sep_pattern, namefield):
-                (i,j) = match.span()
-                if (z[i] == 0):
-                    ## Record the indices of the start and end of the match.
-                    separators.append((i,j))
-
-            num_names = len(separators)
-            names = []
-            if (num_names == 0):
-                names.append(namefield.strip())
-            if (num_names > 0) and (separators[0][0] > 0):
-                names.append(namefield[:separators[0][0]].strip())
-
-            ## Go through each match's indices and split the string at each.
-            for n in range(num_names):
-                if (n == num_names-1):
-                    j = separators[n][1]            ## the end of *this* separator
-                    names.append(namefield[j:].strip())
-                else:
-                    nexti = separators[n+1][0]      ## the beginning of the *next* separator
-                    j = separators[n][1]            ## the end of *this* separator
-                    names.append(namefield[j:nexti].strip())
-
-        nauthors = len(names)
-        for i in range(nauthors):
-            namedict = namestr_to_namedict(names[i], disable)
-            if namedict:
-                namelist.append(namedict)
 
     return(namelist)
 
+## =============================
+def scan_namefield(namefield, sep=None):
+    '''
+    Break up a name field into its names, and each name into its tokens, in a single pass over the string.
+
+    The scan keeps track of the brace level as it goes, so that only the separators at brace level zero act: the word
+    `sep` with whitespace on either side separates names, a comma separates the parts of a name, and a space or a tie
+    ("~", but not the tilde accent "\~") separates name tokens. A closing brace with no matching opening brace is
+    ignored. The common typos in the use of `sep` are noted along the way.
+
+    Parameters
+    ----------
+    namefield : str
+        The name field to scan, with no whitespace at either end.
+    sep : str, optional
+        The word separating the names. (Default is to scan the string as a single name.)
+
+    Returns
+    -------
+    names : list of dict
+        A dictionary for each name, with keys "namestr" (the name string, stripped of whitespace), "commas", "spaces", \
+        and "breaks" (the positions in the name string of the commas, the spaces, and the spaces and ties, at brace \
+        level zero), and "bracepos" and "bracelevels" (the positions of the braces, and the brace level just after \
+        each).
+    typos : set of str
+        The numbers of the typo warnings that apply to the field: "017a" for " and, ", "017b" for ", and", and \
+        "017c" for two "and"s separated by whitespace.
+    '''
+
+    typos = set()
+    nsep = len(sep) if sep else 0
+    level = 0               ## the brace level
+    start = 0               ## the start of the current name
+    resume = 0              ## the first position at which another name separator can begin
+    found = []
+    (commas, spaces, breaks, bracepos, bracelevels) = ([], [], [], [], [])
+
+    for match in re.finditer(r'[\s{}~,]', namefield):
+        i = match.start()
+        c = namefield[i]
+        if (c == '{'):
+            level += 1
+            bracepos.append(i)
+            bracelevels.append(level)
+        elif (c == '}'):
+            if (level > 0): level -= 1
+            bracepos.append(i)
+            bracelevels.append(level)
+        elif (c == ','):
+            if (level == 0): commas.append(i)
+            if sep and namefield.startswith(' '+sep, i+1):
+                typos.add('017b')
+        elif (c == '~'):
+            if (level == 0) and (namefield[i-1:i] != '\\'): breaks.append(i)
+        else:
+            if (level == 0) and (c == ' '):
+                spaces.append(i)
+                breaks.append(i)
+            if not sep or not namefield.startswith(sep, i+1):
+                continue
+
+            ## We have whitespace followed by the separator word. Look at what comes after it.
+            j = i + 1 + nsep
+            if (namefield[j:j+1] == ',') and namefield[j+1:j+2].isspace():
+                typos.add('017a')
+            if not namefield[j:j+1].isspace():
+                continue
+            k = j + 1
+            while namefield[k:k+1].isspace(): k += 1
+            if namefield.startswith(sep, k) and namefield[k+nsep:k+nsep+1].isspace():
+                typos.add('017c')
+
+            ## Separators cannot overlap one another (as in "x and and y"), and only those at brace level zero split
+            ## the names.
+            if (i < resume):
+                continue
+            resume = j + 1
+            if (level == 0):
+                found.append((start, i, commas, spaces, breaks, bracepos, bracelevels))
+                start = j + 1
+                (commas, spaces, breaks, bracepos, bracelevels) = ([], [], [], [], [])
+
+    found.append((start, len(namefield), commas, spaces, breaks, bracepos, bracelevels))
+
+    ## Strip the whitespace from either end of each name, and give the positions relative to the start of the name.
+    names = []
+    for (start, end, commas, spaces, breaks, bracepos, bracelevels) in found:
+        namestr = namefield[start:end]
+        start += len(namestr) - len(namestr.lstrip())
+        namestr = namestr.strip()
+        end = start + len(namestr)
+        name = {'namestr':namestr, 'bracelevels':bracelevels}
+        name['commas'] = [i-start for i in commas]
+        name['spaces'] = [i-start for i in spaces if (start <= i < end)]
+        name['breaks'] = [i-start for i in breaks if (start <= i < end)]
+        name['bracepos'] = [i-start for i in bracepos]
+        names.append(name)
+
+    return(names, typos)
+
 ## ===================================
 def initialize_name(name, options=None, debug=False):
     '''
-    From an input name element (first, middle, prefix, last, or suffix) , convert it to its initials.
+    From an input name element (first, middle, prefix, last, or suffix) , convert it to its initials. The result is kept
+    in the name formatting cache (see `name_format_cache_info()`).
 
     Parameters
     ----------
@@ -3151,6 +5550,14 @@ def initialize_name(name, options=None, debug=False):
     if (options == None): options = {}
     if ('period_after_initial' not in options): options['period_after_initial'] = False
     if ('french_initials' not in options): options['french_initials'] = False
+
+    cachekey = ('initial', name, bool(options['period_after_initial']), bool(options['french_initials']))
+    if (cachekey in name_format_cache) and not debug:
+        name_format_cache_stats['hits'] += 1
+        name_format_cache.move_to_end(cachekey)
+        return(name_format_cache[cachekey])
+    name_format_cache_stats['misses'] += 1
+
     if ('{' in name) and ('}' in name):
         name = purify_string(name)
 
@@ -3197,6 +5604,7 @@ def initialize_name(name, options=None, debug=False):
 
     if debug: print('Initializer input [' + name + '] --> output [' + newname + ']')
 
+    store_formatted_name(cachekey, newname)
     return(newname)
 
 ## ===================================
@@ -3952,7 +6360,7 @@ def brace_split(string, splitter=" "):
     return splits
 
 ## =============================
-def namestr_to_namedict(namestr, disable=None):
+def namestr_to_namedict(namestr, disable=None, scan=None):
     '''
     Take a BibTeX string representing a single person's name and parse it into its first, middle, last, etc pieces.
 
@@ -3968,6 +6376,8 @@ def namestr_to_namedict(namestr, disable=None):
         The string containing a single person's name, in BibTeX format
     disable : list of int, optional
         The list of warning message numbers to ignore.
+    scan : dict, optional
+        The name as already scanned by `scan_namefield()`. (Default is to scan `namestr` here.)
 
     Returns
     -------
@@ -3975,45 +6385,46 @@ def namestr_to_namedict(namestr, disable=None):
         A dictionary with keys "first", "middle", "prefix", "last", and "suffix".
     '''
 
-    namestr = namestr.strip()
-
-    ## First we check to see if the namestr contains *only* a comma plus whitespace. This is definitely a format error
-    ## of some sort. Second, we check if the comma has whitespace to its right-hand side. If not, then it is likely a typo,
-    ## in which case issue a Warning but continue. If there is a valid comma within the string, then build the
-    ## delimiter level list so we can check whether the comma is at delimiter level 0 (and therefore a valid comma
-    ## for determining name structure). Using this, determine the locations of "valid" commas.
-    if (',' in namestr):
-        if (namestr.strip() == ','):
-            bib_warning('Warning 038: A name in the bibliography file contains only a lone comma, and so is a typo. Skipping ...', disable)
-            return({})
-        z = get_delim_levels(namestr, ('{','}'))
-        commapos = []
-        for match in re.finditer(',', namestr):
-            i = match.start()
-            if (len(namestr) > i) and not (namestr[i] == ',') and not namestr[i+1].isspace():
-                bib_warning('Warning 037: A comma appears within the name string "' + namestr + '" and has no whitespace following it, and so is likely a typo. Ignoring ...', disable)
-            if (z[i] == 0): commapos.append(i)
-    else:
-        commapos = []
+    if (scan == None):
+        scan = scan_namefield(namestr.strip())[0][0]
+    namestr = scan['namestr']
+    commapos = scan['commas']
+
+    ## First we check to see if the namestr contains *only* a comma. This is definitely a format error of some sort.
+    ## Second, we check if each comma (at brace level zero, and therefore a valid comma for determining name structure)
+    ## has whitespace to its right-hand side. If not, then it is likely a typo, in which case issue a Warning but
+    ## continue.
+    if (namestr == ','):
+        bib_warning('Warning 038: A name in the bibliography file contains only a lone comma, and so is a typo. '
+                    'Skipping ...', disable)
+        return({})
+    for i in commapos:
+        if namestr[i+1:i+2] and not namestr[i+1].isspace():
+            bib_warning('Warning 037: A comma appears within the name string "' + namestr + '" and has no whitespace '
+                        'following it, and so is likely a typo. Ignoring ...', disable)
+
+    ## Split the name string into its comma-separated parts.
+    bounds = [-1] + commapos + [len(namestr)]
+    parts = [namestr[bounds[k]+1:bounds[k+1]] for k in range(len(bounds)-1)]
 
     ## Note: switch on "len(commapos)" here rather than on "(',' not in namestr)" because the latter will produce an
     ## error when the comma occurs at brace levels other than zero.
     if (len(commapos) == 0):
-        ## Allow nametokens to be split by spaces *or* word ties ('~' == unbreakable spaces), except when the '~' is
-        ## preceded by a backslash, in which case we have the LaTeX markup for the tilde accent. We use "stringsplit()"
-        ## rather than the standard string object's "split()" function because we don't want the split to be applied
-        ## when the separator is not at brace level zero.
-        nametokens = stringsplit(namestr, r' |(?<!\\)~')
+        ## Split the name into tokens at the spaces *or* word ties ('~' == unbreakable spaces) found at brace level zero
+        ## by the scan. (A '~' preceded by a backslash is the LaTeX markup for the tilde accent, and not a tie.)
+        bounds = [-1] + scan['breaks'] + [len(namestr)]
+        nametokens = [namestr[bounds[k]+1:bounds[k+1]] for k in range(len(bounds)-1)]
 
         for n in nametokens:
             n_temp = n.strip('{').strip('}')[:-1]
             ## If we find a dot which is not preceded by a backslash and not succeeded by a dash. Also, we shouldn't
             ## care about dots appearing within curle braces, so we have to check for that as well.
-            z = get_delim_levels(namestr, ('{','}'))
             for match in re.finditer(r'(?<!\\)\.(?!-)', n_temp):
                 i = match.start()
                 j = match.end()
-                if (z[i] == 0) and (namestr[j+1] != ')'):
+                k = bisect.bisect_right(scan['bracepos'], i)
+                level = scan['bracelevels'][k-1] if (k > 0) else 0
+                if (level == 0) and (namestr[j+1:j+2] != ')'):
                     bib_warning('Warning 021: The name token "' + n + '" in namestring "' + namestr + \
                          '" has a "." inside it, which may be a typo. Ignoring ...', disable)
 
@@ -4031,9 +6442,16 @@ def namestr_to_namedict(namestr, disable=None):
 
     elif (len(commapos) == 1):
         namedict = {}
-        (firstpart, secondpart) = splitat(namestr, commapos)
-        first_nametokens = brace_split(firstpart.strip(),' ')
-        second_nametokens = brace_split(secondpart.strip(),' ')
+        ## Split each of the two parts into tokens at the spaces found at brace level zero by the scan, ignoring any
+        ## whitespace at either end of the part.
+        partokens = []
+        for (a,b) in ((0,commapos[0]), (commapos[0]+1,len(namestr))):
+            part = namestr[a:b]
+            a += len(part) - len(part.lstrip())
+            b = a + len(part.strip())
+            bounds = [a-1] + [i for i in scan['spaces'] if (a <= i < b)] + [b]
+            partokens.append([namestr[bounds[k]+1:bounds[k+1]].strip() for k in range(len(bounds)-1)])
+        (first_nametokens, second_nametokens) = partokens
 
         if (len(first_nametokens) == 1):
             namedict['last'] = first_nametokens[0]
@@ -4048,7 +6466,7 @@ def namestr_to_namedict(namestr, disable=None):
 
     elif (len(commapos) == 2):
         namedict = {}
-        (firstpart, secondpart, thirdpart) = splitat(namestr, commapos)
+        (firstpart, secondpart, thirdpart) = parts
         first_nametokens = firstpart.strip().split(' ')
         second_nametokens = secondpart.strip().split(' ')
         third_nametokens = thirdpart.strip().split(' ')
@@ -4076,7 +6494,7 @@ def namestr_to_namedict(namestr, disable=None):
     elif (len(commapos) == 3):
         ## The name format is (first,middle,prefix,last).
         namedict = {}
-        (firstpart, secondpart, thirdpart, fourthpart) = splitat(namestr, commapos)
+        (firstpart, secondpart, thirdpart, fourthpart) = parts
         namedict['first'] = firstpart.strip()
         namedict['middle'] = secondpart.strip()
         namedict['prefix'] = thirdpart.strip()
@@ -4086,7 +6504,7 @@ def namestr_to_namedict(namestr, disable=None):
     elif (len(commapos) == 4):
         ## The name format is (first,middle,prefix,last,suffix).
         namedict = {}
-        (firstpart, secondpart, thirdpart, fourthpart, fifthpart) = splitat(namestr, commapos)
+        (firstpart, secondpart, thirdpart, fourthpart, fifthpart) = parts
         namedict['first'] = firstpart.strip()
         namedict['middle'] = secondpart.strip()
         namedict['prefix'] = thirdpart.strip()
@@ -4252,9 +6670,10 @@ def export_bibfile(bibdata, filename, abbrevs=None):
         if (key == 'preamble'): continue
 
         ## Since you're about to delete an item from the "entry" dictionary, and it is a view into the main database
-        ## dictionary, you need to make a deep copy of it first before deleteing or else it will delete the entry from
-        ## the main database as well!
-        entry = copy.deepcopy(bibdata[key])
+        ## dictionary, you need to make a copy of it first before deleteing or else it will delete the entry from the
+        ## main database as well! (The fields are all strings, so a shallow copy is enough, and it also works for
+        ## entries that are read-only overlays on a shared database.)
+        entry = dict(bibdata[key])
         filehandle.write('@' + entry['entrytype'].upper() + '{' + key + ',\n')
         del entry['entrytype']
         nkeys = len(entry)
@@ -4384,6 +6803,78 @@ def filter_script(line):
 
     return(filtered)
 
+## =============================
+def get_script_fields(tree, functions, entryname='entry', visited=None):
+    '''
+    Find the fields of a bibliography entry that a piece of user script reads. The entry may only be used by
+    subscripting it with a string (`entry['year']`), or by passing it to another user-defined function which in turn
+    uses it in this way, since only then does the script fail for an entry lacking the fields. If the script uses the
+    entry in any other way (such as `entry.get('note', '')` or `'note' in entry`, which give a result even when the
+    field is missing), or can reach the entry through one of the other names the scripts are given (`bibdata` or
+    `c`), then the fields it reads are unknown.
+
+    Parameters
+    ----------
+    tree : ast.AST
+        The parsed script (an expression, or the definition of a function).
+    functions : dict
+        The definitions of the user-defined functions (as `ast.FunctionDef` objects), keyed by function name.
+    entryname : str, optional
+        The name by which the script refers to the entry.
+    visited : set, optional
+        (For recursion) The names of the functions already being examined.
+
+    Returns
+    -------
+    fields : frozenset or None
+        The names of the fields the script reads, or None if they cannot be determined.
+    '''
+
+    import ast
+    if (visited == None):
+        visited = set()
+
+    parents = {}
+    for node in ast.walk(tree):
+        for child in ast.iter_child_nodes(node):
+            parents[child] = node
+
+    fields = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Name):
+            continue
+        if (node.id in ('bibdata', 'c')):
+            return(None)
+        if (node.id != entryname):
+            continue
+        if not isinstance(node.ctx, ast.Load):
+            return(None)
+
+        parent = parents.get(node)
+        if isinstance(parent, ast.Subscript) and (parent.value is node):
+            if not isinstance(parent.slice, ast.Constant) or not isinstance(parent.slice.value, str):
+                return(None)
+            fields.add(parent.slice.value)
+        elif isinstance(parent, ast.Call) and (node in parent.args) and isinstance(parent.func, ast.Name):
+            ## The entry is passed on to a user-defined function, so look at what that function does with it.
+            funcname = parent.func.id
+            if (funcname not in functions):
+                return(None)
+            if (funcname in visited):
+                continue
+            funcdef = functions[funcname]
+            argnum = parent.args.index(node)
+            if funcdef.args.vararg or (argnum >= len(funcdef.args.args)):
+                return(None)
+            subfields = get_script_fields(funcdef, functions, funcdef.args.args[argnum].arg, visited | set([funcname]))
+            if (subfields == None):
+                return(None)
+            fields.update(subfields)
+        else:
+            return(None)
+
+    return(frozenset(fields))
+
 ## =============================
 def str_is_integer(s):
     '''
@@ -4420,6 +6911,14 @@ def bib_warning(msg, disable=None):
         The list of warning message numbers that the user wishes to disable (i.e. ignore).
     '''
 
+    global warning_count
+
+    if (warning_log != None):
+        warning_log.append((None, msg))
+        return
+
+    warning_count += 1
+
     if (disable == None):
         print(msg)
         return
@@ -4438,6 +6937,40 @@ def bib_warning(msg, disable=None):
 
     return
 
+## =============================
+def replace_template_markers(templatestr):
+    '''
+    Replace the special commands that stand in for characters that have a meaning in template strings.
+
+    Parameters
+    ----------
+    templatestr : str
+        The template string, after substituting all of its variables.
+
+    Returns
+    -------
+    templatestr : str
+        The string with all of the special commands replaced.
+    '''
+
+    ## We need to replace the hash symbol too because that indicates a comment when placed inside a template string.
+    if (r'{\makeopenbracket}' in templatestr):
+        templatestr = templatestr.replace(r'{\makeopenbracket}', '[')
+    if (r'{\makeclosebracket}' in templatestr):
+        templatestr = templatestr.replace(r'{\makeclosebracket}', ']')
+    if (r'{\makeverticalbar}' in templatestr):
+        templatestr = templatestr.replace(r'{\makeverticalbar}', '|')
+    if (r'{\makegreaterthan}' in templatestr):
+        templatestr = templatestr.replace(r'{\makegreaterthan}', '>')
+    if (r'{\makelessthan}' in templatestr):
+        templatestr = templatestr.replace(r'{\makelessthan}', '<')
+    if (r'{\makehashsign}' in templatestr):
+        templatestr = templatestr.replace(r'{\makehashsign}', '\\#')
+    if (r'{\makeellipsis}' in templatestr):
+        templatestr = templatestr.replace(r'{\makeellipsis}', '...')
+
+    return(templatestr)
+
 ## =============================
 def create_citation_alpha(entry, options):
     '''
@@ -4565,10 +7098,72 @@ def get_variable_name_elements(variable):
     return(var_dict)
 
 ## =============================
-def format_namelist(namelist, nametype='author', options=None):
+def name_format_signature(options):
+    '''
+    Fill in the defaults of any name formatting options missing from a dictionary of options, and freeze the values of
+    the options that affect how names are formatted, for use in the keys of the name formatting cache.
+
+    Parameters
+    ----------
+    options : dict
+        The dictionary of keyword-based options. Any missing name formatting options are added to it.
+
+    Returns
+    -------
+    signature : tuple
+        The values of the name formatting options.
+    '''
+
+    for (key,default) in name_format_defaults:
+        if (key not in options): options[key] = default
+
+    return(tuple([options[key] for (key,default) in name_format_defaults]) + \
+           (options.get('french_initials'), options.get('edmsg1'), options.get('edmsg2')))
+
+## =============================
+def name_format_cache_info():
+    '''
+    Get the statistics of the cache of formatted names used by `initialize_name()`, `namedict_to_formatted_namestr()`,
+    and `format_namelist()`.
+
+    Returns
+    -------
+    info : dict
+        A dictionary with keys `hits` and `misses` (the number of results found in the cache, and not found, so far), \
+        `size` (the number of results now in the cache), and `maxsize` (the limit on its size).
+    '''
+
+    return({'hits':name_format_cache_stats['hits'], 'misses':name_format_cache_stats['misses'],
+            'size':len(name_format_cache), 'maxsize':name_format_cache_maxsize})
+
+## =============================
+def clear_name_format_cache():
+    '''
+    Empty the cache of formatted names, and reset its statistics.
+    '''
+
+    name_format_cache.clear()
+    name_format_cache_stats['hits'] = 0
+    name_format_cache_stats['misses'] = 0
+    return
+
+## =============================
+def store_formatted_name(cachekey, result):
+    '''
+    Add a result to the name formatting cache, dropping the least recently used result if the cache is full.
+    '''
+
+    name_format_cache[cachekey] = result
+    if (len(name_format_cache) > name_format_cache_maxsize):
+        name_format_cache.popitem(last=False)
+    return
+
+## =============================
+def format_namelist(namelist, nametype='author', options=None, signature=None):
     '''
     Format a list of dictionaries (one dict for each person) into a long string, with the format according to the
-    directives in the bibliography style template.
+    directives in the bibliography style template. The result is kept in the name formatting cache (see
+    `name_format_cache_info()`).
 
     Parameters
     ----------
@@ -4578,6 +7173,8 @@ def format_namelist(namelist, nametype='author', options=None):
         Whether the names are for authors or editors.
     options : dict, optional
         The dictionary of keyword-based options.
+    signature : tuple, optional
+        The result of `name_format_signature(options)`, if the caller already has it.
 
     Returns
     -------
@@ -4586,17 +7183,16 @@ def format_namelist(namelist, nametype='author', options=None):
     '''
 
     if (options == None): options = {}
-    if ('use_firstname_initials' not in options): options['use_firstname_initials'] = True
-    if ('namelist_format' not in options):  options['namelist_format'] = 'first_name_first'
-    if ('maxauthors' not in options):  options['maxauthors'] = 9
-    if ('minauthors' not in options):  options['minauthors'] = 9
-    if ('maxeditors' not in options):  options['maxeditors'] = 5
-    if ('mineditors' not in options):  options['mineditors'] = 5
-    if ('etal_message' not in options):  options['etal_message'] = '\\textit{et al.}'
-    if ('use_name_ties' not in options):  options['use_name_ties'] = False
-    if ('terse_inits' not in options):  options['terse_inits'] = False
-    if ('french_intials' not in options):  options['french_intials'] = False
-    if ('period_after_initial' not in options):  options['period_after_initial'] = True
+    if (signature == None): signature = name_format_signature(options)
+
+    people = tuple([(person.get('first'), person.get('middle'), person.get('prefix'), person.get('last'),
+                     person.get('suffix')) for person in namelist])
+    cachekey = ('namelist', nametype, signature, people)
+    if (cachekey in name_format_cache):
+        name_format_cache_stats['hits'] += 1
+        name_format_cache.move_to_end(cachekey)
+        return(name_format_cache[cachekey])
+    name_format_cache_stats['misses'] += 1
 
     ## First get all of the options variables needed below, depending on whether the function is operating on a list of
     ## authors or a list of editors. Second, insert "authorlist" into the bibliography database entry so that other
@@ -4629,7 +7225,7 @@ def format_namelist(namelist, nametype='author', options=None):
             continue
 
         ## From the person's name dictionary, create a string of the name in the format desired for the final BBL file.
-        formatted_name = namedict_to_formatted_namestr(person, options=options)
+        formatted_name = namedict_to_formatted_namestr(person, options=options, signature=signature)
         new_namelist.append(formatted_name)
 
     ## Now that we have the complete list of pre-formatted names, we need to join them together into a single string
@@ -4660,12 +7256,14 @@ def format_namelist(namelist, nametype='author', options=None):
             edmsg = ', eds' if ('edmsg2' not in options) else options['edmsg2']
         namestr += edmsg
 
+    store_formatted_name(cachekey, namestr)
     return(namestr)
 
 ## =============================
-def namedict_to_formatted_namestr(namedict, options=None):
+def namedict_to_formatted_namestr(namedict, options=None, signature=None):
     '''
-    Convert a name dictionary into a formatted name string.
+    Convert a name dictionary into a formatted name string. The result is kept in the name formatting cache (see
+    `name_format_cache_info()`).
 
     Parameters
     ----------
@@ -4673,6 +7271,8 @@ def namedict_to_formatted_namestr(namedict, options=None):
         The name dictionary (contains a required key "last" and optional keys "first", "middle", "prefix", and "suffix".
     options : dict, optional
         Dictionary of formatting options.
+    signature : tuple, optional
+        The result of `name_format_signature(options)`, if the caller already has it.
 
     Returns
     -------
@@ -4681,17 +7281,15 @@ def namedict_to_formatted_namestr(namedict, options=None):
     '''
 
     if (options == None): options = {}
-    if ('use_firstname_initials' not in options): options['use_firstname_initials'] = True
-    if ('namelist_format' not in options):  options['namelist_format'] = 'first_name_first'
-    if ('maxauthors' not in options):  options['maxauthors'] = 9
-    if ('minauthors' not in options):  options['minauthors'] = 9
-    if ('maxeditors' not in options):  options['maxeditors'] = 5
-    if ('mineditors' not in options):  options['mineditors'] = 5
-    if ('etal_message' not in options):  options['etal_message'] = '\\textit{et al.}'
-    if ('use_name_ties' not in options):  options['use_name_ties'] = False
-    if ('terse_inits' not in options):  options['terse_inits'] = False
-    if ('french_intials' not in options):  options['french_intials'] = False
-    if ('period_after_initial' not in options):  options['period_after_initial'] = True
+    if (signature == None): signature = name_format_signature(options)
+
+    cachekey = ('name', signature, namedict.get('first'), namedict.get('middle'), namedict.get('prefix'),
+                namedict.get('last'), namedict.get('suffix'))
+    if (cachekey in name_format_cache):
+        name_format_cache_stats['hits'] += 1
+        name_format_cache.move_to_end(cachekey)
+        return(name_format_cache[cachekey])
+    name_format_cache_stats['misses'] += 1
 
     lastname = namedict['last']
     firstname = '' if ('first' not in namedict) else namedict['first']
@@ -4729,6 +7327,7 @@ def namedict_to_formatted_namestr(namedict, options=None):
         if (frontname + suffix != ''): frontname = ', ' + frontname
         namestr = prefix + lastname + frontname + suffix
 
+    store_formatted_name(cachekey, namestr)
     return(namestr)
 
 ## =============================
@@ -4966,44 +7565,1695 @@ def generate_unique_name(name, namelist, extension_type='a'):
 
     return(newname)
 
-## ==================================================================================================
+## =============================
+def scan_auxfile(source):
+    '''
+    Read through an auxiliary (`.aux`) file in a single pass, collecting the citation keys, the bibliography database
+    and style template names, and the names of any nested `\\@input{}` files.
 
-if (__name__ == '__main__'):
-    print('sys.argv=', sys.argv)
-    uselocale = None
-    if (len(sys.argv) > 1):
-        try:
-            (opts, args) = getopt.getopt(sys.argv[1:], '', ['locale='])
-        except getopt.GetoptError as err:
-            ## Print help information and exit.
-            print(err)              ## this will print something like "option -a not recognized"
-            print('Bibulous can be called with')
-            print('    bibulous.py --locale=mylocale myfile.aux')
-            print('where "locale" is an optional variable.')
-            sys.exit(2)
+    The results for files on disk are cached, keyed by the file's path and checked against its modification time and
+    size, so that re-scanning a document only reads the auxiliary files that have changed. The cache keeps only the
+    most recently used files (see `auxscan_cache_maxsize`), and `prune_cache()` removes the files since changed.
 
-        for o,a in opts:
-            if (o == '--locale'):
-                uselocale = a
-            else:
-                assert False, "unhandled option"
+    Parameters
+    ----------
+    source : str or file-like object
+        The filename of the auxiliary file, or an open text stream to read it from.
 
-        arg_auxfile = args[0]
-        files = arg_auxfile
-    else:
-        ## Use the test example input.
-        arg_bibfile = './test/test1.bib'
-        arg_auxfile = './test/test1.aux'
-        arg_bstfile = './test/test1.bst'
-        files = [arg_bibfile, arg_auxfile, arg_bstfile]
+    Returns
+    -------
+    auxscan : dict
+        A dictionary with keys `name` (the filename used in messages), `citations` (the list of citation keys, in \
+        order), `bibdata` and `bibstyle` (the contents of the last `\\bibdata{}` and `\\bibstyle{}` commands, or \
+        None if absent), and `inputs` (a list of `(index, filename)` pairs, where `index` gives the position in \
+        `citations` at which the input file's citations belong).
+    '''
+
+    if isinstance(source, str):
+        path = os.path.abspath(source)
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if (path in auxscan_cache) and (auxscan_cache[path][0] == stamp):
+            auxscan_cache.move_to_end(path)
+            return(auxscan_cache[path][1])
+
+    (filehandle, name, is_file) = open_source(source)
+    auxscan = {'name':name, 'citations':[], 'bibdata':None, 'bibstyle':None, 'inputs':[]}
+
+    for line in filehandle:
+        line = line.strip()
+
+        ## If the line begins with "\@input{" then it says to go into a file and look for citations there.
+        if line.startswith(r'\@input{'):
+            auxscan['inputs'].append((len(auxscan['citations']), line[8:-1].strip()))
+        elif line.startswith(r'\citation{'):
+            ## Remove the "\citation{" from the front and the "}" from the back. If multiple citations are given,
+            ## then split them using the comma.
+            auxscan['citations'].extend(line[10:-1].split(','))
+        elif line.startswith(r'\bibdata{'):
+            auxscan['bibdata'] = line[9:].split('}')[0]
+        elif line.startswith(r'\bibstyle{'):
+            auxscan['bibstyle'] = line[10:].split('}')[0]
+
+    if is_file:
+        filehandle.close()
+        auxscan_cache[path] = (stamp, auxscan)
+        auxscan_cache.move_to_end(path)
+        if (len(auxscan_cache) > auxscan_cache_maxsize):
+            auxscan_cache.popitem(last=False)
+
+    return(auxscan)
+
+## =============================
+def hash_file(filename):
+    '''
+    Compute the SHA-1 hash of a file's contents.
+
+    Parameters
+    ----------
+    filename : str
+        The file to hash.
+
+    Returns
+    -------
+    digest : str
+        The hexadecimal digest of the hash.
+    '''
+
+    h = hashlib.sha1()
+    filehandle = open(filename, 'rb')
+    for chunk in iter(lambda: filehandle.read(1 << 16), b''):
+        h.update(chunk)
+    filehandle.close()
+
+    return(h.hexdigest())
+
+## =============================
+def style_variant_filename(bblfile, bstfile):
+    '''
+    Get the filename of the BBL file to write for a document in another style (see `Bibdata.write_style_variants()`),
+    by adding the name of the style template file to the document's BBL filename.
+
+    Parameters
+    ----------
+    bblfile : str
+        The document's own BBL filename.
+    bstfile : str
+        The filename of the (first) style template file of the style.
+
+    Returns
+    -------
+    variant_bblfile : str
+        The BBL filename for the style, such as "paper-aps.bbl" for the document "paper.bbl" and style "aps.bst".
+    '''
+
+    stylename = os.path.splitext(os.path.basename(bstfile))[0]
+    return(os.path.splitext(bblfile)[0] + '-' + stylename + '.bbl')
+
+## =============================
+def get_aux_citations(auxfile):
+    '''
+    Get the ordered list of citation keys from an auxiliary file, including those in any nested `\\@input{}` files.
+    This gives the same list as `Bibdata.parse_auxfile()`, but without needing to create a Bibdata object.
+
+    Parameters
+    ----------
+    auxfile : str
+        The filename of the auxiliary file.
+
+    Returns
+    -------
+    keylist : list of str
+        The citation keys, in order of appearance (and including repeats).
+    '''
+
+    keylist = []
+    visited = []
+
+    def collect(filename):
+        if filename in visited:
+            return
+        visited.append(filename)
+        auxscan = scan_auxfile(filename)
+        n = 0
+        for (idx,input_filename) in auxscan['inputs']:
+            keylist.extend(auxscan['citations'][n:idx])
+            n = idx
+            collect(input_filename)
+        keylist.extend(auxscan['citations'][n:])
+
+    collect(auxfile)
+    return(keylist)
+
+## =============================
+def compute_fingerprint(auxfile, uselocale, inputfiles, keylist=None, disable=None, known_files=None):
+    '''
+    Build the fingerprint of a bibliography job: the Bibulous version, the options of the run (the locale and the
+    disabled warnings), the database and style names given in the auxiliary file, the ordered list of citations, and the
+    hash of every input (style template and database) file. The stamp of each input file is recorded alongside, so that
+    the next check need not hash a file whose stamp has not changed.
+
+    Parameters
+    ----------
+    auxfile : str
+        The filename of the auxiliary file.
+    uselocale : str
+        The locale used for sorting.
+    inputfiles : list of str
+        The style template and database files to hash.
+    keylist : list of str, optional
+        The ordered list of citation keys. If not given, it is read from the auxiliary file.
+    disable : list of int, optional
+        The warning message numbers disabled. (Default is `Bibdata.default_disable`.)
+    known_files : dict, optional
+        The (modification time, size, hash) of input files already hashed, keyed by filename (as recorded in an \
+        earlier fingerprint). A file whose stamp still matches is not hashed again.
+
+    Returns
+    -------
+    fp : dict
+        The fingerprint.
+    '''
+
+    auxfile = os.path.normpath(os.path.abspath(auxfile))
+    auxscan = scan_auxfile(auxfile)
+    if (keylist == None):
+        keylist = get_aux_citations(auxfile)
+
+    if (disable == None):
+        disable = Bibdata.default_disable
+    if (known_files == None):
+        known_files = {}
+
+    ## Take each file's stamp before hashing it, so that a change made while hashing shows up as a new stamp.
+    (files, stamps) = ([], [])
+    for f in inputfiles:
+        (_, mtime, size) = file_stamp(f)
+        known = known_files.get(f)
+        if (known != None) and (tuple(known[:2]) == (mtime, size)):
+            filehash = known[2]
+        else:
+            filehash = hash_file(f)
+        files.append([f, filehash])
+        stamps.append([mtime, size])
+
+    fp = {}
+    fp['version'] = __version__
+    fp['options'] = {'locale':uselocale, 'disable':sorted(set(disable))}
+    fp['aux'] = auxfile
+    fp['bibdata'] = auxscan['bibdata']
+    fp['bibstyle'] = auxscan['bibstyle']
+    fp['citations'] = list(keylist)
+    fp['files'] = files
+    fp['stamps'] = stamps
+
+    return(fp)
+
+## =============================
+def fingerprint_is_current(auxfile, uselocale=None, disable=None):
+    '''
+    Check whether the fingerprint recorded by the last run on this auxiliary file still matches the current inputs and
+    options, and whether the BBL file written then is still intact. If so, there is no work to do. Only the auxiliary
+    file is scanned --- none of the style template or database files are parsed, and only those whose stamps have
+    changed are hashed.
+
+    Parameters
+    ----------
+    auxfile : str
+        The filename of the auxiliary file.
+    uselocale : str, optional
+        The locale to use for sorting. (Default is the user's default locale.)
+    disable : list of int, optional
+        The warning message numbers to disable. (Default is `Bibdata.default_disable`.)
+
+    Returns
+    -------
+    is_current : bool
+        True if the BBL file is up to date, False otherwise.
+    '''
+
+    fpfile = os.path.normpath(os.path.abspath(auxfile))[:-4] + '-fingerprint.json'
+    if not os.path.exists(fpfile):
+        return(False)
 
-    main_bibdata = Bibdata(files, uselocale=uselocale, debug=False)
+    try:
+        filehandle = open(fpfile, 'r', encoding='utf8')
+        old_fp = json.load(filehandle)
+        filehandle.close()
+
+        if (uselocale == None):
+            thislocale = locale.setlocale(locale.LC_ALL,'')
+        else:
+            thislocale = locale.setlocale(locale.LC_ALL,uselocale)
+
+        ## The input files are taken from the old fingerprint. If the auxiliary file names different ones, then the
+        ## "bibdata" or "bibstyle" items will not match.
+        inputfiles = [f for (f,_) in old_fp['files']]
+        known_files = dict([(f, stamp + [filehash]) for ((f,filehash),stamp) in zip(old_fp['files'], old_fp['stamps'])])
+        fp = compute_fingerprint(auxfile, thislocale, inputfiles, disable=disable, known_files=known_files)
+
+        ## A file whose stamp changed but whose contents did not is still current.
+        stamps = fp['stamps']
+        fp['bbl'] = old_fp['bbl']
+        fp['stamps'] = old_fp['stamps']
+        if (fp != old_fp):
+            return(False)
+
+        (bblfile, bblhash) = old_fp['bbl']
+        if (hash_file(bblfile) != bblhash):
+            return(False)
+
+        ## Record any new stamps, so that such files need not be hashed again on the next run.
+        if (stamps != old_fp['stamps']):
+            old_fp['stamps'] = stamps
+            filehandle = open(fpfile, 'w', encoding='utf8')
+            json.dump(old_fp, filehandle, indent=1)
+            filehandle.close()
+
+        return(True)
+    except (OSError, ValueError, KeyError, TypeError, locale.Error):
+        return(False)
+
+## =============================
+def file_stamp(filename):
+    '''
+    Get the stamp used to tell whether a file has changed: its absolute path, modification time and size.
 
-    ## Check if the bibliography database and style template files exist. If they don't, then the user didn't specify
-    ## them, and it's probably true that there is no bibliography requested. That is, Bibulous was called without any
-    ## need.
-    if main_bibdata.filedict and main_bibdata.citedict:
-        main_bibdata.write_bblfile()
-        print('Writing to BBL file = ' + main_bibdata.filedict['bbl'])
-        #os.system('kwrite ' + main_bibdata.filedict['bbl'])
-        print('DONE')
+    Parameters
+    ----------
+    filename : str
+        The file to stamp.
+
+    Returns
+    -------
+    stamp : tuple
+        The tuple `(path, mtime, size)`, with the modification time in nanoseconds.
+    '''
+
+    path = os.path.normpath(os.path.abspath(filename))
+    stat = os.stat(path)
+    return((path, stat.st_mtime_ns, stat.st_size))
+
+## =============================
+def author_index_filename(bibfile):
+    '''
+    Get the filename of the author index kept next to a database file (see `Bibdata.update_author_index()`).
+
+    Parameters
+    ----------
+    bibfile : str
+        The filename of the database file.
+
+    Returns
+    -------
+    indexfile : str
+        The filename of the author index.
+    '''
+
+    return(os.path.splitext(bibfile)[0] + '-authorindex.db')
+
+## =============================
+def author_index_abbrevs(index):
+    '''
+    Get the abbreviations stored in an author index: those defined in its database file and the files read before it.
+
+    Parameters
+    ----------
+    index : sqlite3.Connection
+        The open author index (see `Bibdata.update_author_index()`).
+
+    Returns
+    -------
+    abbrevs : dict
+        The abbreviations.
+    '''
+
+    return(json.loads(index.execute("SELECT value FROM meta WHERE name = 'abbrevs'").fetchone()[0]))
+
+## =============================
+def abbrevs_digest(abbrevs):
+    '''
+    Get a digest of a set of abbreviations, for telling whether the abbreviations used to build an author index have
+    changed.
+
+    Parameters
+    ----------
+    abbrevs : dict
+        The abbreviations.
+
+    Returns
+    -------
+    digest : str
+        The hexadecimal SHA-1 digest.
+    '''
+
+    return(hashlib.sha1(json.dumps(sorted(abbrevs.items())).encode('utf-8')).hexdigest())
+
+## =============================
+def author_index_key(lastname):
+    '''
+    Get the key under which a last name is looked up in an author index: the name with its LaTeX markup removed,
+    and with its case folded.
+
+    Parameters
+    ----------
+    lastname : str
+        The last name.
+
+    Returns
+    -------
+    key : str
+        The lookup key.
+    '''
+
+    return(purify_string(lastname).casefold())
+
+## =============================
+def batch(auxfiles, jobs=1, fingerprint=False, cache=None, start_method=None, **kwargs):
+    '''
+    Write the BBL files for a list of auxiliary files in one go. Each distinct style template file and database file
+    is parsed only once, and shared by all of the jobs that use it, with every job's output identical to running it
+    separately.
+
+    Parameters
+    ----------
+    auxfiles : list of str
+        The filenames of the auxiliary files.
+    jobs : int, optional
+        The number of BBL files to write in parallel.
+    fingerprint : bool, optional
+        Whether to record a fingerprint for each BBL file written (see `Bibdata.write_bblfile()`).
+    cache : dict, optional
+        The cache of parsed style templates and databases to use, so that it can outlive the batch (as in the daemon \
+        mode). (Default is to start a new one.)
+    start_method : str, optional
+        The process start method for parallel writing. With "fork", the workers inherit the parsed jobs. With "spawn", \
+        each worker parses its own jobs, reading the databases from shared memory (see `SharedDatabase`). (Default is \
+        "fork" where available, and "spawn" otherwise.)
+    **kwargs
+        Any keyword arguments to pass on to `Bibdata()` (`disable`, `culldata`, `uselocale`, `silent`, `debug`).
+
+    Returns
+    -------
+    bibobjs : list of Bibdata
+        The Bibdata object for each of the jobs, in order.
+    '''
+
+    global batch_bibobjs
+
+    if (cache == None):
+        cache = new_cache()
+    prune_cache(cache)
+    bibobjs = [Bibdata(f, cache=cache, **kwargs) for f in auxfiles]
+    ready = [i for i,b in enumerate(bibobjs) if b.filedict and b.citedict]
+
+    nworkers = min(jobs, len(ready))
+    if (nworkers > 1):
+        import multiprocessing
+    if (nworkers > 1) and (start_method == None):
+        start_method = 'fork' if ('fork' in multiprocessing.get_all_start_methods()) else 'spawn'
+
+    if (nworkers > 1) and (start_method == 'fork'):
+        ## The worker processes inherit the (already parsed) jobs from this one, so nothing needs to be pickled but the
+        ## job numbers and the results.
+        batch_bibobjs = bibobjs
+        try:
+            pool = multiprocessing.get_context('fork').Pool(nworkers)
+            results = pool.map(batch_worker, [(i, fingerprint) for i in ready])
+            pool.close()
+            pool.join()
+        finally:
+            batch_bibobjs = []
+    elif (nworkers > 1) and shared_memory_available():
+        ## The worker processes start afresh, and so have to parse their own jobs. Rather than each of them parsing the
+        ## databases again (or having them pickled over), they all read the databases parsed here from shared memory.
+        registry = cache['databases']
+        keys = []
+        for i in ready:
+            if (bibobjs[i].database_key != None) and (bibobjs[i].database_key not in keys):
+                keys.append(bibobjs[i].database_key)
+
+        shared = []
+        try:
+            for key in keys:
+                shared.append(SharedDatabase.create(registry.databases[key]))
+            initargs = ([(k, registry.filenames[k], sdb.name) for (k,sdb) in zip(keys, shared)],
+                        dict(registry.file_hashes))
+            pool = multiprocessing.get_context(start_method).Pool(nworkers, initializer=batch_attach,
+                                                                  initargs=initargs)
+            results = pool.map(batch_spawned_worker, [(auxfiles[i], fingerprint, kwargs) for i in ready])
+            pool.close()
+            pool.join()
+        finally:
+            for sdb in shared:
+                sdb.close()
+                sdb.unlink()
+    else:
+        results = None
+        for i in ready:
+            bibobjs[i].write_bblfile(fingerprint=fingerprint)
+
+    if (results != None):
+        for (i,(bbl_hash,exception_msg)) in zip(ready, results):
+            bibobjs[i].bbl_hash = bbl_hash
+            if (exception_msg != None):
+                bibobjs[i].last_exception = Exception(exception_msg)
+
+    return(bibobjs)
+
+## The jobs being written by "batch()", made available to its worker processes.
+batch_bibobjs = []
+
+## The Bibdata object whose entries are being worked on by "Bibdata.map_in_parallel()", made available to its worker
+## processes.
+render_bibobj = None
+
+## The shared-memory databases a spawned worker process of "batch()" has attached to.
+batch_shared = []
+
+## =============================
+def batch_worker(args):
+    '''
+    Write the BBL file for one of the jobs in `batch()`, from within a worker process.
+
+    Parameters
+    ----------
+    args : tuple
+        The job number and the `fingerprint` flag.
+
+    Returns
+    -------
+    bbl_hash : str
+        The hash of the BBL file written (if fingerprinted).
+    exception_msg : str
+        The message of the exception (if any) that interrupted writing the BBL file.
+    '''
+
+    (i, fingerprint) = args
+    bibobj = batch_bibobjs[i]
+    bibobj.write_bblfile(fingerprint=fingerprint)
+    sys.stdout.flush()
+
+    if (bibobj.last_exception == None):
+        return((bibobj.bbl_hash, None))
+    return((bibobj.bbl_hash, repr(bibobj.last_exception)))
+
+## =============================
+def render_worker(args):
+    '''
+    Call a method of a Bibdata object for a run of citation keys, for `Bibdata.map_in_parallel()`, from within a worker
+    process.
+
+    Parameters
+    ----------
+    args : tuple
+        The name of the method, the list of citation keys, and the `debug` flag.
+
+    Returns
+    -------
+    results : list
+        The method's result for each key, up to the first one that raised an exception.
+    exception : Exception
+        The exception raised, or None.
+    '''
+
+    (methodname, citekeys, debug) = args
+    method = getattr(render_bibobj, methodname)
+    results = []
+    try:
+        for c in citekeys:
+            if debug: print('Calling "' + methodname + '()" for entry "' + c + '" ...')
+            results.append(method(c))
+    except Exception as this_exception:
+        sys.stdout.flush()
+        return((results, this_exception))
+
+    sys.stdout.flush()
+    return((results, None))
+
+## =============================
+def batch_attach(shared, file_hashes):
+    '''
+    Set up a spawned worker process of `batch()`, by attaching to the databases that the parent process placed in
+    shared memory and registering them, so that the worker's jobs need not parse them again.
+
+    Parameters
+    ----------
+    shared : list of tuple
+        The registry key, database filenames, and shared memory block name for each database.
+    file_hashes : dict
+        The file hashes known to the parent process's registry (see `DatabaseRegistry`).
+    '''
+
+    registry = new_cache()['databases']
+    registry.file_hashes.update(file_hashes)
+    for (key, filenames, name) in shared:
+        sdb = SharedDatabase.attach(name)
+        batch_shared.append(sdb)        ## stay attached for the life of the worker
+        registry.adopt(key, filenames, sdb.as_database())
+
+    return
+
+## =============================
+def batch_spawned_worker(args):
+    '''
+    Parse and write the BBL file for one of the jobs in `batch()`, from within a spawned worker process.
+
+    Parameters
+    ----------
+    args : tuple
+        The auxiliary filename, the `fingerprint` flag, and the keyword arguments for `Bibdata()`.
+
+    Returns
+    -------
+    bbl_hash : str
+        The hash of the BBL file written (if fingerprinted).
+    exception_msg : str
+        The message of the exception (if any) that interrupted writing the BBL file.
+    '''
+
+    (auxfile, fingerprint, kwargs) = args
+    bibobj = Bibdata(auxfile, cache=new_cache(), **kwargs)
+    bibobj.write_bblfile(fingerprint=fingerprint)
+    sys.stdout.flush()
+
+    if (bibobj.last_exception == None):
+        return((bibobj.bbl_hash, None))
+    return((bibobj.bbl_hash, repr(bibobj.last_exception)))
+
+## =============================
+def new_cache(registry=None):
+    '''
+    Create an empty cache of parsed style templates and databases, for sharing between jobs (see `batch()`).
+
+    Parameters
+    ----------
+    registry : DatabaseRegistry, optional
+        The database registry to use. (Default is the process-wide registry.)
+
+    Returns
+    -------
+    cache : dict
+        A dictionary with an (empty) `styles` dictionary, and with `databases` holding the database registry (see \
+        `DatabaseRegistry`).
+    '''
+
+    global database_registry
+
+    if (registry == None):
+        if (database_registry == None):
+            database_registry = DatabaseRegistry()
+        registry = database_registry
+
+    return({'styles':{}, 'databases':registry})
+
+## =============================
+def prune_cache(cache):
+    '''
+    Remove from a cache of parsed style templates and databases any entry whose files have since been changed or
+    deleted. Since the cache keys contain the file stamps, such entries can never be used again, and without pruning
+    a long-running process would keep every old version of the files in memory. The scanned auxiliary files (see
+    `scan_auxfile()`) are pruned in the same way.
+
+    Parameters
+    ----------
+    cache : dict
+        The cache to prune (see `new_cache()`).
+
+    Returns
+    -------
+    npruned : int
+        The number of entries removed.
+    '''
+
+    npruned = cache['databases'].prune()
+    for key in list(cache['styles']):
+        for stamp in key:
+            try:
+                current = (file_stamp(stamp[0]) == stamp)
+            except OSError:
+                current = False
+            if not current:
+                del cache['styles'][key]
+                npruned += 1
+                break
+
+    for (path, (stamp, _)) in list(auxscan_cache.items()):
+        try:
+            current = (file_stamp(path)[1:] == stamp)
+        except OSError:
+            current = False
+        if not current:
+            auxscan_cache.pop(path, None)
+            npruned += 1
+
+    return(npruned)
+
+## =============================
+class DatabaseRegistry(object):
+    '''
+    A registry of parsed bibliography databases, shared by all of the jobs in the process. Each database is keyed by
+    the hashes of its files' contents (together with the options that change how they are parsed), so that it is
+    parsed only once however many jobs and styles use it, and a file whose timestamp changed but whose contents did not
+    is not parsed again. The databases handed out are read-only, so that every job can read the same one at the same
+    time: a job writes its own fields into an overlay on each entry (see `Bibdata.apply_database()`).
+
+    Attributes
+    ----------
+    databases : dict
+        The frozen databases, keyed by the tuple of file hashes and the parsing options.
+    filenames : dict
+        The database filenames for each key, used for pruning.
+    file_hashes : dict
+        The known hash of each file, keyed by absolute path, together with the modification time and size of the file \
+        when it was hashed (so that a file is read again only if these change).
+    lock : threading.RLock
+        The lock held while looking up, parsing, or pruning.
+
+    Methods
+    -------
+    make_key
+    get
+    adopt
+    hash_of
+    prune
+    '''
+
+    def __init__(self):
+        self.databases = {}
+        self.filenames = {}
+        self.file_hashes = {}
+        import threading
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return(len(self.databases))
+
+    ## =============================
+    def hash_of(self, filename):
+        '''
+        Get the hash of a file's contents, reading the file again only if its stamp has changed since it was last
+        hashed.
+
+        Parameters
+        ----------
+        filename : str
+            The file to hash.
+
+        Returns
+        -------
+        digest : str
+            The SHA-1 hash of the file's contents.
+        '''
+
+        (path, mtime, size) = file_stamp(filename)
+        with self.lock:
+            known = self.file_hashes.get(path)
+            if (known == None) or (known[:2] != (mtime, size)):
+                known = (mtime, size, hash_file(path))
+                self.file_hashes[path] = known
+
+        return(known[2])
+
+    ## =============================
+    def make_key(self, bibfiles, options):
+        '''
+        Get the registry key for a list of database files.
+
+        Parameters
+        ----------
+        bibfiles : list of str
+            The filenames of the database files.
+        options : tuple
+            The values of the options that change how the files are parsed.
+
+        Returns
+        -------
+        key : tuple
+            The tuple of file hashes, and the options.
+        '''
+
+        return((tuple([self.hash_of(f) for f in bibfiles]), options))
+
+    ## =============================
+    def get(self, key, bibfiles, parse):
+        '''
+        Get the shared, read-only database parsed from a list of files, parsing and registering it if necessary.
+
+        Parameters
+        ----------
+        key : tuple
+            The registry key for the files (see `make_key()`).
+        bibfiles : list of str
+            The filenames of the database files.
+        parse : callable
+            The function to parse the files with, if they have not yet been parsed (`Bibdata.parse_database()`).
+
+        Returns
+        -------
+        database : dict
+            The frozen database, with keys `abbrevs`, `preamble`, `datakeys`, `sequence`, `warnings`, `acronyms` (the \
+            positions in `sequence` of the acronym entries), and `find` (a function giving the positions in \
+            `sequence` of the definitions of an entrykey, in the order parsed).
+        '''
+
+        with self.lock:
+            if (key not in self.databases):
+                database = parse(bibfiles)
+                sequence = tuple([(k, types.MappingProxyType(e)) for (k,e) in database['sequence']])
+                positions = {}
+                for (n,(k,e)) in enumerate(sequence):
+                    positions[k] = positions.get(k, ()) + (n,)
+                acronyms = tuple([n for (n,(k,e)) in enumerate(sequence) if (e['entrytype'] == 'acronym')])
+
+                def find(entrykey, positions=positions):
+                    return(positions.get(entrykey, ()))
+
+                self.databases[key] = {'abbrevs':types.MappingProxyType(database['abbrevs']),
+                                       'preamble':database['preamble'],
+                                       'datakeys':tuple(database['datakeys']),
+                                       'sequence':sequence, 'acronyms':acronyms,
+                                       'find':find, 'warnings':tuple(database['warnings'])}
+                self.filenames[key] = [os.path.normpath(os.path.abspath(f)) for f in bibfiles]
+
+            return(self.databases[key])
+
+    ## =============================
+    def adopt(self, key, filenames, database):
+        '''
+        Register a database that was parsed elsewhere (such as one read from shared memory by a worker process).
+
+        Parameters
+        ----------
+        key : tuple
+            The registry key for the database.
+        filenames : list of str
+            The absolute filenames of the database files.
+        database : dict
+            The frozen database.
+        '''
+
+        with self.lock:
+            self.databases[key] = database
+            self.filenames[key] = list(filenames)
+
+        return
+
+    ## =============================
+    def prune(self):
+        '''
+        Remove every database whose files have since been changed or deleted.
+
+        Returns
+        -------
+        npruned : int
+            The number of databases removed.
+        '''
+
+        npruned = 0
+        with self.lock:
+            for key in list(self.databases):
+                try:
+                    current = (tuple([self.hash_of(f) for f in self.filenames[key]]) == key[0])
+                except OSError:
+                    current = False
+                if not current:
+                    del self.databases[key]
+                    del self.filenames[key]
+                    npruned += 1
+
+            ## Forget the hashes of files that no longer exist.
+            for path in list(self.file_hashes):
+                if not os.path.exists(path):
+                    del self.file_hashes[path]
+
+        return(npruned)
+
+## The registry of parsed databases shared by every job in this process (created by "new_cache()" when first needed).
+database_registry = None
+
+## =============================
+def shared_memory_available():
+    '''
+    Check whether blocks of shared memory can be created (with Python 3.8 or later), for `SharedDatabase`.
+
+    Returns
+    -------
+    available : bool
+        Whether the `multiprocessing.shared_memory` module can be imported.
+    '''
+
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        return(False)
+
+    return(True)
+
+## =============================
+class SharedDatabase(object):
+    '''
+    A parsed (and frozen) database laid out flat in a block of shared memory, so that any number of worker processes
+    can read one copy of it, rather than each being sent its own pickled copy. A worker attaches to the block by name
+    and reads the entries lazily: nothing is decoded until an entry's field is accessed.
+
+    The block holds a header, a table of entries (in the order parsed), a table of fields for each entry, an index of
+    the entries sorted by entrykey (for finding an entry by binary search), a table of the acronym entries, tables for
+    the abbreviations and the database keys, and finally the UTF-8 encoded strings themselves. Every table row is a
+    fixed-size record of offsets and lengths, so that any row can be read directly.
+
+    Attributes
+    ----------
+    shm : multiprocessing.shared_memory.SharedMemory
+        The shared memory block.
+    name : str
+        The name of the shared memory block, for attaching to it from another process.
+    nentries : int
+        The number of entries.
+
+    Methods
+    -------
+    create
+    attach
+    entrykey
+    datakey
+    entry
+    find
+    as_database
+    close
+    unlink
+    '''
+
+    magic = b'BIBSHM02'
+    header = struct.Struct('<8s12Q')    ## magic; nentries and offset of the entries and key index; nacronyms and
+                                        ## offset; nabbrevs and offset; ndatakeys and offset; preamble offset and
+                                        ## length; offset of the strings
+    row = struct.Struct('<4Q')          ## two strings (offset, length), or a string and a table (offset, nrows)
+    ref = struct.Struct('<2Q')          ## one string (offset, length)
+    index = struct.Struct('<Q')         ## an entry number
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.name = shm.name
+        self.buf = shm.buf
+        (magic, self.nentries, self.entries_offset, self.index_offset, self.nacronyms, self.acronyms_offset,
+         self.nabbrevs, self.abbrevs_offset, self.ndatakeys, self.datakeys_offset, self.preamble_offset,
+         self.preamble_length, self.strings_offset) = self.header.unpack_from(self.buf, 0)
+        if (magic != self.magic):
+            raise ValueError('The shared memory block "' + shm.name + '" does not hold a Bibulous database.')
+
+    ## =============================
+    @classmethod
+    def create(cls, database, name=None):
+        '''
+        Place a parsed database in a new block of shared memory.
+
+        Parameters
+        ----------
+        database : dict
+            The frozen database, as held by `DatabaseRegistry`. All of the field values must be strings.
+        name : str, optional
+            The name to give the shared memory block. (Default is to let the system choose one.)
+
+        Returns
+        -------
+        sdb : SharedDatabase
+            The shared database. The caller is responsible for calling `close()` and `unlink()` on it when done.
+        '''
+
+        if not shared_memory_available():
+            raise OSError('Shared memory is not available in this version of Python.')
+        from multiprocessing import shared_memory
+
+        strings = bytearray()
+        known = {}          ## repeated strings (such as the field names) are stored only once
+
+        def add_string(s):
+            if not isinstance(s, str):
+                raise TypeError('Only string fields can be placed in shared memory, not ' + repr(s))
+            if (s not in known):
+                b = s.encode('utf-8')
+                known[s] = (len(strings), len(b))
+                strings.extend(b)
+            return(known[s])
+
+        ## The table offsets are first counted from the end of the header, and then shifted once the tables are done.
+        tables = bytearray()
+        fields_offsets = []
+        for (entrykey,entry) in database['sequence']:
+            fields_offsets.append(len(tables))
+            for field in entry:
+                tables.extend(cls.row.pack(*(add_string(field) + add_string(entry[field]))))
+
+        start = cls.header.size
+        entries_offset = start + len(tables)
+        for (n,(entrykey,entry)) in enumerate(database['sequence']):
+            tables.extend(cls.row.pack(*(add_string(entrykey) + (start + fields_offsets[n], len(entry)))))
+
+        ## Sorting is stable, so that of any duplicate entrykeys, the last one parsed comes last (and wins).
+        keybytes = [k.encode('utf-8') for (k,e) in database['sequence']]
+        index_offset = start + len(tables)
+        for n in sorted(range(len(keybytes)), key=keybytes.__getitem__):
+            tables.extend(cls.index.pack(n))
+
+        acronyms = [n for (n,(k,e)) in enumerate(database['sequence']) if (e['entrytype'] == 'acronym')]
+        acronyms_offset = start + len(tables)
+        for n in acronyms:
+            tables.extend(cls.index.pack(n))
+
+        abbrevs_offset = start + len(tables)
+        for abbrev in database['abbrevs']:
+            tables.extend(cls.row.pack(*(add_string(abbrev) + add_string(database['abbrevs'][abbrev]))))
+
+        datakeys_offset = start + len(tables)
+        for k in database['datakeys']:
+            tables.extend(cls.ref.pack(*add_string(k)))
+
+        preamble = add_string(database['preamble'])
+        strings_offset = start + len(tables)
+        header = cls.header.pack(cls.magic, len(keybytes), entries_offset, index_offset, len(acronyms),
+                                 acronyms_offset, len(database['abbrevs']), abbrevs_offset, len(database['datakeys']),
+                                 datakeys_offset, preamble[0], preamble[1], strings_offset)
+
+        size = strings_offset + len(strings)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        shm.buf[:start] = header
+        shm.buf[start:strings_offset] = tables
+        shm.buf[strings_offset:size] = strings
+
+        return(cls(shm))
+
+    ## =============================
+    @classmethod
+    def attach(cls, name):
+        '''
+        Attach to a database that another process placed in shared memory.
+
+        Parameters
+        ----------
+        name : str
+            The name of the shared memory block.
+
+        Returns
+        -------
+        sdb : SharedDatabase
+            The shared database.
+        '''
+
+        if not shared_memory_available():
+            raise OSError('Shared memory is not available in this version of Python.')
+        from multiprocessing import shared_memory
+
+        return(cls(shared_memory.SharedMemory(name=name)))
+
+    ## =============================
+    def string(self, offset, length):
+        start = self.strings_offset + offset
+        return(str(self.buf[start:start+length], 'utf-8'))
+
+    ## =============================
+    def entrykey(self, n):
+        '''
+        Get the entrykey of the n-th entry parsed.
+        '''
+
+        (offset, length, fields_offset, nfields) = self.row.unpack_from(self.buf, self.entries_offset + n*self.row.size)
+        return(self.string(offset, length))
+
+    ## =============================
+    def entry(self, n):
+        '''
+        Get the n-th entry parsed, as a read-only `SharedEntry`.
+        '''
+
+        (offset, length, fields_offset, nfields) = self.row.unpack_from(self.buf, self.entries_offset + n*self.row.size)
+        return(SharedEntry(self, fields_offset, nfields))
+
+    ## =============================
+    def datakey(self, n):
+        '''
+        Get the n-th of the database keys (every entrykey seen in the database files).
+        '''
+
+        return(self.string(*self.ref.unpack_from(self.buf, self.datakeys_offset + n*self.ref.size)))
+
+    ## =============================
+    def find(self, entrykey):
+        '''
+        Find the definitions of an entrykey, by binary search of the entries sorted by entrykey.
+
+        Parameters
+        ----------
+        entrykey : str
+            The entrykey to look for.
+
+        Returns
+        -------
+        positions : tuple of int
+            The entry numbers of each definition of the entrykey, in the order parsed (or an empty tuple if there is \
+            no such entry).
+        '''
+
+        target = entrykey.encode('utf-8')
+        keyat = lambda i: self.index.unpack_from(self.buf, self.index_offset + i*self.index.size)[0]
+
+        def keybytes(i):
+            (offset, length) = self.row.unpack_from(self.buf, self.entries_offset + keyat(i)*self.row.size)[:2]
+            start = self.strings_offset + offset
+            return(bytes(self.buf[start:start+length]))
+
+        ## Find the first position in the index whose entrykey does not sort before the target.
+        (lo, hi) = (0, self.nentries)
+        while (lo < hi):
+            mid = (lo + hi) // 2
+            if (keybytes(mid) < target):
+                lo = mid + 1
+            else:
+                hi = mid
+
+        ## The sort is stable, so that any duplicates follow in the order parsed.
+        positions = []
+        while (lo < self.nentries) and (keybytes(lo) == target):
+            positions.append(keyat(lo))
+            lo += 1
+
+        return(tuple(positions))
+
+    ## =============================
+    def as_database(self):
+        '''
+        Get the database in the form held by `DatabaseRegistry`. Nothing is read from shared memory here but the
+        abbreviations, the preamble, and the list of acronym entries: the entries (and their entrykeys) are read only
+        when accessed, so that a job culling the database to its cited entries (see `Bibdata.apply_database()`) reads
+        only those.
+
+        Returns
+        -------
+        database : dict
+            The database, with keys `abbrevs`, `preamble`, `datakeys`, `sequence`, `acronyms`, and `find`.
+        '''
+
+        abbrevs = {}
+        for n in range(self.nabbrevs):
+            row = self.row.unpack_from(self.buf, self.abbrevs_offset + n*self.row.size)
+            abbrevs[self.string(row[0], row[1])] = self.string(row[2], row[3])
+
+        acronyms = tuple([self.index.unpack_from(self.buf, self.acronyms_offset + n*self.index.size)[0]
+                          for n in range(self.nacronyms)])
+
+        return({'abbrevs':types.MappingProxyType(abbrevs),
+                'preamble':self.string(self.preamble_offset, self.preamble_length),
+                'datakeys':SharedSequence(self.ndatakeys, self.datakey),
+                'sequence':SharedSequence(self.nentries, lambda n: (self.entrykey(n), self.entry(n))),
+                'acronyms':acronyms, 'find':self.find})
+
+    ## =============================
+    def close(self):
+        '''
+        Detach from the shared memory block.
+        '''
+
+        self.buf = None
+        self.shm.close()
+        return
+
+    ## =============================
+    def unlink(self):
+        '''
+        Free the shared memory block (once every process has detached). Only the creator should call this.
+        '''
+
+        self.shm.unlink()
+        return
+
+## =============================
+class SharedEntry(collections.abc.Mapping):
+    '''
+    A read-only database entry held in a `SharedDatabase`. Each field is decoded from shared memory only when first
+    accessed.
+    '''
+
+    def __init__(self, sdb, fields_offset, nfields):
+        self.sdb = sdb
+        self.fields_offset = fields_offset
+        self.nfields = nfields
+        self.decoded = {}
+
+    def __getitem__(self, field):
+        if (field in self.decoded):
+            return(self.decoded[field])
+
+        sdb = self.sdb
+        target = field.encode('utf-8')
+        for n in range(self.nfields):
+            row = sdb.row.unpack_from(sdb.buf, self.fields_offset + n*sdb.row.size)
+            start = sdb.strings_offset + row[0]
+            if (sdb.buf[start:start+row[1]] == target):
+                self.decoded[field] = sdb.string(row[2], row[3])
+                return(self.decoded[field])
+
+        raise KeyError(field)
+
+    def __iter__(self):
+        sdb = self.sdb
+        for n in range(self.nfields):
+            row = sdb.row.unpack_from(sdb.buf, self.fields_offset + n*sdb.row.size)
+            yield sdb.string(row[0], row[1])
+
+    def __len__(self):
+        return(self.nfields)
+
+## =============================
+class SharedSequence(collections.abc.Sequence):
+    '''
+    A read-only sequence whose items are read from a `SharedDatabase` only when accessed.
+    '''
+
+    def __init__(self, length, getitem):
+        self.length = length
+        self.getitem = getitem
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return([self.getitem(i) for i in range(*n.indices(self.length))])
+        if (n < 0):
+            n += self.length
+        if not (0 <= n < self.length):
+            raise IndexError('sequence index out of range')
+        return(self.getitem(n))
+
+    def __len__(self):
+        return(self.length)
+
+## =============================
+class DaemonServer(object):
+    '''
+    The Bibulous daemon: a server listening on a Unix domain socket that runs Bibulous on request, keeping the parsed
+    style templates and databases in memory between requests. This avoids paying the cost of starting the interpreter
+    and parsing the files on every run of LaTeX. Each cache entry is checked against the current file stamps before
+    being used, so that edited files are always parsed again.
+
+    Each request is a JSON object holding the command-line arguments (`argv`) and working directory (`cwd`) of the
+    client, and the reply is a JSON object holding the exit status (`status`) and the messages printed (`output`). A
+    request of `{"command":"stop"}` shuts the server down. (See `bibulous_client.py` for a client.)
+
+    Attributes
+    ----------
+    server : socketserver.UnixStreamServer
+        The server listening on the socket.
+    cache : dict
+        The parsed style templates and databases kept between requests, with a database registry of its own.
+    stop_requested : bool
+        Whether a client has asked the server to stop.
+
+    Methods
+    -------
+    serve_until_stopped
+    handle_connection
+    run_request
+    '''
+
+    def __init__(self, socketpath):
+        import socketserver
+        ## Unix domain sockets are not available on every platform (and without them there is no daemon mode).
+        if not hasattr(socketserver, 'UnixStreamServer'):
+            raise OSError('The daemon mode needs Unix domain sockets, which are not available on this platform.')
+
+        ## Remove any socket left behind by a daemon that didn't shut down cleanly.
+        if os.path.exists(socketpath) and stat.S_ISSOCK(os.stat(socketpath).st_mode):
+            os.remove(socketpath)
+
+        self.server = socketserver.UnixStreamServer(socketpath, self.handle_connection)
+        self.socketpath = socketpath
+        self.cache = new_cache(DatabaseRegistry())
+        self.stop_requested = False
+
+    ## =============================
+    def serve_until_stopped(self):
+        '''
+        Handle requests one at a time until a client asks the server to stop, then close and remove the socket.
+        '''
+
+        try:
+            while not self.stop_requested:
+                self.server.handle_request()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socketpath):
+                os.remove(self.socketpath)
+
+        return
+
+    ## =============================
+    def handle_connection(self, connection, client_address, server):
+        '''
+        Read one JSON request from a client, and send back the JSON reply. (The server calls this in place of a
+        request handler class, for each connection it accepts.)
+
+        Parameters
+        ----------
+        connection : socket.socket
+            The connection to the client, which sends its request and then shuts down its side of the connection.
+        client_address : str
+            The address of the client.
+        server : socketserver.UnixStreamServer
+            The server that accepted the connection.
+        '''
+
+        with connection.makefile('rb') as rfile:
+            data = rfile.read()
+
+        try:
+            request = json.loads(data.decode('utf-8'))
+        except ValueError as err:
+            reply = {'status':2, 'output':'Invalid request to the Bibulous daemon: ' + str(err) + '\n'}
+        else:
+            reply = self.run_request(request)
+
+        connection.sendall(json.dumps(reply).encode('utf-8'))
+        return
+
+    ## =============================
+    def run_request(self, request):
+        '''
+        Run Bibulous for one client request, using (and updating) the cache.
+
+        Parameters
+        ----------
+        request : dict
+            The request, with keys `argv` and `cwd`, or `command`.
+
+        Returns
+        -------
+        reply : dict
+            The reply, with keys `status` and `output`.
+        '''
+
+        if (request.get('command') == 'stop'):
+            self.stop_requested = True
+            return({'status':0, 'output':'Stopping the Bibulous daemon.\n'})
+
+        ## A request to start another daemon would never return. The daemon serves only the usual requests, to write
+        ## the BBL files of the AUX files given, and leaves writing them in other styles to "bibulous.py" itself. Any
+        ## invalid option is left for "main()" to report.
+        argv = request.get('argv', [])
+        try:
+            opts = getopt.getopt(argv, '', command_line_options)[0]
+        except getopt.GetoptError:
+            opts = []
+        refused = [o for (o,a) in opts if (o in daemon_refused_options)]
+        if refused:
+            return({'status':2, 'output':'The Bibulous daemon does not accept the "' + refused[0] + '" option. Run '
+                    '"bibulous.py" directly instead.\n'})
+
+        output = io.StringIO()
+        cwd = os.getcwd()
+        try:
+            with contextlib.redirect_stdout(output):
+                os.chdir(request.get('cwd', cwd))
+                prune_cache(self.cache)
+                status = main(argv, cache=self.cache)
+        except Exception:
+            output.write(traceback.format_exc())
+            status = 1
+        finally:
+            os.chdir(cwd)
+
+        return({'status':status, 'output':output.getvalue()})
+
+## =============================
+def serve(socketpath):
+    '''
+    Run the Bibulous daemon (see `DaemonServer`) on a Unix domain socket until a client asks it to stop.
+
+    Parameters
+    ----------
+    socketpath : str
+        The filename of the socket to listen on.
+    '''
+
+    server = DaemonServer(socketpath)
+    print('The Bibulous daemon is listening on ' + socketpath)
+    sys.stdout.flush()
+    server.serve_until_stopped()
+    return
+
+## =============================
+def open_source(source):
+    '''
+    Open a file for reading, or pass through a text stream that is already open.
+
+    Parameters
+    ----------
+    source : str or file-like object
+        The filename to open, or the text stream to read from.
+
+    Returns
+    -------
+    filehandle : file-like object
+        The text stream to read from.
+    name : str
+        The name to use for the source in messages.
+    is_file : bool
+        Whether the file was opened here (and so has to be closed by the caller).
+    '''
+
+    if isinstance(source, str):
+        return(open(os.path.normpath(source), 'r', encoding='utf8'), source, True)
+
+    name = str(getattr(source, 'name', '<' + type(source).__name__ + '>'))
+    return(source, name, False)
+
+## =============================
+def as_text_stream(source):
+    '''
+    Convert in-memory file contents into a text stream that the file parsers can read.
+
+    Parameters
+    ----------
+    source : str, bytes, or file-like object
+        The file contents, or a (text or binary) file-like object to read them from. Byte strings are assumed to be \
+        UTF-8 encoded.
+
+    Returns
+    -------
+    stream : file-like object
+        A text stream giving the contents.
+    '''
+
+    if isinstance(source, io.TextIOBase):
+        return(source)
+    elif hasattr(source, 'read'):
+        source = source.read()
+
+    if isinstance(source, (bytes, bytearray)):
+        source = source.decode('utf8')
+
+    return(io.StringIO(source))
+
+## =============================
+def get_trigrams(s):
+    '''
+    Get the set of (lowercase) three-character substrings of a string. The string is padded with spaces at the front
+    and back so that short strings and the beginnings and ends of strings also produce trigrams.
+
+    Parameters
+    ----------
+    s : str
+        The string to decompose.
+
+    Returns
+    -------
+    trigrams : set of str
+        The trigrams of the string.
+    '''
+
+    s = '  ' + s.lower() + ' '
+    trigrams = set([s[i:i+3] for i in range(len(s)-2)])
+    return(trigrams)
+
+## =============================
+def build_trigram_index(keys):
+    '''
+    Build an inverted index mapping each trigram to the positions (in `keys`) of the strings containing it.
+
+    Parameters
+    ----------
+    keys : list of str
+        The strings to index.
+
+    Returns
+    -------
+    index : dict
+        A dictionary whose keys are trigrams and whose values are lists of indices into `keys`.
+    '''
+
+    index = {}
+    for i,key in enumerate(keys):
+        for t in get_trigrams(key):
+            if t in index:
+                index[t].append(i)
+            else:
+                index[t] = [i]
+
+    return(index)
+
+## =============================
+def edit_distance(s1, s2):
+    '''
+    Compute the edit distance between two strings, counting insertions, deletions, substitutions, and transpositions of
+    adjacent characters as one edit each.
+
+    Parameters
+    ----------
+    s1 : str
+        The first string.
+    s2 : str
+        The second string.
+
+    Returns
+    -------
+    distance : int
+        The number of edits needed to turn `s1` into `s2`.
+    '''
+
+    n1 = len(s1)
+    n2 = len(s2)
+    prevprev = None
+    prev = list(range(n2+1))
+
+    for i in range(1,n1+1):
+        row = [i] + [0]*n2
+        for j in range(1,n2+1):
+            cost = 0 if (s1[i-1] == s2[j-1]) else 1
+            row[j] = min(prev[j] + 1, row[j-1] + 1, prev[j-1] + cost)
+            if (i > 1) and (j > 1) and (s1[i-1] == s2[j-2]) and (s1[i-2] == s2[j-1]):
+                row[j] = min(row[j], prevprev[j-2] + 1)
+        prevprev = prev
+        prev = row
+
+    return(prev[n2])
+
+## =============================
+def find_similar_keys(key, keys, index, maxsuggestions=3, maxcandidates=25):
+    '''
+    Find the strings in `keys` that are most similar to `key`.
+
+    The candidates are first found by counting the trigrams they share with `key`, using the index from
+    `build_trigram_index()`. The edit distance is then computed only for the best few candidates, so that the cost of a
+    lookup does not grow with the total number of keys.
+
+    Parameters
+    ----------
+    key : str
+        The string to find matches for.
+    keys : list of str
+        The list of strings that was indexed.
+    index : dict
+        The trigram index of `keys`.
+    maxsuggestions : int, optional
+        The maximum number of matches to return.
+    maxcandidates : int, optional
+        The number of candidates (ranked by shared trigrams) for which to compute the edit distance.
+
+    Returns
+    -------
+    suggestions : list of str
+        The closest matches, in order of increasing edit distance.
+    '''
+
+    counts = {}
+    for t in get_trigrams(key):
+        for i in index.get(t, ()):
+            counts[i] = counts.get(i, 0) + 1
+
+    if not counts:
+        return([])
+
+    candidates = heapq.nlargest(maxcandidates, counts, key=counts.get)
+
+    ## Only accept matches that are within a few edits of the key, with the tolerance growing with its length.
+    maxdist = max(2, len(key) // 3)
+    scored = []
+    for i in candidates:
+        d = edit_distance(key.lower(), keys[i].lower())
+        if (d <= maxdist):
+            scored.append((d, -counts[i], keys[i]))
+
+    suggestions = [s[2] for s in sorted(scored)[:maxsuggestions]]
+    return(suggestions)
+
+## =============================
+def print_usage():
+    '''
+    Print the ways in which Bibulous can be called from the command line, and its options.
+    '''
+
+    print('Bibulous can be called with')
+    print('    bibulous.py --locale=mylocale --force --deps=myfile.d --exit-code-on-change myfile.aux')
+    print('or, to process several files at once,')
+    print('    bibulous.py --jobs=4 file1.aux file2.aux ...')
+    print('or, to write the bibliography in several styles at once (to "myfile-style1.bbl", etc),')
+    print('    bibulous.py --style=style1.bst --style=style2.bst myfile.aux')
+    print('or, to run as a daemon serving requests from "bibulous_client.py",')
+    print('    bibulous.py --daemon=mysocket')
+    print('where all of the options are optional:')
+    print('    --locale               the locale to use for sorting')
+    print('    --force                rewrite the BBL file even if no inputs have changed since the last run')
+    print('    --deps                 write a Makefile-style list of the files read to the given file')
+    print('    --exit-code-on-change  exit with status 3 if the BBL file content changed, and 0 if not')
+    print('    --jobs                 the number of BBL files to write in parallel (or, given a single')
+    print('                           file, the number of processes to format its entries with)')
+    print('    --style                a style template file to write the BBL file with (in place of the')
+    print('                           one given in the AUX file); can be given several times')
+    print('    --daemon               the filename of the Unix domain socket to listen on')
+    return
+
+## =============================
+def main(argv=None, cache=None):
+    '''
+    Run Bibulous from the command line. Given one auxiliary file, write its BBL file. Given several, write them all in
+    batch mode, sharing the parsed style templates and databases between them (see `batch()`). Given one or more
+    `--style` options, write a BBL file in each of those styles instead (see `Bibdata.write_style_variants()`). Given
+    `--daemon`, serve requests on a socket instead (see `serve()`).
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        The command-line arguments (not including the program name). (Default is to use `sys.argv`.)
+    cache : dict, optional
+        A cache of parsed style templates and databases to use and update (as kept by the daemon).
+
+    Returns
+    -------
+    status : int
+        The exit status: 0 on success, 2 for a command-line error, and (with `--exit-code-on-change`) 3 if the content \
+        of any BBL file changed.
+    '''
+
+    if (argv == None):
+        argv = sys.argv[1:]
+
+    uselocale = None
+    force = False
+    depfile = None
+    exit_code_on_change = False
+    jobs = 1
+    styles = []
+    if argv:
+        try:
+            (opts, args) = getopt.getopt(argv, '', command_line_options)
+        except getopt.GetoptError as err:
+            ## Print help information and exit.
+            print(err)              ## this will print something like "option -a not recognized"
+            print_usage()
+            return(2)
+
+        for o,a in opts:
+            if (o == '--locale'):
+                uselocale = a
+            elif (o == '--force'):
+                force = True
+            elif (o == '--deps'):
+                depfile = a
+            elif (o == '--exit-code-on-change'):
+                exit_code_on_change = True
+            elif (o == '--jobs'):
+                if not a.isdigit() or (int(a) < 1):
+                    print('option --jobs requires a positive integer, not "' + a + '"')
+                    print_usage()
+                    return(2)
+                jobs = int(a)
+            elif (o == '--style'):
+                if not a.endswith('.bst'):
+                    a += '.bst'
+                styles.append(os.path.normpath(os.path.abspath(a)))
+            elif (o == '--daemon'):
+                serve(a)
+                return(0)
+            else:
+                assert False, "unhandled option"
+
+        if not args:
+            print('no auxiliary (".aux") file given')
+            print_usage()
+            return(2)
+
+        ## If nothing has changed since the last run, then a BBL file is already up to date (and so is the dependency
+        ## file, if there is one and it covers only this job). The BBL files written in other styles have no
+        ## fingerprint, and so are always written.
+        if not force and not styles and ((depfile == None) or ((len(args) == 1) and os.path.exists(depfile))):
+            auxfiles = [f for f in args if not fingerprint_is_current(f, uselocale)]
+            if not auxfiles:
+                print('The BBL file is up to date. Nothing to do.')
+                return(0)
+        else:
+            auxfiles = args
+        files = auxfiles[0]
+    else:
+        ## Use the test example input.
+        arg_bibfile = './test/test1.bib'
+        arg_auxfile = './test/test1.aux'
+        arg_bstfile = './test/test1.bst'
+        files = [arg_bibfile, arg_auxfile, arg_bstfile]
+        auxfiles = [files]
+
+    old_bbl_hashes = {}
+    if exit_code_on_change:
+        for f in auxfiles:
+            bblfile = os.path.normpath(os.path.abspath(f))[:-4] + '.bbl'
+            if styles:
+                bblfiles = [style_variant_filename(bblfile, style) for style in styles]
+            else:
+                bblfiles = [bblfile]
+            for bblfile in bblfiles:
+                old_bbl_hashes[bblfile] = hash_file(bblfile) if os.path.exists(bblfile) else None
+
+    if styles:
+        bibobjs = []
+        for f in auxfiles:
+            main_bibdata = Bibdata(f, uselocale=uselocale, debug=False, cache=cache)
+            if main_bibdata.filedict and main_bibdata.citedict:
+                bibobjs.extend(main_bibdata.write_style_variants(styles, jobs=jobs))
+    elif (len(auxfiles) > 1):
+        bibobjs = batch(auxfiles, jobs=jobs, fingerprint=True, cache=cache, uselocale=uselocale)
+    else:
+        main_bibdata = Bibdata(files, uselocale=uselocale, debug=False, cache=cache)
+        bibobjs = [main_bibdata]
+
+        ## Check if the bibliography database and style template files exist. If they don't, then the user didn't
+        ## specify them, and it's probably true that there is no bibliography requested. That is, Bibulous was called
+        ## without any need.
+        if main_bibdata.filedict and main_bibdata.citedict:
+            main_bibdata.write_bblfile(fingerprint=True, jobs=jobs)
+
+    changed = False
+    for (i,bibobj) in enumerate(bibobjs):
+        if not (bibobj.filedict and bibobj.citedict):
+            continue
+        bblfile = bibobj.filedict['bbl']
+        print('Writing to BBL file = ' + bblfile)
+        #os.system('kwrite ' + bblfile)
+
+        if (depfile != None):
+            bibobj.write_depfile(depfile, append=(i > 0))
+
+        if exit_code_on_change:
+            ## The fingerprint already hashed the new BBL file, unless writing it failed part way.
+            new_bbl_hash = bibobj.bbl_hash
+            if (new_bbl_hash == None):
+                new_bbl_hash = hash_file(bblfile)
+            if (new_bbl_hash != old_bbl_hashes.get(os.path.normpath(os.path.abspath(bblfile)))):
+                changed = True
+
+    print('DONE')
+
+    if changed:
+        return(3)
+    return(0)
+
+## ==================================================================================================
+
+if (__name__ == '__main__'):
+    print('sys.argv=', sys.argv)
+    sys.exit(main())
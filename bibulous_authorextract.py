@@ -34,6 +34,11 @@ if (__name__ == '__main__'):
               'filename (as are all subsequent files).')
         sys.exit(2)
 
-    bibdata = Bibdata(auxfile, culldata=False)
+    ## Only the style templates need to be read here. The database entries are looked up in the author index kept next
+    ## to each database file, which is brought up to date as needed, so the database itself is not parsed.
+    bibdata = Bibdata(None)
+    bibdata.get_bibfilenames(auxfile)
+    for f in bibdata.filedict['bst']:
+        bibdata.parse_bstfile(f)
     print('Writing BIB author extract file = ' + outputfile)
-    bibdata.write_authorextract(authorstr, outputfile, debug=False)
+    bibdata.write_authorextract(authorstr, outputfile)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# See the LICENSE.rst file for licensing information.
+
+'''
+A small client for the Bibulous daemon (started with "bibulous.py --daemon=mysocket"). It takes the same arguments as
+"bibulous.py", sends them to the daemon, prints the daemon's messages, and exits with its status. Since the client
+imports nothing but the standard library, and the daemon keeps the parsed style templates and databases in memory, a
+request takes only milliseconds.
+
+The socket is given with "--socket=mysocket", or else by the BIBULOUS_SOCKET environment variable. If no daemon is
+listening there, then the client runs Bibulous itself. Calling the client with "--stop" shuts down the daemon.
+'''
+
+import os
+import sys
+import json
+import socket
+
+
+## =============================
+def send_request(socketpath, request):
+    '''
+    Send a request to the Bibulous daemon, and wait for its reply.
+
+    Parameters
+    ----------
+    socketpath : str
+        The filename of the socket the daemon is listening on.
+    request : dict
+        The request: the command-line arguments (`argv`) and working directory (`cwd`), or a `command`.
+
+    Returns
+    -------
+    reply : dict
+        The reply, with keys `status` (the exit status) and `output` (the messages printed).
+    '''
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socketpath)
+        sock.sendall(json.dumps(request).encode('utf-8'))
+        sock.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+
+    return(json.loads(b''.join(chunks).decode('utf-8')))
+
+## =============================
+def main(argv=None):
+    '''
+    Run Bibulous through the daemon, if one is listening, and otherwise directly.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        The command-line arguments (not including the program name). (Default is to use `sys.argv`.)
+
+    Returns
+    -------
+    status : int
+        The exit status, as for "bibulous.py".
+    '''
+
+    if (argv == None):
+        argv = sys.argv[1:]
+
+    socketpath = os.environ.get('BIBULOUS_SOCKET')
+    args = []
+    request = None
+    for a in argv:
+        if a.startswith('--socket='):
+            socketpath = a[len('--socket='):]
+        elif (a == '--stop'):
+            request = {'command':'stop'}
+        else:
+            args.append(a)
+
+    if (request == None):
+        request = {'argv':args, 'cwd':os.getcwd()}
+
+    if socketpath and hasattr(socket, 'AF_UNIX'):
+        try:
+            reply = send_request(socketpath, request)
+        except (OSError, ValueError):
+            reply = None
+
+        if (reply != None):
+            sys.stdout.write(reply['output'])
+            return(reply['status'])
+
+    if ('command' in request):
+        print('There is no Bibulous daemon to stop.')
+        return(1)
+
+    ## No daemon is listening, so do the work here instead.
+    import bibulous
+    return(bibulous.main(args))
+
+## ==================================================================================================
+
+if (__name__ == '__main__'):
+    sys.exit(main())
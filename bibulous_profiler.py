@@ -1,5 +1,8 @@
 from __future__ import unicode_literals, print_function, division     ## for Python3 compatibility
 import cProfile
+import timeit
+import io
+import contextlib
 from bibulous import Bibdata
 
 ## =================================================================================================
@@ -9,10 +12,44 @@ def run_test1():
     bibobj.write_bblfile(write_preamble=True, write_postamble=True, bibsize='ZZ')
     return
 
+## =================================================================================================
+def benchmark_templates(auxfile='./test/test1.aux', repeats=20):
+    '''
+    Compare the time taken to fill in the template of each entry when rendering the compiled templates and when
+    interpreting the template strings, checking that both give the same result.
+    '''
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        bibobj = Bibdata(auxfile, disable=[9,17])
+        bibobj.render_bbl()         ## prepare the entries, without writing a BBL file
+
+    jobs = []
+    for c in bibobj.citelist:
+        if (c in bibobj.bibdata) and (bibobj.bibdata[c]['entrytype'] in bibobj.bstdict):
+            jobs.append((bibobj.bstdict[bibobj.bibdata[c]['entrytype']], c))
+
+    def fill_all():
+        return([bibobj.template_substitution(templatestr, c) for (templatestr,c) in jobs])
+
+    results = {}
+    times = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for compiled in (False, True):
+            bibobj.use_compiled_templates = compiled
+            results[compiled] = fill_all()
+            times[compiled] = min(timeit.repeat(fill_all, number=1, repeat=repeats)) / len(jobs)
+
+    print('Filling in the templates for %i entries from "%s":' % (len(jobs), auxfile))
+    print('    interpreted templates: %8.1f us per entry' % (1.0E6 * times[False]))
+    print('    compiled templates:    %8.1f us per entry' % (1.0E6 * times[True]))
+    print('    speedup: %.2fx, identical output: %s' % (times[False] / times[True], results[False] == results[True]))
+    return
+
 ## =================================================================================================
 ## =================================================================================================
 
 if (__name__ == '__main__'):
     #(outputfile, targetfile) = run_test1()
     cProfile.run('run_test1()')
+    benchmark_templates()
 
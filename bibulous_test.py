@@ -26,12 +26,25 @@ The basic approach of the tests is as follows:
 '''
 
 import os
+import re
+import json
 import locale
 #import traceback    ## for getting full traceback info in exceptions
 #import pdb          ## put "pdb.set_trace()" at any place you want to interact with pdb
 import difflib      ## for comparing one string sequence with another
+import io
+import contextlib
 import getopt
-from bibulous import Bibdata
+import socket
+import subprocess
+import sys
+import time
+import shutil
+import tempfile
+import threading
+from bibulous import Bibdata, batch, DaemonServer, namefield_to_namelist, parse_namefield, format_namelist, \
+    name_format_cache_info, clear_name_format_cache, namestr_to_namedict, main, fingerprint_is_current, new_cache
+from bibulous_client import send_request
 
 
 ## =================================================================================================
@@ -363,6 +376,612 @@ def run_test10():
 
     return(bblfile, target_bblfile)
 
+## =================================================================================================
+def run_test11():
+    '''
+    Test #11 checks that a bibliography built from in-memory sources (strings, bytes, and file-like objects) gives the
+    same result as one built from the files on disk.
+    '''
+
+    targetfile = './test/test5_target.bbl'
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #11')
+
+    auxstr = open('./test/test5.aux', 'r', encoding='utf8').read()
+    bstbytes = open('./test/test5.bst', 'rb').read()
+    bibhandle = open('./test/test5.bib', 'r', encoding='utf8')
+
+    bibobj = Bibdata.from_sources(aux=auxstr, bst=[bstbytes], bib=[bibhandle], disable=[9])
+    bblstr = bibobj.render_bbl()
+    bibhandle.close()
+
+    targetstr = open(targetfile, 'r', encoding='utf8').read()
+    result = (bblstr == targetstr)
+    if result:
+        print('TEST #11 PASSED')
+    else:
+        print('TEST #11 FAILED. FILE DIFFERENCES:')
+        for line in difflib.unified_diff(bblstr.splitlines(True), targetstr.splitlines(True)):
+            print(line, end='')
+
+    return(result)
+
+## =================================================================================================
+def run_test12():
+    '''
+    Test #12 checks that writing several BBL files in one batch (in parallel, with shared parsing) gives the same
+    results as writing each of them separately.
+    '''
+
+    auxfiles = ['./test/test5.aux', './test/test8.aux']
+    bblfiles = ['./test/test5.bbl', './test/test8.bbl']
+    targetfiles = ['./test/test5_target.bbl', './test/test8_target.bbl']
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #12')
+
+    batch(auxfiles, jobs=2, disable=[9], debug=False)
+
+    return(bblfiles, targetfiles)
+
+## =================================================================================================
+def run_test13():
+    '''
+    Test #13 drives the daemon mode through a local socket, checking that both the first request and a second one
+    (using the style templates and database kept in memory) give the same BBL file as running Bibulous directly, and
+    that the daemon refuses a request to start another daemon.
+    '''
+
+    auxfile = './test/test5.aux'
+    bblfile = './test/test5.bbl'
+    targetfile = './test/test5_target.bbl'
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #13')
+
+    if not hasattr(socket, 'AF_UNIX'):
+        print('Unix domain sockets are not available on this platform. Skipping ...')
+        return(True)
+
+    socketdir = tempfile.mkdtemp()
+    socketpath = os.path.join(socketdir, 'bibulous.sock')
+    server = DaemonServer(socketpath)
+    thread = threading.Thread(target=server.serve_until_stopped)
+    thread.start()
+
+    try:
+        for i in range(2):
+            reply = send_request(socketpath, {'argv':['--force', auxfile], 'cwd':os.getcwd()})
+            print(reply['output'], end='')
+        refusal = send_request(socketpath, {'argv':['--daemon=' + socketpath + '2'], 'cwd':os.getcwd()})
+        print(refusal['output'], end='')
+        cached = (len(server.cache['styles']) == 1) and (len(server.cache['databases']) == 1)
+    finally:
+        send_request(socketpath, {'command':'stop'})
+        thread.join()
+        os.rmdir(socketdir)
+        fingerprintfile = auxfile[:-4] + '-fingerprint.json'
+        if os.path.exists(fingerprintfile):
+            os.remove(fingerprintfile)
+
+    if (refusal['status'] != 2):
+        print('TEST #13 FAILED: the daemon returned status ' + str(refusal['status']) + ' for a request to start '
+              'another daemon.')
+        return(False)
+
+    if (reply['status'] != 0) or not cached:
+        print('TEST #13 FAILED: the daemon returned status ' + str(reply['status']) + ' and cached ' + \
+              str(len(server.cache['styles'])) + ' styles and ' + str(len(server.cache['databases'])) + ' databases.')
+        return(False)
+
+    return(check_file_match(13, bblfile, targetfile))
+
+## =================================================================================================
+def run_test14():
+    '''
+    Test #14 repeats test #12 with worker processes that are spawned rather than forked, so that the workers have to
+    read the parsed databases from shared memory.
+    '''
+
+    auxfiles = ['./test/test5.aux', './test/test8.aux']
+    bblfiles = ['./test/test5.bbl', './test/test8.bbl']
+    targetfiles = ['./test/test5_target.bbl', './test/test8_target.bbl']
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #14')
+
+    batch(auxfiles, jobs=2, start_method='spawn', disable=[9], debug=False)
+
+    return(bblfiles, targetfiles)
+
+## =================================================================================================
+def run_test15():
+    '''
+    Test #15 repeats test #1 with the entries formatted by several worker processes, which has to give the same BBL
+    file as formatting them serially.
+    '''
+
+    bblfile = './test/test1.bbl'
+    auxfile = './test/test1.aux'
+    target_bblfile = './test/test1_target.bbl'
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #15')
+
+    bibobj = Bibdata(auxfile, disable=[9,17,28,29])
+    bibobj.write_bblfile(write_preamble=True, write_postamble=True, bibsize='ZZ', jobs=3)
+
+    return(bblfile, target_bblfile)
+
+## =================================================================================================
+def run_test16():
+    '''
+    Test #16 uses group templates to split the glossary database of test #8 into one reference list per entrytype,
+    each with its own heading, sorting order, and (for the glossary entries) its own entry template.
+    '''
+
+    bblfile = './test/test11_groups.bbl'
+    auxfile = './test/test11_groups.aux'
+    target_bblfile = './test/test11_groups_target.bbl'
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #16')
+
+    bibobj = Bibdata(auxfile, disable=[9])
+    bibobj.write_bblfile()
+
+    return(bblfile, target_bblfile)
+
+## =================================================================================================
+def run_test17():
+    '''
+    Test #17 writes the bibliography of test #1 in two styles at once, sharing the parsed database between them. The
+    result in each style has to be the same as writing it using that style alone.
+    '''
+
+    auxfile = './test/test1.aux'
+    bblfiles = ['./test/test1-test1.bbl', './test/test1-test2.bbl']
+    targetfiles = ['./test/test1_target.bbl', './test/test1-test2_target.bbl']
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #17')
+
+    bibobj = Bibdata(auxfile, disable=[9,17,28,29])
+    bibobj.write_style_variants(['./test/test1.bst', './test/test2.bst'], bibsize='ZZ')
+
+    return(bblfiles, targetfiles)
+
+## =================================================================================================
+def run_test18():
+    '''
+    Test #18 checks that the cache of parsed name fields gives the same names as parsing them afresh, and that the
+    (shared) cached names cannot be changed in place.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #18')
+
+    namefield = 'Ludwig van Beethoven and Smith, Jr., John and {Barnes and Noble, Inc.}'
+    namelist = namefield_to_namelist(namefield, key='test18')
+    result = (namelist == parse_namefield(namefield, key='test18'))
+    result = result and (namefield_to_namelist(namefield, key='test18') is namelist)
+
+    try:
+        namelist[0]['first'] = 'Ludvig'
+        result = False
+    except TypeError:
+        pass
+    result = result and (namelist[0]['first'] == 'Ludwig')
+
+    if result:
+        print('TEST #18 PASSED')
+    else:
+        print('TEST #18 FAILED.')
+
+    return(result)
+
+## =================================================================================================
+def run_test19():
+    '''
+    Test #19 checks the splitting of name fields at separators, commas, spaces, and ties only at brace level zero, that
+    a doubled separator is read as one, and that an unmatched closing brace does not stop the parsing.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #19')
+
+    namefield = '{Barnes and Noble, Inc.} and Jean~{de La}~Fontaine and Smith, {John Paul}'
+    namelist = parse_namefield(namefield, key='test19')
+    result = (namelist == [{'last':'{Barnes and Noble, Inc.}'}, {'first':'Jean', 'middle':'{de La}', 'last':'Fontaine'},
+                           {'last':'Smith', 'first':'{John Paul}'}])
+    namelist = parse_namefield('A  and  and B', key='test19')
+    result = result and (namelist == [{'last':'A'}, {'last':'B'}])
+
+    ## An unmatched closing brace must not stop the parsing, or spoil the names that follow it.
+    namelist = parse_namefield('{Smith} } and Jones', key='test19')
+    result = result and (len(namelist) == 2) and (namelist[1] == {'last':'Jones'})
+
+    if result:
+        print('TEST #19 PASSED')
+    else:
+        print('TEST #19 FAILED.')
+
+    return(result)
+
+## =================================================================================================
+def run_test20():
+    '''
+    Test #20 checks that names formatted from the name formatting cache are the same as those formatted afresh, and
+    that names formatted with different options do not share cached results.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #20')
+
+    namelist = parse_namefield('Smith, Jr., John Paul and Jean-Paul Sartre', key='test20')
+    clear_name_format_cache()
+    result = (format_namelist(namelist, options={}) == 'J. P. Smith, Jr. and J.-P. Sartre')
+    result = result and (format_namelist(namelist, options={}) == 'J. P. Smith, Jr. and J.-P. Sartre')
+    result = result and (name_format_cache_info()['hits'] > 0)
+    options = {'namelist_format':'last_name_first'}
+    result = result and (format_namelist(namelist, options=options) == 'Smith, J. P., Jr. and Sartre, J.-P.')
+
+    if result:
+        print('TEST #20 PASSED')
+    else:
+        print('TEST #20 FAILED.')
+
+    return(result)
+
+## =================================================================================================
+def run_test21():
+    '''
+    Test #21 checks that the author index finds the same entries as searching the whole database, and that it follows
+    the changes made to the database file.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #21')
+
+    tempdir = tempfile.mkdtemp()
+    bibfile = os.path.join(tempdir, 'test21.bib')
+    outputfile = os.path.join(tempdir, 'test21_authorextract.bib')
+    contents = '@article{a1,\n  author = {Tukey, John W.},\n  title = {First}}\n\n' + \
+               '@book{b1,\n  editor = {John W. Tukey and Jane Doe},\n  title = {Second}}\n\n' + \
+               '@article{c1,\n  author = {Jane Doe},\n  title = {Third}}\n\n'
+    steps = [(contents, ['a1','b1']),
+             (contents.replace('Tukey, John W.', 'Doe, Jane') + '@misc{d1,\n  author = {J. W. Tukey}}\n', ['b1','d1'])]
+
+    result = True
+    try:
+        for (bibstr, keys) in steps:
+            with open(bibfile, 'w') as f:
+                f.write(bibstr)
+            bibobj = Bibdata(None)
+            bibobj.filedict['bib'] = [bibfile]
+            bibobj.write_authorextract('J. W. Tukey', outputfile)
+            with open(outputfile, 'r') as f:
+                found = re.findall(r'^@\w+\{([^,]+),', f.read(), re.MULTILINE)
+            searched = Bibdata([bibfile], culldata=False).search_database_for_author(namestr_to_namedict('J. W. Tukey'))
+            result = result and (found == keys) and (list(searched) == keys)
+    finally:
+        shutil.rmtree(tempdir)
+
+    if result:
+        print('TEST #21 PASSED')
+    else:
+        print('TEST #21 FAILED.')
+
+    return(result)
+
+## =================================================================================================
+def run_test22():
+    '''
+    Test #22 checks that a user-defined variable giving a default value for a missing field (as with "entry.get()"),
+    or reading the entry through "bibdata", is still evaluated for the entries lacking that field, and that the
+    variables are not given the Bibdata object itself ("self").
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #22')
+
+    auxstr = '\\citation{withnote}\n\\citation{nonote}\n\\bibdata{test22}\n\\bibstyle{test22}\n'
+    bststr = 'TEMPLATES:\nbook = <title>: <notestr> (<titlelen>).\n\nSPECIAL-TEMPLATES:\ncitelabel = None\n\n' + \
+             'OPTIONS:\nallow_scripts = True\n\nVARIABLES:\nnotestr = entry.get(\'note\', \'no note given\')\n' + \
+             'titlelen = str(len(bibdata[c][\'title\']))\n'
+    bibstr = '@book{withnote,\n  title = {First},\n  note = {a note}}\n\n@book{nonote,\n  title = {Second}}\n'
+
+    bibobj = Bibdata.from_sources(aux=auxstr, bst=[bststr], bib=[bibstr])
+    bblstr = bibobj.render_bbl()
+    result = ('First: a note (5).' in bblstr) and ('Second: no note given (6).' in bblstr)
+
+    selfstr = bststr.replace('\'title\']))\n', '\'title\'])) + str(len(self.bibdata))\n')
+    bibobj = Bibdata.from_sources(aux=auxstr, bst=[selfstr], bib=[bibstr])
+    bibobj.render_bbl()
+    result = result and isinstance(bibobj.last_exception, NameError)
+
+    if result:
+        print('TEST #22 PASSED')
+    else:
+        print('TEST #22 FAILED. THE OUTPUT IS:\n' + bblstr)
+
+    return(result)
+
+## =================================================================================================
+def run_test23():
+    '''
+    Test #23 runs Bibulous from the command line with "--deps" and "--exit-code-on-change", checking the exit status
+    when the BBL file changes and when it does not, and that the dependency file lists the database file (rather than
+    the cite-extract file read in its place on the second run). It also checks that an invalid "--jobs" is refused,
+    as are options given without any auxiliary file.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #23')
+
+    tempdir = tempfile.mkdtemp()
+    auxfile = os.path.join(tempdir, 'test23.aux')
+    bibfile = os.path.join(tempdir, 'test23.bib')
+    depfile = os.path.join(tempdir, 'test23.d')
+    sources = {auxfile:'\\citation{one}\n\\bibdata{test23}\n\\bibstyle{test23}\n',
+               os.path.join(tempdir, 'test23.bst'):'TEMPLATES:\nbook = <title>.\n\nOPTIONS:\nuse_citeextract = True\n',
+               bibfile:'@book{one,\n  title = {One}}\n\n@book{two,\n  title = {Two}}\n'}
+
+    try:
+        for (filename, text) in sources.items():
+            with open(filename, 'w', encoding='utf8') as f:
+                f.write(text)
+
+        argv = ['--force', '--exit-code-on-change', '--deps=' + depfile, auxfile]
+        statuses = [main(argv), main(argv), main(['--jobs=x', auxfile]), main(['--jobs=2']),
+                    main(['--deps=' + depfile])]
+        with open(depfile, 'r', encoding='utf8') as f:
+            deplines = f.read().splitlines()
+    finally:
+        shutil.rmtree(tempdir)
+
+    ## The first line names the BBL file as the target, and the others each name a prerequisite.
+    deps = [line.strip(' \\') for line in deplines]
+    result = (statuses == [3, 0, 2, 2, 2]) and (deps[0] == auxfile[:-4] + '.bbl:')
+    result = result and (bibfile in deps) and not any([('-extract' in d) for d in deps])
+
+    if result:
+        print('TEST #23 PASSED')
+    else:
+        print('TEST #23 FAILED. THE EXIT STATUSES ARE ' + str(statuses) + ' AND THE DEPENDENCY FILE IS:\n' + \
+              '\n'.join(deplines))
+
+    return(result)
+
+## =================================================================================================
+def run_test24():
+    '''
+    Test #24 checks the fingerprint that lets a run be skipped when nothing has changed: that it goes out of date when
+    the disabled warnings change or a database file's contents change, but not when a database file is merely touched
+    (whose new stamp is then recorded). It also checks that the skipped run is fast: that it takes only a few
+    milliseconds once the module is loaded, and that loading the module doesn't import the modules used only for
+    writing in parallel, the daemon mode, the author index, or user-defined variables.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #24')
+
+    tempdir = tempfile.mkdtemp()
+    auxfile = os.path.join(tempdir, 'test24.aux')
+    bibfile = os.path.join(tempdir, 'test24.bib')
+    fpfile = os.path.join(tempdir, 'test24-fingerprint.json')
+    sources = {auxfile:'\\citation{one}\n\\bibdata{test24}\n\\bibstyle{test24}\n',
+               os.path.join(tempdir, 'test24.bst'):'TEMPLATES:\nbook = <title>.\n',
+               bibfile:'@book{one,\n  title = {One}}\n'}
+
+    try:
+        for (filename, text) in sources.items():
+            with open(filename, 'w', encoding='utf8') as f:
+                f.write(text)
+
+        status = main([auxfile])
+        results = [fingerprint_is_current(auxfile), not fingerprint_is_current(auxfile, disable=[9,17])]
+
+        start = time.perf_counter()
+        results.append(main([auxfile]) == 0)
+        elapsed = time.perf_counter() - start
+        print('The up-to-date run took %.1f ms.' % (1000.0 * elapsed))
+        results.append(elapsed < 0.05)
+
+        heavy = ['ast', 'multiprocessing', 'socketserver', 'sqlite3', 'threading']
+        code = 'import sys, bibulous; print(" ".join([m for m in ' + repr(heavy) + ' if m in sys.modules]))'
+        imported = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        print('Importing bibulous imported ' + repr(imported) + '.')
+        results.append(imported == [])
+
+        stat = os.stat(bibfile)
+        os.utime(bibfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        results.append(fingerprint_is_current(auxfile))
+        with open(fpfile, 'r', encoding='utf8') as f:
+            stamps = json.load(f)['stamps']
+        results.append([os.stat(bibfile).st_mtime_ns, os.stat(bibfile).st_size] in stamps)
+
+        with open(bibfile, 'a', encoding='utf8') as f:
+            f.write('\n@book{two,\n  title = {Two}}\n')
+        results.append(not fingerprint_is_current(auxfile))
+    finally:
+        shutil.rmtree(tempdir)
+
+    result = (status == 0) and all(results)
+
+    if result:
+        print('TEST #24 PASSED')
+    else:
+        print('TEST #24 FAILED. THE EXIT STATUS IS ' + str(status) + ' AND THE CHECKS GIVE ' + str(results))
+
+    return(result)
+
+## =================================================================================================
+def run_test25():
+    '''
+    Test #25 checks that a database parsed in full for the shared registry gives the warnings about an entry only for
+    the jobs that cite it, as parsing only the cited entries would, however many jobs share the parsed database.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #25')
+
+    tempdir = tempfile.mkdtemp()
+    auxfile = os.path.join(tempdir, 'test25.aux')
+    sources = {os.path.join(tempdir, 'test25.bst'):'TEMPLATES:\nbook = <title>.\n',
+               os.path.join(tempdir, 'test25.bib'):'@book{one,\n  title = {One}}\n\n'
+                                                   '@book{two,\n  title = {Two},\n  title = {Second}}\n'}
+
+    cache = new_cache()
+    results = []
+    try:
+        for (filename, text) in sources.items():
+            with open(filename, 'w', encoding='utf8') as f:
+                f.write(text)
+
+        for citekeys in (['one'], ['one','two'], ['one']):
+            with open(auxfile, 'w', encoding='utf8') as f:
+                f.write(''.join(['\\citation{' + k + '}\n' for k in citekeys]) + '\\bibdata{test25}\n'
+                        '\\bibstyle{test25}\n')
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                bibobj = Bibdata(auxfile, cache=cache, disable=[9])
+            print(output.getvalue(), end='')
+            results.append((bibobj.database_key != None) and \
+                           (output.getvalue().count('Warning 033') == citekeys.count('two')))
+    finally:
+        shutil.rmtree(tempdir)
+
+    result = all(results)
+
+    if result:
+        print('TEST #25 PASSED')
+    else:
+        print('TEST #25 FAILED. THE CHECKS GIVE ' + str(results))
+
+    return(result)
+
+## =================================================================================================
+def run_test26():
+    '''
+    Test #26 asks for the entries of a style using the "uniquify" operator to be formatted by two jobs. Since each
+    entry's suffix depends on the entries formatted before it, this has to fall back to formatting them serially,
+    saying so with Warning 041, and giving the same result as a single job.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #26')
+
+    auxstr = '\\citation{smith1}\n\\citation{smith2}\n\\citation{jones}\n\\bibdata{test26}\n\\bibstyle{test26}\n'
+    bststr = 'TEMPLATES:\nbook = <title.uniquify(1)>, <year>.\n'
+    bibstr = '@book{smith1,\n  title = {Sources},\n  year = {1990}}\n\n' + \
+             '@book{smith2,\n  title = {Sources},\n  year = {1995}}\n\n' + \
+             '@book{jones,\n  title = {Methods},\n  year = {2000}}\n'
+
+    bbls = []
+    warned = []
+    for jobs in (1, 2):
+        bibobj = Bibdata.from_sources(aux=auxstr, bst=[bststr], bib=[bibstr], disable=[9])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            bbls.append(bibobj.render_bbl(jobs=jobs))
+        print(output.getvalue(), end='')
+        warned.append('Warning 041' in output.getvalue())
+
+    result = (bbls[0] == bbls[1]) and ('Sources1, 1990.' in bbls[1]) and ('Sources2, 1995.' in bbls[1]) and \
+             (warned == [False, True])
+
+    if result:
+        print('TEST #26 PASSED')
+    else:
+        print('TEST #26 FAILED. WARNING 041 WAS GIVEN FOR ' + str(warned) + ' AND THE BBL FILES ARE:\n' + \
+              '\n'.join(bbls))
+
+    return(result)
+
+## =================================================================================================
+def run_test27():
+    '''
+    Test #27 checks the suggestions given for citation keys missing from the database: that a mistyped key is offered
+    the closest entrykeys (including those culled from the parsed database), best match first, that a key resembling
+    nothing is offered none, and that the index of entrykeys is not built at all when no key is missing.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #27')
+
+    bststr = 'TEMPLATES:\nbook = <title>.\n'
+    bibstr = ''.join(['@book{' + k + ',\n  title = {Title}}\n\n' for k in ('smith2001', 'smith2010', 'smyth2001',
+                                                                           'jones1999', 'brown1980')])
+
+    auxstr = '\\citation{jones1999}\n\\bibdata{test27}\n\\bibstyle{test27}\n'
+    bibobj = Bibdata.from_sources(aux=auxstr, bst=[bststr], bib=[bibstr], disable=[9])
+    bibobj.render_bbl()
+    results = [bibobj.citekey_index == None]
+
+    auxstr = '\\citation{smiht2001}\n\\citation{zzqx}\n' + auxstr
+    bibobj = Bibdata.from_sources(aux=auxstr, bst=[bststr], bib=[bibstr], disable=[9])
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        bibobj.render_bbl()
+    print(output.getvalue(), end='')
+    warnings = [line for line in output.getvalue().splitlines() if line.startswith('Warning 010a')]
+
+    results.append((len(warnings) == 2) and
+                   warnings[0].endswith('Did you mean "smith2001", "smyth2001", "smith2010"?') and
+                   ('Did you mean' not in warnings[1]))
+    results.append(bibobj.suggest_citekeys('smith201') == ['smith2001', 'smith2010', 'smyth2001'])
+    results.append(bibobj.suggest_citekeys('smiht2001', maxsuggestions=1) == ['smith2001'])
+
+    result = all(results)
+
+    if result:
+        print('TEST #27 PASSED')
+    else:
+        print('TEST #27 FAILED. THE CHECKS GIVE ' + str(results))
+
+    return(result)
+
+## =================================================================================================
+def run_test28():
+    '''
+    Test #28 checks which special fields are evaluated: that a special template the entry's template cannot reach is
+    skipped, that the special fields are evaluated in the order of the style file (so that one referring to a field
+    defined after it sees that field as undefined), and that special templates referring to one another in a cycle
+    are reported with Warning 039.
+    '''
+
+    print('\n' + '='*75)
+    print('Running Bibulous Test #28')
+
+    auxstr = '\\citation{one}\n\\bibdata{test28}\n\\bibstyle{test28}\n'
+    bststr = 'TEMPLATES:\nbook = <title>: <shown> <early> <late>.\n\nSPECIAL-TEMPLATES:\ncitelabel = None\n' + \
+             'shown = <title.upper()>\nunused = <title>!\nearly = [<late>|none]\nlate = <year>\n' + \
+             'first = <second>\nsecond = [<first>|<year>]\n'
+    bibstr = '@book{one,\n  title = {First},\n  year = {2000}}\n'
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        bibobj = Bibdata.from_sources(aux=auxstr, bst=[bststr], bib=[bibstr], disable=[9])
+        bblstr = bibobj.render_bbl()
+    print(output.getvalue(), end='')
+
+    entry = bibobj.bibdata['one']
+    results = ['First: FIRST none 2000.' in bblstr,
+               ('shown' in entry) and ('unused' not in entry) and ('first' not in entry) and ('second' not in entry),
+               'Warning 039: the special templates "first", "second" refer to one another' in output.getvalue()]
+
+    result = all(results)
+
+    if result:
+        print('TEST #28 PASSED')
+    else:
+        print('TEST #28 FAILED. THE CHECKS GIVE ' + str(results) + ' AND THE OUTPUT IS:\n' + bblstr)
+
+    return(result)
+
 ## =================================================================================================
 def check_file_match(testnum, outputfile, targetfile):
     if not isinstance(outputfile, list):
@@ -458,6 +1077,83 @@ if (__name__ == '__main__'):
     result = check_file_match(10, outputfile, targetfile)
     suite_pass *= result
 
+    ## Run test #11.
+    result = run_test11()
+    suite_pass *= result
+
+    ## Run test #12.
+    (outputfile, targetfile) = run_test12()
+    result = check_file_match(12, outputfile, targetfile)
+    suite_pass *= result
+
+    ## Run test #13.
+    result = run_test13()
+    suite_pass *= result
+
+    ## Run test #14.
+    (outputfile, targetfile) = run_test14()
+    result = check_file_match(14, outputfile, targetfile)
+    suite_pass *= result
+
+    ## Run test #15.
+    (outputfile, targetfile) = run_test15()
+    result = check_file_match(15, outputfile, targetfile)
+    suite_pass *= result
+
+    ## Run test #16.
+    (outputfile, targetfile) = run_test16()
+    result = check_file_match(16, outputfile, targetfile)
+    suite_pass *= result
+
+    ## Run test #17.
+    (outputfile, targetfile) = run_test17()
+    result = check_file_match(17, outputfile, targetfile)
+    suite_pass *= result
+
+    ## Run test #18.
+    result = run_test18()
+    suite_pass *= result
+
+    ## Run test #19.
+    result = run_test19()
+    suite_pass *= result
+
+    ## Run test #20.
+    result = run_test20()
+    suite_pass *= result
+
+    ## Run test #21.
+    result = run_test21()
+    suite_pass *= result
+
+    ## Run test #22.
+    result = run_test22()
+    suite_pass *= result
+
+    ## Run test #23.
+    result = run_test23()
+    suite_pass *= result
+
+    ## Run test #24.
+    result = run_test24()
+    suite_pass *= result
+
+    ## Run test #25.
+    result = run_test25()
+    suite_pass *= result
+
+    ## Run test #26.
+    result = run_test26()
+    suite_pass *= result
+
+    ## Run test #27.
+    result = run_test27()
+    suite_pass *= result
+
+    ## Run test #28.
+    result = run_test28()
+    suite_pass *= result
+
     if suite_pass:
         print('\n***** THE CODE PASSES ALL TESTS IN THE TESTING SUITE. *****')
     else:
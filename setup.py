@@ -3,9 +3,10 @@ from setuptools import setup, find_packages
 
 setup(
     name = "bibulous",
-    py_modules = ['bibulous', 'bibulous_test', 'bibulous_authorextract'],
+    py_modules = ['bibulous', 'bibulous_test', 'bibulous_authorextract', 'bibulous_client'],
     package_dir = {'':'.'},
     packages = find_packages(exclude=['test']),
+    entry_points = {'console_scripts': ['bibulous = bibulous:main']},
     version = "2.0",
     description = "BibTeX replacement and enhancement",
     author = "Nathan Hagen",